@@ -0,0 +1,119 @@
+"""
+So sánh parser PVOIL mới (pvoil_parser, chỉ parse đoạn .oilpricescontainer bằng lxml)
+với cách cũ (BeautifulSoup dựng cây cả trang) trên các trang HTML đã lưu trong bench/fixtures.
+
+Chạy:  python bench/bench_pvoil_parser.py [-n 50] [fixture.html ...]
+"""
+import argparse
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from pvoil_parser import parse_pvoil_price_table  # noqa: E402
+
+
+def legacy_parse(html: str):
+    """
+    Bản sao đường parse cũ trong GoldFxService.fetch_pvoil_price_table (để so sánh).
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    container = soup.select_one(".oilpricescontainer")
+    table = None
+    if container:
+        table = container.find("table")
+    if not table:
+        table = soup.find("table", class_="table")
+    if not table:
+        return None
+
+    tbody = table.find("tbody") or table
+
+    def parse_int_from_text(s: str):
+        digits = re.sub(r"[^\d]", "", s)
+        return int(digits) if digits else None
+
+    def parse_delta(s: str):
+        m = re.search(r"([+-]?\d+)", s)
+        return int(m.group(1)) if m else None
+
+    rows = []
+    for tr in tbody.find_all("tr"):
+        tds = [td.get_text(strip=True) for td in tr.find_all("td")]
+        if len(tds) < 4:
+            continue
+        try:
+            stt = int(tds[0])
+        except ValueError:
+            continue
+        rows.append(
+            {
+                "stt": stt,
+                "name": tds[1],
+                "price": parse_int_from_text(tds[-2]),
+                "delta": parse_delta(tds[-1]),
+            }
+        )
+    return rows or None
+
+
+def measure(func, html: str, iterations: int):
+    # CPU time trung bình / lần gọi
+    func(html)  # warm-up
+    start = time.process_time()
+    for _ in range(iterations):
+        func(html)
+    cpu_ms = (time.process_time() - start) * 1000 / iterations
+
+    # Peak memory cho 1 lần gọi
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("fixtures", nargs="*", type=Path)
+    args = parser.parse_args()
+
+    fixtures = args.fixtures or sorted((BENCH_DIR / "fixtures").glob("pvoil*.html"))
+    if not fixtures:
+        print("No PVOIL fixtures found", file=sys.stderr)
+        return 1
+
+    ok = True
+    for path in fixtures:
+        html = path.read_text(encoding="utf-8")
+        expected = legacy_parse(html)
+        actual = parse_pvoil_price_table(html)
+        if actual != expected:
+            print(f"[MISMATCH] {path.name}: parser output differs from legacy path")
+            ok = False
+            continue
+
+        old_cpu, old_peak = measure(legacy_parse, html, args.iterations)
+        new_cpu, new_peak = measure(parse_pvoil_price_table, html, args.iterations)
+
+        print(f"{path.name} ({len(html) / 1024:.0f} KiB, {len(actual or [])} rows)")
+        print(f"  legacy (BeautifulSoup full page): {old_cpu:8.2f} ms/call  peak {old_peak / 1024:8.0f} KiB")
+        print(f"  pvoil_parser (fragment + lxml):   {new_cpu:8.2f} ms/call  peak {new_peak / 1024:8.0f} KiB")
+        print(
+            f"  -> CPU x{old_cpu / max(new_cpu, 1e-9):.1f} faster, "
+            f"peak memory -{100 * (1 - new_peak / max(old_peak, 1)):.0f}%"
+        )
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
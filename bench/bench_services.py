@@ -0,0 +1,190 @@
+"""
+Benchmark offline đường parse / render của từng service trên fixture đã ghi lại
+(bench/fixtures), HTTP layer thay bằng fixture_http (không gọi mạng).
+In ops/giây + peak memory (tracemalloc) từng case và so với bench/baseline.json:
+chậm hơn / tốn RAM hơn baseline quá ngưỡng -> exit 1.
+
+Chạy:  python bench/bench_services.py [--min-time 0.5] [--repeat 3] [case ...]
+       python bench/bench_services.py --update-baseline     # ghi lại baseline (cùng máy đo)
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# fixture_http thêm src/ vào sys.path -> import trước các module của bot
+from fixture_http import BENCH_DIR, FIXTURES_DIR, install_fixture_http
+
+from dedupe import RecentHashSet
+from forecast_model import ForecastIndex
+from gold_fx_service import GoldFxService
+from news_service import NewsService
+from ttl_cache import configure_ttl_cache
+from util import load_json
+from weather_service import WeatherService
+
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+FAKE_SECRETS = {
+    "openweather_api_key": "bench",
+    "exchangerate_access_key": "bench",
+    "news_api_key": "bench",
+}
+
+
+def load_fixture(name: str) -> Any:
+    path = FIXTURES_DIR / name
+    if path.suffix == ".json":
+        return json.loads(path.read_text(encoding="utf-8"))
+    return path.read_text(encoding="utf-8")
+
+
+def build_cases() -> Dict[str, Callable[[], Any]]:
+    """
+    Tên case -> hàm chạy 1 lần (dữ liệu chuẩn bị sẵn ở đây, không tính vào thời gian đo).
+    """
+    config = load_json("config.json")
+    gold_fx = GoldFxService(config.get("gold_fx", {}), FAKE_SECRETS)
+    weather = WeatherService(config.get("weather", {}), FAKE_SECRETS)
+    news = NewsService(config.get("news", {}), FAKE_SECRETS)
+
+    pvoil_html = load_fixture("pvoil_tin_gia_xang_dau.html")
+    forecast = load_fixture("openweather_forecast.json")
+    forecast_index = ForecastIndex.from_forecast(forecast)
+
+    # 10 lượt feed (~400 bài, 1/4 trùng) lọc trên seen-set đã nhớ sẵn 1000 bài
+    articles: List[Dict[str, Any]] = []
+    for name in ("newsapi_top_headlines.json", "newsapi_everything.json"):
+        articles.extend(load_fixture(name)["articles"])
+    batch = [
+        dict(a, url=f"{a['url'].split('?')[0]}-{i % 7}?utm_source=bench")
+        for i in range(10)
+        for a in articles
+    ]
+    warm = RecentHashSet(news.dedupe_capacity)
+    for a in batch[: len(batch) // 4]:
+        warm.add(news._article_key(a))
+    for i in range(1000 - len(warm)):
+        warm.add(f"{i:016x}")
+    seen_state = warm.to_state()
+
+    return {
+        "pvoil_parse": lambda: gold_fx._parse_pvoil_html(pvoil_html),
+        "pvoil_fetch": gold_fx.fetch_pvoil_price_table,
+        "weather_daily_forecast": lambda: weather._build_daily_forecast(forecast_index),
+        "weather_forecast_index": lambda: ForecastIndex.from_forecast(forecast),
+        "news_filter_new_articles": lambda: news._filter_new_articles(
+            batch, RecentHashSet.from_state(seen_state, news.dedupe_capacity)
+        ),
+        # State mới mỗi lần -> luôn đi hết đường render (không bị "không đổi" cắt ngắn)
+        "gold_fx_build_summary": lambda: gold_fx.build_summary({}),
+        "weather_build_summary": weather.build_summary,
+        "news_build_summary": lambda: news.build_summary({}),
+    }
+
+
+def measure(func: Callable[[], Any], min_time: float, min_iters: int, repeat: int) -> Tuple[float, int]:
+    """
+    ops/giây tốt nhất trong repeat vòng đo (như timeit: nhiễu chỉ làm chậm đi, không nhanh lên)
+    + peak memory nhỏ nhất của 1 lần gọi trong repeat lần.
+    """
+    func()  # warm-up (import lười, cache regex...)
+    ops = 0.0
+    for _ in range(max(1, repeat)):
+        iterations = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time or iterations < min_iters:
+            func()
+            iterations += 1
+            elapsed = time.perf_counter() - start
+        ops = max(ops, iterations / elapsed)
+
+    # Case chạy nhiều thread (fetch song song) có peak phụ thuộc thứ tự chạy -> lấy min
+    peak = None
+    for _ in range(max(1, repeat)):
+        tracemalloc.start()
+        func()
+        _, run_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = run_peak if peak is None else min(peak, run_peak)
+    return ops, peak
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cases", nargs="*", help="chỉ chạy các case này (mặc định: tất cả)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="số giây đo tối thiểu mỗi vòng")
+    parser.add_argument("--repeat", type=int, default=3, help="số vòng đo, lấy vòng nhanh nhất")
+    parser.add_argument("--min-iters", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="ops/s được phép thấp hơn baseline (tỉ lệ)")
+    parser.add_argument("--mem-tolerance", type=float, default=0.20, help="peak được phép cao hơn baseline (tỉ lệ)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # Log INFO của service (mỗi lần fetch / render) làm nhiễu số đo
+    logging.disable(logging.INFO)
+    install_fixture_http()
+    configure_ttl_cache({"enabled": False})
+
+    cases = build_cases()
+    unknown = [name for name in args.cases if name not in cases]
+    if unknown:
+        print(f"Unknown case(s): {', '.join(unknown)}. Available: {', '.join(cases)}", file=sys.stderr)
+        return 2
+    selected = args.cases or list(cases)
+
+    baseline: Dict[str, Any] = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")).get("cases", {})
+
+    results: Dict[str, Dict[str, float]] = {}
+    regressions: List[str] = []
+    print(f"{'case':<28}{'ops/s':>12}{'vs base':>9}{'peak KiB':>11}{'vs base':>9}")
+    for name in selected:
+        ops, peak = measure(cases[name], args.min_time, args.min_iters, args.repeat)
+        results[name] = {"ops_per_sec": round(ops, 1), "peak_kib": round(peak / 1024, 1)}
+
+        base = baseline.get(name)
+        ops_cmp = mem_cmp = ""
+        if base:
+            ops_ratio = ops / base["ops_per_sec"]
+            mem_ratio = (peak / 1024) / max(base["peak_kib"], 1e-9)
+            ops_cmp = f"{(ops_ratio - 1) * 100:+.0f}%"
+            mem_cmp = f"{(mem_ratio - 1) * 100:+.0f}%"
+            if ops_ratio < 1 - args.tolerance:
+                regressions.append(f"{name}: {ops:,.1f} ops/s vs baseline {base['ops_per_sec']:,.1f}")
+            # Vài KiB chênh lệch (allocator, dict resize) không tính là regression
+            if mem_ratio > 1 + args.mem_tolerance and peak / 1024 - base["peak_kib"] > 16:
+                regressions.append(f"{name}: peak {peak / 1024:,.1f} KiB vs baseline {base['peak_kib']:,.1f}")
+        print(f"{name:<28}{ops:>12,.1f}{ops_cmp:>9}{peak / 1024:>11,.1f}{mem_cmp:>9}")
+
+    if args.update_baseline:
+        previous = {}
+        if args.baseline.exists():
+            previous = json.loads(args.baseline.read_text(encoding="utf-8")).get("cases", {})
+        data = {
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "cases": {**previous, **results},
+        }
+        args.baseline.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("No baseline yet, run with --update-baseline to record one")
+        return 0
+    for line in regressions:
+        print(f"[REGRESSION] {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Load test cho webhook mode: giả lập Telegram POST các update đã ghi lại
+(bench/fixtures/telegram_updates.json) vào WebhookServer qua nhiều kết nối keep-alive.
+
+Mặc định chạy WebhookServer trong process với handler giả (không gọi upstream / Telegram),
+reply giả lập độ trễ gửi --reply-ms. Dùng --url/--secret để bắn vào bot thật đang chạy --webhook.
+
+Chạy:  python bench/bench_webhook.py [-n 5000] [-c 40] [--rate 300] [--users 500] [--reply-ms 20]
+       taskset -c 0 python bench/bench_webhook.py      # đo trên 1 core
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from bot_commands import CommandRouter  # noqa: E402
+from webhook_server import SECRET_HEADER, WebhookServer  # noqa: E402
+
+FAKE_REPLY = "💰 <b>Giá vàng</b>\n" + "\n".join(f"SJC {i}: 120.000.000 / 122.000.000" for i in range(8))
+
+
+def load_bodies(path: Path, total: int, users: int) -> list:
+    """
+    Nhân bản update mẫu thành total body, đổi update_id và user/chat id (users user khác nhau)
+    để rate limit theo user hoạt động giống thực tế.
+    """
+    recorded = json.loads(path.read_text(encoding="utf-8"))
+    bodies = []
+    for i in range(total):
+        update = json.loads(json.dumps(recorded[i % len(recorded)]))
+        update["update_id"] = 1 + i
+        for key in ("message", "edited_message"):
+            message = update.get(key)
+            if message:
+                user_id = 10_000 + i % users
+                message["from"]["id"] = user_id
+                if message["chat"]["type"] == "private":
+                    message["chat"]["id"] = user_id
+        bodies.append(json.dumps(update, ensure_ascii=False).encode("utf-8"))
+    return bodies
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def post_all(url: str, secret: str, bodies: list, connections: int, rate: float = 0.0):
+    parts = urlsplit(url)
+    statuses: Counter = Counter()
+    latencies: list = []
+    lock = threading.Lock()
+    chunks = [bodies[i::connections] for i in range(connections)]
+
+    def client(chunk: list) -> None:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+        local_status: Counter = Counter()
+        local_lat = []
+        headers = {"Content-Type": "application/json", SECRET_HEADER: secret}
+        # rate > 0: mỗi kết nối gửi đều rate / connections update/s
+        interval = connections / rate if rate > 0 else 0.0
+        next_at = time.perf_counter()
+        for body in chunk:
+            if interval:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            start = time.perf_counter()
+            try:
+                conn.request("POST", parts.path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                local_status[resp.status] += 1
+            except (OSError, http.client.HTTPException):
+                local_status["error"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+            local_lat.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            statuses.update(local_status)
+            latencies.extend(local_lat)
+
+    threads = [threading.Thread(target=client, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, statuses, latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--updates", type=int, default=5000)
+    parser.add_argument("-c", "--connections", type=int, default=40, help="như max_connections của setWebhook")
+    parser.add_argument("--rate", type=float, default=0.0, help="updates/s mục tiêu (0 = nhanh nhất có thể)")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--reply-ms", type=float, default=20.0, help="độ trễ giả lập mỗi lần gửi trả lời")
+    parser.add_argument("--url", help="bắn vào webhook đang chạy thay vì server trong process")
+    parser.add_argument("--secret", default="bench-secret")
+    parser.add_argument("--fixture", type=Path, default=BENCH_DIR / "fixtures" / "telegram_updates.json")
+    parser.add_argument("--min-rate", type=float, default=0.0, help="exit 1 nếu updates/s thấp hơn")
+    args = parser.parse_args()
+
+    bodies = load_bodies(args.fixture, args.updates, args.users)
+
+    server = None
+    url = args.url
+    if url is None:
+        replies = Counter()
+
+        def fake_reply(chat_id, text):
+            time.sleep(args.reply_ms / 1000)
+            replies[chat_id] += 1
+
+        router = CommandRouter({
+            name: (lambda cmd_args: FAKE_REPLY) for name in ("gold", "fuel", "fx", "weather", "news")
+        })
+        server = WebhookServer(
+            router, fake_reply, args.secret, host="127.0.0.1", port=0,
+            workers=args.workers, queue_size=args.queue_size,
+        )
+        server.start()
+        host, port = server.address
+        url = f"http://{host}:{port}{server.path}"
+
+    elapsed, statuses, latencies = post_all(url, args.secret, bodies, args.connections, args.rate)
+    rate = args.updates / elapsed
+    print(f"{args.updates} updates over {args.connections} connections in {elapsed:.2f}s -> {rate:,.0f} updates/s")
+    print(
+        f"  POST latency p50 {percentile(latencies, 50) * 1000:.2f} ms  "
+        f"p95 {percentile(latencies, 95) * 1000:.2f} ms  p99 {percentile(latencies, 99) * 1000:.2f} ms"
+    )
+    print(f"  status: {dict(sorted(statuses.items(), key=str))}")
+
+    if server is not None:
+        drain_start = time.perf_counter()
+        server.stop(timeout=60)
+        stats = server.stats()
+        print(
+            f"  server: accepted {stats['accepted']}, rejected (503) {stats['rejected']}, "
+            f"handled {stats['handled']}, replied {stats['replied']}, errors {stats['errors']}, "
+            f"drained in {time.perf_counter() - drain_start:.2f}s"
+        )
+
+    if rate < args.min_rate:
+        print(f"[REGRESSION] {rate:,.0f} updates/s < --min-rate {args.min_rate:,.0f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Server giả lập tất cả upstream của bot (PNJ, PVOIL, OpenWeather, NewsAPI, exchangerate.host
++ Telegram Bot API) trên 1 cổng local, trả fixture trong bench/fixtures, có tiêm lỗi:
+độ trễ theo phân phối, tỉ lệ lỗi 5xx, 429 + Retry-After, reset kết nối, body trả chậm.
+Dùng để load test / đo retry của http_get_json mà không cần API key thật.
+
+Chạy:
+    python bench/fake_upstream.py --port 8900 --latency lognormal:80,0.6 --error-rate 0.05 \\
+        --rate-429 0.02 --write-config /tmp/config.fake.json
+    python src/main.py --config /tmp/config.fake.json --secrets bench/fake_secrets.json
+
+Profile JSON (--profile) cho từng route, VD:
+    {"default": {"latency": "uniform:20,200"},
+     "routes": {"/forecast": {"error_rate": 0.3}, "telegram": {"rate_429": 0.1, "retry_after": 2}}}
+Route = đuôi path trong fixture_http.ROUTES hoặc "telegram". GET /_stats: số request theo route / status.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from fixture_http import BENCH_DIR, FIXTURES_DIR, JSON, ROUTES, fixture_for
+
+PROJECT_ROOT = BENCH_DIR.parent
+
+# Cấu hình lỗi mặc định của 1 route
+DEFAULT_FAULTS: Dict[str, Any] = {
+    "latency": "fixed:0",
+    "error_rate": 0.0,
+    "error_statuses": [500, 502, 503],
+    "rate_429": 0.0,
+    "retry_after": 1,
+    "reset_rate": 0.0,
+    "slow_body_rate": 0.0,
+    "slow_body_kbps": 16,
+}
+
+# Thời gian giữ getUpdates tối đa khi không có update (long polling)
+MAX_POLL_HOLD_SEC = 5.0
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    "fixed:50" | "uniform:20,200" | "normal:100,30" | "lognormal:80,0.6" (trung vị ms, sigma)
+    | "exp:100" (trung bình ms) -> hàm sinh độ trễ (giây).
+    """
+    kind, _, raw = (spec or "fixed:0").partition(":")
+    args = [float(x) for x in raw.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda rng: args[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(max(args[0], 1e-3))
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / max(args[0], 1e-3)) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class Faults:
+    def __init__(self, cfg: Dict[str, Any]) -> None:
+        cfg = {**DEFAULT_FAULTS, **cfg}
+        self.latency = parse_latency(cfg["latency"])
+        self.error_rate = float(cfg["error_rate"])
+        self.error_statuses = [int(s) for s in cfg["error_statuses"]]
+        self.rate_429 = float(cfg["rate_429"])
+        self.retry_after = int(cfg["retry_after"])
+        self.reset_rate = float(cfg["reset_rate"])
+        self.slow_body_rate = float(cfg["slow_body_rate"])
+        self.slow_body_kbps = float(cfg["slow_body_kbps"])
+
+
+class FakeTelegram:
+    """
+    Bot API tối thiểu: getMe, sendMessage (đếm message / độ dài), getUpdates (trả update đã
+    ghi lại 1 lần nếu --replay-updates, sau đó giữ long polling), setWebhook / deleteWebhook.
+    """
+
+    def __init__(self, updates: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.updates = list(updates or [])
+        self.message_id = 0
+        self.sent_chars = 0
+        self._lock = threading.Lock()
+
+    def call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if method == "getMe":
+            return {"id": 100000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+        if method == "sendMessage":
+            text = str(params.get("text") or "")
+            with self._lock:
+                self.message_id += 1
+                self.sent_chars += len(text)
+                message_id = self.message_id
+            chat_id = params.get("chat_id")
+            try:
+                chat_id = int(chat_id)
+            except (TypeError, ValueError):
+                pass
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": text,
+            }
+        if method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            with self._lock:
+                pending = [u for u in self.updates if u["update_id"] >= offset]
+                self.updates = pending
+            if not pending:
+                time.sleep(min(float(params.get("timeout") or 0), MAX_POLL_HOLD_SEC))
+            return pending
+        if method in ("setWebhook", "deleteWebhook", "close", "logOut"):
+            return True
+        raise KeyError(method)
+
+
+class FakeUpstream:
+    def __init__(
+        self,
+        default_faults: Dict[str, Any],
+        route_faults: Dict[str, Dict[str, Any]],
+        telegram: FakeTelegram,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.default = Faults(default_faults)
+        self.routes = {route: Faults({**default_faults, **cfg}) for route, cfg in route_faults.items()}
+        self.telegram = telegram
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._rng_lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def faults_for(self, route: str) -> Faults:
+        return self.routes.get(route, self.default)
+
+    def roll(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def delay(self, faults: Faults) -> float:
+        with self._rng_lock:
+            return faults.latency(self._rng)
+
+    def count(self, route: str, outcome: Any) -> None:
+        with self._stats_lock:
+            self.stats[f"{route} {outcome}"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            out: Dict[str, Any] = dict(sorted(self.stats.items()))
+        out["telegram_sent_chars"] = self.telegram.sent_chars
+        return out
+
+
+def route_of(path: str) -> Optional[str]:
+    if path.startswith("/bot"):
+        return "telegram"
+    for suffix in ROUTES:
+        if path.rstrip("/").endswith(suffix):
+            return suffix
+    return None
+
+
+def make_handler(app: FakeUpstream) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None,
+                  faults: Optional[Faults] = None, slow: bool = False) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if not slow or faults is None:
+                self.wfile.write(body)
+                return
+            # Body nhỏ giọt: chunk 1 KiB, tốc độ slow_body_kbps
+            chunk = 1024
+            pause = chunk / (faults.slow_body_kbps * 1024)
+            for i in range(0, len(body), chunk):
+                self.wfile.write(body[i:i + chunk])
+                self.wfile.flush()
+                time.sleep(pause)
+
+        def _json(self, status: int, payload: Any, **kwargs: Any) -> None:
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), JSON, **kwargs)
+
+        def _read_params(self) -> Dict[str, Any]:
+            params: Dict[str, Any] = {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                raw = self.rfile.read(length)
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    try:
+                        params.update(json.loads(raw))
+                    except ValueError:
+                        pass
+                else:
+                    params.update({k: v[-1] for k, v in parse_qs(raw.decode("utf-8", "replace")).items()})
+            return params
+
+        def _serve(self) -> None:
+            path = urlsplit(self.path).path
+            if path == "/_stats":
+                self._json(200, app.snapshot())
+                return
+            params = self._read_params()
+            route = route_of(path)
+            if route is None:
+                app.count("unknown", 404)
+                self._json(404, {"error": "no fixture for path", "path": path})
+                return
+
+            faults = app.faults_for(route)
+            time.sleep(app.delay(faults))
+
+            if faults.reset_rate and app.roll() < faults.reset_rate:
+                # Đóng kết nối không trả lời -> client thấy ConnectionError
+                app.count(route, "reset")
+                self.close_connection = True
+                self.connection.close()
+                return
+            if faults.rate_429 and app.roll() < faults.rate_429:
+                app.count(route, 429)
+                headers = {"Retry-After": str(faults.retry_after)}
+                if route == "telegram":
+                    self._json(429, {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {faults.retry_after}",
+                        "parameters": {"retry_after": faults.retry_after},
+                    }, headers=headers)
+                else:
+                    self._json(429, {"message": "rate limited"}, headers=headers)
+                return
+            if faults.error_rate and app.roll() < faults.error_rate:
+                with app._rng_lock:
+                    status = app._rng.choice(faults.error_statuses)
+                app.count(route, status)
+                if route == "telegram":
+                    self._json(status, {"ok": False, "error_code": status, "description": "Internal Server Error"})
+                else:
+                    self._send(status, b"upstream error", "text/plain")
+                return
+
+            slow = bool(faults.slow_body_rate) and app.roll() < faults.slow_body_rate
+            app.count(route, "200 slow" if slow else 200)
+            if route == "telegram":
+                method = path.rsplit("/", 1)[-1]
+                try:
+                    result = app.telegram.call(method, params)
+                except KeyError:
+                    self._json(404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"})
+                    return
+                self._json(200, {"ok": True, "result": result}, faults=faults, slow=slow)
+                return
+            body, content_type = fixture_for(path)
+            self._send(200, body, content_type, faults=faults, slow=slow)
+
+        do_GET = _serve
+        do_POST = _serve
+
+    return Handler
+
+
+def rewrite_config(base_url: str, source: Path, target: Path) -> None:
+    """
+    Ghi bản sao config.json với mọi URL upstream trỏ về fake server.
+    """
+    config = json.loads(source.read_text(encoding="utf-8"))
+    gold_fx = config.setdefault("gold_fx", {})
+    gold_fx["pnj_gold_api_url"] = f"{base_url}/ecom-frontend/v1/get-gold-price?zone=11"
+    gold_fx["gasoline_api_url"] = f"{base_url}/tin-gia-xang-dau"
+    gold_fx["exchangerate_api_url"] = f"{base_url}/live"
+    config.setdefault("weather", {})["api_base"] = f"{base_url}/data/2.5"
+    config.setdefault("news", {})["api_base"] = f"{base_url}/v2"
+    config.setdefault("telegram", {})["api_base_url"] = base_url
+    target.write_text(json.dumps(config, ensure_ascii=False, indent=4) + "\n", encoding="utf-8")
+
+
+def load_profile(path: Optional[Path]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    if path is None:
+        return {}, {}
+    profile = json.loads(path.read_text(encoding="utf-8"))
+    return profile.get("default", {}), profile.get("routes", {})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", help="VD: fixed:50, uniform:20,200, normal:100,30, lognormal:80,0.6, exp:100")
+    parser.add_argument("--error-rate", type=float, help="tỉ lệ trả 5xx")
+    parser.add_argument("--rate-429", type=float, help="tỉ lệ trả 429")
+    parser.add_argument("--retry-after", type=int, help="Retry-After (giây) của 429")
+    parser.add_argument("--reset-rate", type=float, help="tỉ lệ đóng kết nối không trả lời")
+    parser.add_argument("--slow-body-rate", type=float, help="tỉ lệ trả body nhỏ giọt")
+    parser.add_argument("--slow-body-kbps", type=float, help="tốc độ body nhỏ giọt (KiB/s)")
+    parser.add_argument("--profile", type=Path, help="file JSON cấu hình lỗi theo route")
+    parser.add_argument("--seed", type=int, help="cố định chuỗi ngẫu nhiên (tái lập được)")
+    parser.add_argument("--replay-updates", action="store_true",
+                        help="getUpdates trả 1 lần các update trong fixtures/telegram_updates.json")
+    parser.add_argument("--write-config", type=Path,
+                        help="ghi bản sao config.json với URL upstream trỏ về server này rồi chạy tiếp")
+    args = parser.parse_args()
+
+    default_faults, route_faults = load_profile(args.profile)
+    for key in ("latency", "error_rate", "rate_429", "retry_after", "reset_rate", "slow_body_rate", "slow_body_kbps"):
+        value = getattr(args, key)
+        if value is not None:
+            default_faults[key] = value
+
+    updates = None
+    if args.replay_updates:
+        updates = json.loads((FIXTURES_DIR / "telegram_updates.json").read_text(encoding="utf-8"))
+    app = FakeUpstream(default_faults, route_faults, FakeTelegram(updates), seed=args.seed)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(app))
+    server.daemon_threads = True
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}"
+    if args.write_config:
+        rewrite_config(base_url, PROJECT_ROOT / "config.json", args.write_config)
+        print(f"Config pointing at {base_url} written to {args.write_config}")
+    print(f"Fake upstream listening on {base_url} (faults: {default_faults or 'none'}, routes: {list(route_faults)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(app.snapshot(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+HTTP layer giả cho bench: trả response từ bench/fixtures thay vì gọi upstream thật.
+Gắn FixtureAdapter vào requests.Session của HTTP client dùng chung, nên toàn bộ đường đi
+thật (util.http_get_json, retry policy, circuit breaker, resp.json() / parse HTML) vẫn chạy.
+"""
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from http_client import configure_http, get_http_client  # noqa: E402
+
+JSON = "application/json; charset=utf-8"
+HTML = "text/html; charset=utf-8"
+
+# Đuôi path upstream -> (fixture, content type)
+ROUTES: Dict[str, Tuple[str, str]] = {
+    "/get-gold-price": ("pnj_gold_price.json", JSON),
+    "/tin-gia-xang-dau": ("pvoil_tin_gia_xang_dau.html", HTML),
+    "/live": ("exchangerate_live.json", JSON),
+    "/weather": ("openweather_weather.json", JSON),
+    "/forecast": ("openweather_forecast.json", JSON),
+    "/top-headlines": ("newsapi_top_headlines.json", JSON),
+    "/everything": ("newsapi_everything.json", JSON),
+}
+
+_bodies: Dict[str, bytes] = {}
+
+
+def fixture_for(path: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Path request -> (body, content type) của fixture tương ứng, None nếu không có route.
+    """
+    for suffix, (name, content_type) in ROUTES.items():
+        if path.rstrip("/").endswith(suffix):
+            body = _bodies.get(name)
+            if body is None:
+                body = _bodies[name] = (FIXTURES_DIR / name).read_bytes()
+            return body, content_type
+    return None
+
+
+class FixtureAdapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.request = request
+        resp.url = request.url
+        resp.encoding = "utf-8"
+        found = fixture_for(urlsplit(request.url).path)
+        if found is None:
+            resp.status_code, resp.reason, resp._content = 404, "Not Found", b""
+            resp.headers = CaseInsensitiveDict()
+        else:
+            body, content_type = found
+            resp.status_code, resp.reason, resp._content = 200, "OK", body
+            resp.headers = CaseInsensitiveDict({"Content-Type": content_type, "Content-Length": str(len(body))})
+        return resp
+
+    def close(self) -> None:
+        pass
+
+
+def install_fixture_http() -> None:
+    """
+    HTTP client dùng chung trả fixture cho mọi request (tắt conditional GET cache, không retry).
+    """
+    configure_http({"cache": {"enabled": False}, "retry": {"max_attempts": 1}})
+    session = get_http_client().session
+    session.mount("https://", FixtureAdapter())
+    session.mount("http://", FixtureAdapter())
@@ -0,0 +1,377 @@
+import fnmatch
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple
+
+from timeseries import TimeSeriesStore
+
+# Toán tử -> (hướng, strict): hướng +1 = cảnh báo khi giá lên trên ngưỡng, -1 = xuống dưới
+OPS = {">": (1, True), ">=": (1, False), "<": (-1, True), "<=": (-1, False)}
+
+_DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*(s|m|h|d)$")
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# "SJC buy > 90,000,000"  |  "USD/VND moves > 0.5% in 1h"
+_THRESHOLD_TEXT_RE = re.compile(r"^(?P<subject>.+?)\s*(?P<op>>=|<=|>|<)\s*(?P<value>[\w.,]+)$")
+_CHANGE_TEXT_RE = re.compile(
+    r"^(?P<subject>.+?)\s+moves?\s*(?:>|>=)?\s*(?:more than\s*)?(?P<pct>[\d.,]+)\s*%\s*in\s*(?P<window>\w+)$",
+    re.IGNORECASE,
+)
+
+
+def parse_duration(text: str) -> int:
+    """
+    "1h" -> 3600, "30m" -> 1800, "2d" -> 172800.
+    """
+    m = _DURATION_RE.match(str(text).strip().lower())
+    if not m:
+        raise ValueError(f"Invalid duration: {text!r}")
+    return int(float(m.group(1)) * _DURATION_UNITS[m.group(2)])
+
+
+def _parse_number(text: str) -> float:
+    # "90,000,000" / "90.000.000" -> 90000000 ; "0.5" -> 0.5
+    text = text.strip()
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", text):
+        return float(re.sub(r"[.,]", "", text))
+    return float(text.replace(",", "."))
+
+
+class AlertRule:
+    """
+    1 rule cảnh báo:
+    - kind "threshold": instrument <op> threshold (VD: gold.*sjc*.buy > 90000000).
+    - kind "change": |% thay đổi trong window_sec| > threshold (VD: fx.usd 0.5% trong 1h).
+    hysteresis: giá phải lùi quá ngưỡng +- hysteresis mới "mở khoá" lại rule sau khi đã báo.
+    cooldown_sec: khoảng cách tối thiểu giữa 2 lần báo của cùng rule.
+    """
+
+    __slots__ = (
+        "id", "kind", "instrument", "op", "threshold", "window_sec",
+        "hysteresis", "cooldown_sec", "label", "chat_id", "direction", "strict",
+    )
+
+    def __init__(
+        self,
+        rule_id: str,
+        instrument: str,
+        op: str,
+        threshold: float,
+        kind: str = "threshold",
+        window_sec: int = 0,
+        hysteresis: float = 0.0,
+        cooldown_sec: float = 3600.0,
+        label: Optional[str] = None,
+        chat_id: Any = None,
+    ) -> None:
+        if op not in OPS:
+            raise ValueError(f"Unknown operator: {op!r}")
+        if kind not in ("threshold", "change"):
+            raise ValueError(f"Unknown rule kind: {kind!r}")
+        self.id = rule_id
+        self.kind = kind
+        self.instrument = instrument
+        self.op = op
+        self.threshold = float(threshold)
+        self.window_sec = int(window_sec)
+        self.hysteresis = abs(float(hysteresis))
+        self.cooldown_sec = float(cooldown_sec)
+        self.label = label or instrument
+        self.chat_id = chat_id
+        self.direction, self.strict = OPS[op]
+
+    @property
+    def key(self) -> str:
+        """
+        Key index: rule "change" dùng chuỗi dẫn xuất (|% thay đổi| theo window) của instrument.
+        """
+        if self.kind == "change":
+            return f"{self.instrument}|chg{self.window_sec}"
+        return self.instrument
+
+    def describe(self) -> str:
+        if self.kind == "change":
+            return f"{self.label} biến động {self.op} {self.threshold:g}% trong {self.window_sec // 60} phút"
+        return f"{self.label} {self.op} {self.threshold:,.10g}"
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict[str, Any], rule_id: str, defaults: Dict[str, Any], aliases: Dict[str, str]
+    ) -> "AlertRule":
+        if "text" in data:
+            parsed = parse_rule_text(data["text"], aliases, defaults.get("variables", {}))
+            data = {**parsed, **{k: v for k, v in data.items() if k != "text"}}
+        window = data.get("window", 0)
+        return cls(
+            rule_id=str(data.get("id") or rule_id),
+            instrument=aliases.get(data["instrument"], data["instrument"]),
+            op=data.get("op", ">"),
+            threshold=float(data["threshold"]),
+            kind=data.get("kind", "threshold"),
+            window_sec=parse_duration(window) if isinstance(window, str) else int(window),
+            hysteresis=float(data.get("hysteresis", defaults.get("hysteresis", 0.0))),
+            cooldown_sec=float(data.get("cooldown_min", defaults.get("cooldown_min", 60))) * 60,
+            label=data.get("label"),
+            chat_id=data.get("chat_id"),
+        )
+
+
+def parse_rule_text(
+    text: str, aliases: Dict[str, str], variables: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """
+    Parse rule dạng text (dùng cho config / lệnh bot):
+      "SJC buy > 90,000,000"        -> threshold rule
+      "USD/VND moves > 0.5% in 1h"  -> change rule
+      "rain > rain_alert_mm"        -> ngưỡng lấy từ variables
+    subject được map qua aliases (VD: "SJC buy" -> "gold.*sjc*.buy").
+    """
+    text = text.strip()
+    m = _CHANGE_TEXT_RE.match(text)
+    if m:
+        subject = m.group("subject").strip()
+        return {
+            "kind": "change",
+            "instrument": aliases.get(subject, subject),
+            "op": ">",
+            "threshold": _parse_number(m.group("pct")),
+            "window": m.group("window"),
+            "label": subject,
+        }
+
+    m = _THRESHOLD_TEXT_RE.match(text)
+    if not m:
+        raise ValueError(f"Cannot parse alert rule: {text!r}")
+    subject = m.group("subject").strip()
+    raw_value = m.group("value")
+    if variables and raw_value in variables:
+        threshold = float(variables[raw_value])
+    else:
+        threshold = _parse_number(raw_value)
+    return {
+        "kind": "threshold",
+        "instrument": aliases.get(subject, subject),
+        "op": m.group("op"),
+        "threshold": threshold,
+        "label": subject,
+    }
+
+
+class FiredAlert:
+    def __init__(self, rule: AlertRule, value: float, at: float) -> None:
+        self.rule = rule
+        self.value = value
+        self.at = at
+
+    def render(self) -> str:
+        value = f"{self.value:+.2f}%" if self.rule.kind == "change" else f"{self.value:,.10g}"
+        return f"🔔 {self.rule.describe()} (hiện tại: {value})"
+
+
+class _SideIndex:
+    """
+    Các rule của 1 key (instrument) cùng hướng, lưu theo giá trị đã nhân hướng (s = direction * x)
+    để "lên trên ngưỡng" và "xuống dưới ngưỡng" dùng chung 1 logic:
+    - armed: sorted (s_threshold, strict, idx) -> rule đang chờ báo; điều kiện đúng khi
+      (s_threshold, strict) < (s_value, 1) => luôn là 1 đoạn đầu danh sách (bisect).
+    - disarmed: sorted (s_rearm, idx) với s_rearm = s_threshold - hysteresis; rule được mở
+      khoá lại khi s_value < s_rearm => 1 đoạn cuối danh sách.
+    """
+
+    __slots__ = ("armed", "disarmed")
+
+    def __init__(self) -> None:
+        self.armed: List[Tuple[float, int, int]] = []
+        self.disarmed: List[Tuple[float, int]] = []
+
+
+class AlertEngine:
+    """
+    Index rule theo instrument (pattern glob) + hướng, mỗi tick chỉ bisect vào đúng phần rule
+    có thể đổi trạng thái: O(log n + số rule báo / mở khoá) thay vì duyệt hết rule.
+    Trạng thái (armed, last_fired) lưu trong state["alerts"] -> báo 1 lần, không lặp lại mỗi poll.
+    """
+
+    STATE_KEY = "alerts"
+
+    def __init__(
+        self,
+        rules: List[AlertRule],
+        state: Optional[MutableMapping[str, Any]] = None,
+        history: Optional[TimeSeriesStore] = None,
+    ) -> None:
+        self.rules = rules
+        self.state = state
+        self.history = history
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._changed = False
+
+        saved = (state or {}).get(self.STATE_KEY) or {}
+        # rule_id -> {"armed", "last_fired"}: chỉ rule đã từng báo, cập nhật dần mỗi tick
+        self._saved: Dict[str, Dict[str, Any]] = {}
+        self._last_fired: Dict[int, float] = {}
+        self._index: Dict[Tuple[str, int], _SideIndex] = {}
+        self._windows: Dict[str, set] = {}  # pattern instrument -> các window của rule "change"
+        self._resolved: Dict[str, List[str]] = {}  # instrument thật -> các key pattern khớp
+
+        for idx, rule in enumerate(rules):
+            side = self._index.setdefault((rule.key, rule.direction), _SideIndex())
+            entry = saved.get(rule.id) or {}
+            s_threshold = rule.direction * rule.threshold
+            if entry.get("armed", True):
+                side.armed.append((s_threshold, int(rule.strict), idx))
+            else:
+                side.disarmed.append((s_threshold - rule.hysteresis, idx))
+            if entry.get("last_fired"):
+                self._last_fired[idx] = float(entry["last_fired"])
+                self._saved[rule.id] = {"armed": entry.get("armed", True), "last_fired": entry["last_fired"]}
+            if rule.kind == "change":
+                self._windows.setdefault(rule.instrument, set()).add(rule.window_sec)
+
+        for side in self._index.values():
+            side.armed.sort()
+            side.disarmed.sort()
+
+    @classmethod
+    def from_config(
+        cls,
+        alerts_cfg: Dict[str, Any],
+        state: Optional[MutableMapping[str, Any]] = None,
+        history: Optional[TimeSeriesStore] = None,
+    ) -> "AlertEngine":
+        logger = logging.getLogger(cls.__name__)
+        defaults = {
+            "hysteresis": alerts_cfg.get("hysteresis", 0.0),
+            "cooldown_min": alerts_cfg.get("cooldown_min", 60),
+            "variables": alerts_cfg.get("variables", {}),
+        }
+        aliases = alerts_cfg.get("aliases", {})
+        rules: List[AlertRule] = []
+        if alerts_cfg.get("enabled", True):
+            for i, data in enumerate(alerts_cfg.get("rules") or []):
+                if isinstance(data, str):
+                    data = {"text": data}
+                try:
+                    rules.append(AlertRule.from_dict(data, f"rule{i + 1}", defaults, aliases))
+                except (KeyError, ValueError) as exc:
+                    logger.warning("Invalid alert rule #%d %r: %s", i + 1, data, exc)
+        return cls(rules, state, history)
+
+    # ---------------------------
+    # Tick
+    # ---------------------------
+    def _keys_for(self, instrument: str) -> List[str]:
+        keys = self._resolved.get(instrument)
+        if keys is None:
+            patterns = {rule.instrument for rule in self.rules}
+            keys = [p for p in patterns if fnmatch.fnmatchcase(instrument, p)]
+            self._resolved[instrument] = keys
+        return keys
+
+    def _change_pct(self, instrument: str, value: float, window_sec: int, now: float) -> Optional[float]:
+        if self.history is None:
+            return None
+        # Giá gần nhất tại / trước (now - window) trong lịch sử
+        target = now - window_sec
+        points = self.history.query(instrument, target - max(window_sec, 3600), target)
+        if not points or not points[-1][1]:
+            return None
+        base = points[-1][1]
+        return (value - base) / base * 100
+
+    def tick(self, instrument: str, value: Optional[float], now: Optional[float] = None) -> List[FiredAlert]:
+        """
+        Giá mới của 1 instrument -> danh sách cảnh báo vừa kích hoạt.
+        """
+        if value is None or not self.rules:
+            return []
+        now = time.time() if now is None else now
+        fired: List[FiredAlert] = []
+        with self._lock:
+            for pattern in self._keys_for(instrument):
+                fired.extend(self._evaluate(pattern, float(value), now))
+                for window in self._windows.get(pattern, ()):
+                    pct = self._change_pct(instrument, float(value), window, now)
+                    if pct is not None:
+                        for alert in self._evaluate(f"{pattern}|chg{window}", abs(pct), now):
+                            alert.value = pct
+                            fired.append(alert)
+            changed, self._changed = self._changed, False
+            if changed:
+                # Trong lock: tick song song (service khác) không sửa _saved lúc đang chụp
+                self._save_state()
+        return fired
+
+    def _evaluate(self, key: str, value: float, now: float) -> List[FiredAlert]:
+        fired: List[FiredAlert] = []
+        for direction in (1, -1):
+            side = self._index.get((key, direction))
+            if side is None:
+                continue
+            s_value = direction * value
+
+            # Mở khoá lại: s_value < s_rearm (đoạn cuối của disarmed)
+            cut = bisect_left(side.disarmed, (s_value, float("inf")))
+            if cut < len(side.disarmed):
+                self._changed = True
+                for _, idx in side.disarmed[cut:]:
+                    rule = self.rules[idx]
+                    insort(side.armed, (direction * rule.threshold, int(rule.strict), idx))
+                    self._saved.setdefault(rule.id, {"last_fired": None})["armed"] = True
+                del side.disarmed[cut:]
+
+            # Điều kiện đúng: (s_threshold, strict) < (s_value, 1) (đoạn đầu của armed)
+            end = bisect_left(side.armed, (s_value, 1))
+            still_armed = []
+            for entry in side.armed[:end]:
+                idx = entry[2]
+                rule = self.rules[idx]
+                last = self._last_fired.get(idx)
+                if last is not None and now - last < rule.cooldown_sec:
+                    still_armed.append(entry)  # đang cooldown: giữ armed, báo khi hết cooldown
+                    continue
+                self._last_fired[idx] = now
+                self._saved[rule.id] = {"armed": False, "last_fired": now}
+                self._changed = True
+                insort(side.disarmed, (entry[0] - rule.hysteresis, idx))
+                fired.append(FiredAlert(rule, value, now))
+            if end:
+                side.armed[:end] = still_armed
+        return fired
+
+    def _save_state(self) -> None:
+        if self.state is None:
+            return
+        # StateStore chụp JSON lúc gán -> _saved tiếp tục cập nhật dần không ảnh hưởng bản đã lưu
+        self.state[self.STATE_KEY] = self._saved
+
+
+_engine: Optional[AlertEngine] = None
+_engine_lock = threading.Lock()
+
+
+def configure_alerts(
+    alerts_cfg: Dict[str, Any],
+    state: Optional[MutableMapping[str, Any]] = None,
+    history: Optional[TimeSeriesStore] = None,
+) -> AlertEngine:
+    global _engine
+    with _engine_lock:
+        _engine = AlertEngine.from_config(alerts_cfg or {}, state, history)
+        return _engine
+
+
+def get_alert_engine() -> AlertEngine:
+    """
+    Chưa configure -> engine rỗng (tick không làm gì).
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = AlertEngine([])
+    return _engine
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler, Updater
+
+from telegram_queue import TokenBucket
+
+# handler(args) -> message HTML trả lời
+CommandFunc = Callable[[List[str]], str]
+# reply(chat_id, text_html) - gửi câu trả lời (TelegramClient.reply: chung rate limit / retry)
+ReplyFunc = Callable[[Any, str], Any]
+
+HELP_TEXT = (
+    "🤖 <b>Các lệnh</b>\n"
+    "/gold - Giá vàng PNJ\n"
+    "/fuel - Giá xăng dầu PVOIL\n"
+    "/fx - Tỷ giá VND\n"
+    "/weather [thành phố] - Thời tiết\n"
+    "/news - Tin tức mới nhất"
+)
+RATE_LIMITED_TEXT = "⏳ Bạn gửi lệnh hơi nhanh, thử lại sau ít giây nhé."
+
+
+class CommandRouter:
+    """
+    Xử lý lệnh tương tác (/gold, /fuel, /fx, /weather <city>, /news) từ dữ liệu đã cache
+    của các service (không gọi upstream trong lúc trả lời -> phản hồi nhanh, nhiều lệnh
+    dồn dập không nhân số request lên upstream).
+    Giới hạn tần suất theo từng user (token bucket, giữ tối đa max_users bucket gần nhất).
+    Dùng chung cho long polling (CommandPoller) và webhook.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, CommandFunc],
+        rate_per_min: float = 10.0,
+        burst: int = 3,
+        max_users: int = 10000,
+    ) -> None:
+        self.handlers = dict(handlers)
+        self.handlers.setdefault("help", lambda args: HELP_TEXT)
+        self.handlers.setdefault("start", lambda args: HELP_TEXT)
+        self.rate = float(rate_per_min) / 60.0
+        self.burst = max(1, int(burst))
+        self.max_users = max(1, int(max_users))
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[Any, TokenBucket]" = OrderedDict()
+        # user đã được báo "chậm lại" (chỉ báo 1 lần cho tới khi được phép lại)
+        self._notified: set = set()
+
+    @classmethod
+    def from_services(
+        cls,
+        commands_cfg: Dict[str, Any],
+        gold_fx_service: Any,
+        weather_service: Any,
+        news_service: Any,
+    ) -> "CommandRouter":
+        handlers: Dict[str, CommandFunc] = {
+            "gold": lambda args: gold_fx_service.render_section("gold"),
+            "fuel": lambda args: gold_fx_service.render_section("fuel"),
+            "fx": lambda args: gold_fx_service.render_section("fx"),
+            "weather": lambda args: weather_service.render_city(" ".join(args) or None),
+            "news": lambda args: news_service.render_latest(),
+        }
+        return cls(
+            handlers,
+            rate_per_min=float(commands_cfg.get("rate_per_min", 10)),
+            burst=int(commands_cfg.get("burst", 3)),
+            max_users=int(commands_cfg.get("max_users", 10000)),
+        )
+
+    @property
+    def commands(self) -> List[str]:
+        return list(self.handlers)
+
+    @staticmethod
+    def parse(text: str) -> Optional[tuple]:
+        """
+        "/weather@my_bot Hà Nội" -> ("weather", ["Hà", "Nội"]); không phải lệnh -> None.
+        """
+        if not text or not text.startswith("/"):
+            return None
+        parts = text.split()
+        command = parts[0][1:].split("@", 1)[0].lower()
+        return (command, parts[1:]) if command else None
+
+    def allow(self, user_id: Any) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[user_id] = bucket
+                if len(self._buckets) > self.max_users:
+                    old_user, _ = self._buckets.popitem(last=False)
+                    self._notified.discard(old_user)
+            else:
+                self._buckets.move_to_end(user_id)
+        return bucket.try_acquire()
+
+    def handle(self, user_id: Any, text: str) -> Optional[str]:
+        """
+        Trả về message HTML để reply, hoặc None nếu không cần trả lời
+        (không phải lệnh / lệnh lạ / đã báo rate limit rồi).
+        """
+        parsed = self.parse(text)
+        if parsed is None:
+            return None
+        command, args = parsed
+        handler = self.handlers.get(command)
+        if handler is None:
+            return None
+
+        if not self.allow(user_id):
+            with self._lock:
+                if user_id in self._notified:
+                    return None
+                self._notified.add(user_id)
+            self.logger.info("Rate limited user %s (/%s)", user_id, command)
+            return RATE_LIMITED_TEXT
+        with self._lock:
+            self._notified.discard(user_id)
+
+        start = time.perf_counter()
+        try:
+            reply = handler(args)
+        except Exception as exc:
+            self.logger.exception("/%s failed: %s", command, exc)
+            reply = "⚠️ Có lỗi khi xử lý lệnh, thử lại sau."
+        self.logger.info("/%s for user %s handled in %.1fms", command, user_id, (time.perf_counter() - start) * 1000)
+        return reply
+
+
+class CommandPoller:
+    """
+    Nhận lệnh qua long polling (telegram.ext.Updater của PTB 13).
+    Handler chạy run_async trên thread pool của Dispatcher (workers) -> nhiều lệnh
+    được xử lý song song, 1 lệnh chậm không chặn các lệnh khác.
+    Trả lời qua reply (như WebhookServer), không gọi message.reply_text trực tiếp:
+    burst lệnh đi qua token bucket / RetryAfter của send_queue, không làm Telegram
+    429 luôn cả message định kỳ.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        router: CommandRouter,
+        reply: ReplyFunc,
+        workers: int = 8,
+        poll_timeout: float = 30.0,
+        base_url: Optional[str] = None,
+    ) -> None:
+        self.router = router
+        self.reply = reply
+        self.poll_timeout = float(poll_timeout)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        workers = max(1, int(workers))
+        self.updater = Updater(
+            token=bot_token,
+            base_url=base_url,
+            workers=workers,
+            use_context=True,
+            # Pool kết nối đủ cho getUpdates + các reply chạy song song
+            request_kwargs={"con_pool_size": workers + 4},
+        )
+        self.updater.dispatcher.add_handler(
+            CommandHandler(router.commands, self._on_command, run_async=True)
+        )
+
+    @classmethod
+    def from_config(
+        cls,
+        bot_token: str,
+        router: CommandRouter,
+        reply: ReplyFunc,
+        commands_cfg: Dict[str, Any],
+        base_url: Optional[str] = None,
+    ) -> "CommandPoller":
+        return cls(
+            bot_token,
+            router,
+            reply,
+            workers=int(commands_cfg.get("workers", 8)),
+            poll_timeout=float(commands_cfg.get("poll_timeout_sec", 30)),
+            base_url=base_url,
+        )
+
+    def _on_command(self, update: Update, context: CallbackContext) -> None:
+        message = update.effective_message
+        user = update.effective_user
+        if message is None or not message.text:
+            return
+        reply = self.router.handle(user.id if user else message.chat_id, message.text)
+        if not reply:
+            return
+        self.reply(message.chat_id, reply)
+
+    def start(self) -> None:
+        # Lệnh gửi lúc bot tắt đã cũ -> bỏ, không trả lời dồn khi khởi động lại
+        self.updater.start_polling(
+            timeout=self.poll_timeout,
+            drop_pending_updates=True,
+            allowed_updates=["message"],
+        )
+        self.logger.info("Command polling started: /%s", " /".join(self.router.commands))
+
+    def stop(self) -> None:
+        self.updater.stop()
+        self.logger.info("Command polling stopped")
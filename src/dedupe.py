@@ -0,0 +1,78 @@
+import hashlib
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Tham số tracking không làm đổi nội dung bài -> bỏ khi chuẩn hoá URL
+TRACKING_PARAM_PREFIXES = ("utm_", "at_")
+TRACKING_PARAMS = {"fbclid", "gclid", "ocid", "cmpid", "ns_source", "ns_mchannel", "ns_campaign"}
+
+# 8 byte sha1 (16 ký tự hex): xác suất trùng không đáng kể với vài nghìn URL
+HASH_BYTES = 8
+
+
+def normalize_url(url: str) -> str:
+    """
+    Chuẩn hoá URL bài viết để cùng 1 bài từ nhiều nguồn / query ra cùng 1 key:
+    scheme + host viết thường, bỏ fragment, bỏ tham số tracking, bỏ "/" cuối.
+    """
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith(TRACKING_PARAM_PREFIXES)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), "")
+    )
+
+
+def url_hash(url: str) -> str:
+    digest = hashlib.sha1(normalize_url(url).encode("utf-8")).digest()
+    return digest[:HASH_BYTES].hex()
+
+
+class RecentHashSet:
+    """
+    Tập hash có giới hạn kích thước, đẩy ra theo LRU (hash lâu không gặp lại bị xoá trước).
+    Dùng để nhớ các bài đã gửi: bộ nhớ và kích thước state.json cố định (~capacity * 16 ký tự)
+    dù bot chạy bao lâu.
+    """
+
+    def __init__(self, capacity: int = 2000) -> None:
+        self.capacity = max(1, int(capacity))
+        self._items: "OrderedDict[str, None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def touch(self, key: str) -> bool:
+        """
+        Đánh dấu key vừa gặp lại (giữ nó khỏi bị đẩy ra). Trả về True nếu key đã có.
+        """
+        if key in self._items:
+            self._items.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key: str) -> None:
+        self._items[key] = None
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def to_state(self) -> List[str]:
+        # cũ -> mới, để load lại giữ đúng thứ tự LRU
+        return list(self._items)
+
+    @classmethod
+    def from_state(cls, data: Optional[Iterable[str]], capacity: int = 2000) -> "RecentHashSet":
+        seen = cls(capacity)
+        for key in data or []:
+            if isinstance(key, str):
+                seen.add(key)
+        return seen
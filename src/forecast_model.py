@@ -0,0 +1,120 @@
+import math
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+NAN = float("nan")
+
+
+class ForecastIndex:
+    """
+    Dữ liệu /forecast (3h/slot) parse 1 lần thành các mảng song song (columnar):
+    - timestamps (dt), temps (°C, NaN nếu thiếu), rains (mm/3h), hours (giờ local theo dt_txt)
+    - desc_ids: index vào self.descs (-1 nếu không có mô tả)
+    - date_ranges: "YYYY-MM-DD" -> (start, end) slot, theo thứ tự ngày.
+    OpenWeather trả slot theo thứ tự thời gian nên slot của 1 ngày luôn liền nhau.
+    """
+
+    __slots__ = ("timestamps", "temps", "rains", "hours", "desc_ids", "descs", "date_ranges")
+
+    def __init__(self) -> None:
+        self.timestamps = array("q")
+        self.temps = array("d")
+        self.rains = array("d")
+        self.hours = array("b")
+        self.desc_ids = array("i")
+        self.descs: List[str] = []
+        self.date_ranges: Dict[str, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_forecast(cls, forecast: Optional[Dict[str, Any]]) -> "ForecastIndex":
+        index = cls()
+        if not forecast:
+            return index
+
+        desc_lookup: Dict[str, int] = {}
+        current_date: Optional[str] = None
+        current_start = 0
+
+        for item in forecast.get("list", []):
+            dt_txt = item.get("dt_txt")  # "2025-11-16 12:00:00"
+            if not dt_txt:
+                continue
+            date_str, _, time_str = dt_txt.partition(" ")
+
+            slot = len(index.timestamps)
+            if date_str != current_date:
+                if current_date is not None:
+                    index.date_ranges[current_date] = (current_start, slot)
+                current_date = date_str
+                current_start = slot
+
+            index.timestamps.append(int(item.get("dt") or 0))
+
+            temp = (item.get("main") or {}).get("temp")
+            try:
+                index.temps.append(float(temp) if temp is not None else NAN)
+            except (TypeError, ValueError):
+                index.temps.append(NAN)
+
+            mm = (item.get("rain") or {}).get("3h", 0.0)
+            try:
+                index.rains.append(float(mm))
+            except (TypeError, ValueError):
+                index.rains.append(0.0)
+
+            try:
+                index.hours.append(int(time_str[:2]))
+            except ValueError:
+                index.hours.append(-1)
+
+            weather_arr = item.get("weather") or []
+            desc = weather_arr[0].get("description") if weather_arr else None
+            if desc:
+                desc_id = desc_lookup.get(desc)
+                if desc_id is None:
+                    desc_id = desc_lookup[desc] = len(index.descs)
+                    index.descs.append(desc)
+                index.desc_ids.append(desc_id)
+            else:
+                index.desc_ids.append(-1)
+
+        if current_date is not None:
+            index.date_ranges[current_date] = (current_start, len(index.timestamps))
+
+        return index
+
+    def temp_range(self, start: int, end: int) -> Tuple[Optional[float], Optional[float]]:
+        lo = hi = None
+        for t in self.temps[start:end]:
+            if math.isnan(t):
+                continue
+            if lo is None or t < lo:
+                lo = t
+            if hi is None or t > hi:
+                hi = t
+        return lo, hi
+
+    def max_rain(self, n_slots: int) -> float:
+        head = self.rains[:n_slots]
+        return max(head) if head else 0.0
+
+    def total_rain(self, start: int, end: int) -> float:
+        return sum(self.rains[start:end])
+
+    def day_desc(self, start: int, end: int) -> Optional[str]:
+        """
+        Mô tả chính trong ngày: ưu tiên slot 12:00, không có thì lấy slot đầu tiên có mô tả.
+        """
+        first = None
+        for i in range(start, end):
+            desc_id = self.desc_ids[i]
+            if desc_id < 0:
+                continue
+            if self.hours[i] == 12:
+                return self.descs[desc_id]
+            if first is None:
+                first = desc_id
+        return self.descs[first] if first is not None else None
@@ -1,9 +1,13 @@
 import logging
-from typing import Any, Dict, Optional
-from bs4 import BeautifulSoup
-from util import http_get_json
-import re
-import requests
+from typing import Any, Dict, Optional, Tuple
+from util import http_get_json, http_get_parsed
+from ttl_cache import get_ttl_cache
+from pvoil_parser import parse_pvoil_price_table
+from snapshots import SectionSnapshots
+from service_runner import run_parallel
+from timeseries import get_history, instrument_slug
+from trends import HORIZONS, TrendAnalyzer
+from alert_rules import get_alert_engine
 from typing import Dict
 import math
 from datetime import datetime, timezone, timedelta
@@ -20,6 +24,7 @@ class GoldFxService:
         self.config = config
         self.access_key = secrets.get("exchangerate_access_key")
         self.logger = logging.getLogger(self.__class__.__name__)
+        self._trends: Optional[TrendAnalyzer] = None
 
     def _fetch_generic_price(self, url_key: str) -> Optional[float]:
         url = self.config.get(url_key)
@@ -53,7 +58,8 @@ class GoldFxService:
         if not url:
             return None
 
-        data = http_get_json(url)
+        # PNJ hay trả y hệt giữa các lần chạy -> conditional GET
+        data = http_get_json(url, use_cache=True)
         if not data:
             return None
 
@@ -106,65 +112,19 @@ class GoldFxService:
         if not url:
             return None
 
-        resp = requests.get(url, timeout=15)
-        resp.raise_for_status()
-
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        # Ưu tiên table trong .oilpricescontainer, fallback sang table.table đầu tiên
-        container = soup.select_one(".oilpricescontainer")
-        table = None
-        if container:
-            table = container.find("table")
-        if not table:
-            table = soup.find("table", class_="table")
-        if not table:
+        # 304 Not Modified -> dùng lại bảng đã parse lần trước, không parse lại HTML
+        return http_get_parsed(
+            url,
+            lambda resp: self._parse_pvoil_html(resp.text),
+            cache_tag="pvoil_table",
+            timeout=15,
+        )
+
+    def _parse_pvoil_html(self, html: str) -> Optional[list[dict]]:
+        rows = parse_pvoil_price_table(html)
+        if rows is None:
             self.logger.warning("PVOIL: không tìm thấy <table> giá xăng dầu")
-            return None
-
-        tbody = table.find("tbody") or table
-
-        def parse_int_from_text(s: str) -> int | None:
-            # "20.570 đ" -> 20570
-            digits = re.sub(r"[^\d]", "", s)
-            return int(digits) if digits else None
-
-        def parse_delta(s: str) -> int | None:
-            # "+160" -> 160, "-50" -> -50
-            m = re.search(r"([+-]?\d+)", s)
-            return int(m.group(1)) if m else None
-
-        rows: list[dict] = []
-
-        for tr in tbody.find_all("tr"):
-            tds = [td.get_text(strip=True) for td in tr.find_all("td")]
-            if len(tds) < 4:
-                continue
-
-            stt_text = tds[0]
-            name = tds[1]          # cột "Mặt hàng" (colspan=2 nhưng mình chỉ cần text)
-            price_text = tds[-2]   # cột giá điều chỉnh
-            delta_text = tds[-1]   # cột chênh lệch
-
-            try:
-                stt = int(stt_text)
-            except ValueError:
-                # dòng header hoặc rác
-                continue
-
-            price = parse_int_from_text(price_text)
-            delta = parse_delta(delta_text)
-
-            rows.append(
-                {
-                    "stt": stt,
-                    "name": name,
-                    "price": price,
-                    "delta": delta,
-                }
-            )
-
-        return rows or None
+        return rows
 
     def fetch_gasoline_price(self) -> Optional[float]:
         return self._fetch_generic_price("gasoline_api_url")
@@ -172,7 +132,11 @@ class GoldFxService:
     def fetch_usd_vnd(self) -> Optional[float]:
         return self._fetch_generic_price("usd_vnd_api_url")
 
-    def fetch_vnd_rates(self) -> Dict[str, float]:
+    def fetch_vnd_rates(self) -> Optional[Tuple[Dict[str, float], Optional[int]]]:
+        """
+        (VND cho 1 đơn vị ngoại tệ, timestamp UTC của tỷ giá) trả về cùng nhau: không lưu vào
+        instance vì service được gọi song song (fetch song song, refresh nền, lệnh bot).
+        """
         url = self.config.get("exchangerate_api_url")
         if not url:
             return None
@@ -182,13 +146,12 @@ class GoldFxService:
             "currencies": "USD,JPY,KRW,CNY",
             "access_key": self.access_key,
         }
-        resp = requests.get(url, params=params, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        data = http_get_json(url, params=params, timeout=15)
+        if not data:
+            return None
         rates = data["quotes"]   # USD/JPY/KRW/CNY trên 1 VND
 
         timestamp = data.get("timestamp")   # ⭐ lấy timestamp UTC
-        self.fx_timestamp = timestamp       # ⭐ lưu vào biến instance
 
         result = {}
         for code, v in rates.items():
@@ -196,7 +159,17 @@ class GoldFxService:
             if v:
                 result[code] = 1.0 / v
 
-        return result
+        return result, timestamp
+
+    def fetch_fx_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Tỷ giá + timestamp gộp 1 object (để cache được cả timestamp).
+        """
+        fetched = self.fetch_vnd_rates()
+        if not fetched or not fetched[0]:
+            return None
+        rates, timestamp = fetched
+        return {"rates": rates, "timestamp": timestamp}
 
     def round_sig(self, x, sig=3):
         if x == 0:
@@ -222,119 +195,373 @@ class GoldFxService:
         # format đẹp
         return dt_vn.strftime("%d/%m/%Y %H:%M:%S")
 
-    def build_summary(self) -> str:
+    # -------------------------------------------------------------
+    # Snapshot có cấu trúc cho change detection (giá trị đúng như hiển thị)
+    # -------------------------------------------------------------
+    FX_CODES = (("VNDUSD", "USD"), ("VNDJPY", "JPY"), ("VNDKRW", "KRW"), ("VNDCNY", "CNY"))
+
+    def _gold_snapshot(self, gold_list) -> Dict[str, list]:
+        return {name: [buy, sell] for name, buy, sell in gold_list}
+
+    def _fuel_snapshot(self, gases) -> Dict[str, Optional[int]]:
+        return {r["name"]: r.get("price") for r in gases}
+
+    def _fx_snapshot(self, rates_vnd: Dict[str, float]) -> Dict[str, float]:
+        return {
+            label: self.round_sig(rates_vnd[key], 3)
+            for key, label in self.FX_CODES
+            if rates_vnd.get(key) is not None
+        }
+
+    # -------------------------------------------------------------
+    # Lịch sử giá (time-series): mỗi dòng vàng / xăng / tỷ giá là 1 instrument
+    # -------------------------------------------------------------
+    # Tỷ giá là số thực (VND / 1 KRW ~ 18.x) -> lưu số nguyên * FX_SCALE
+    FX_SCALE = 10000
+
+    def _instrument_prices(self, gold, fuel, fx) -> list[tuple[float, Dict[str, float], int]]:
+        """
+        [(fetched_at, {instrument: giá}, scale)] cho từng nguồn lấy được dữ liệu.
+        """
+        batches = []
+        if gold and gold.value:
+            prices: Dict[str, float] = {}
+            for name, buy, sell in gold.value:
+                slug = instrument_slug(name)
+                prices[f"gold.{slug}.buy"] = buy
+                prices[f"gold.{slug}.sell"] = sell
+            batches.append((gold.fetched_at, prices, 1))
+        if fuel and fuel.value:
+            batches.append(
+                (
+                    fuel.fetched_at,
+                    {f"fuel.{instrument_slug(r['name'])}": r.get("price") for r in fuel.value},
+                    1,
+                )
+            )
+        if fx and fx.value:
+            rates = fx.value["rates"]
+            batches.append(
+                (
+                    fx.fetched_at,
+                    {f"fx.{label.lower()}": rates.get(key) for key, label in self.FX_CODES},
+                    self.FX_SCALE,
+                )
+            )
+        return batches
+
+    def _record_history(self, batches) -> None:
+        history = get_history()
+        if not history.enabled:
+            return
+
+        written = 0
+        for fetched_at, prices, scale in batches:
+            written += history.record(fetched_at, prices, scale=scale)
+        if written:
+            self.logger.info("Recorded %d price point(s) to history", written)
+
+    def _check_alerts(self, batches) -> list[str]:
+        engine = get_alert_engine()
+        lines = []
+        for fetched_at, prices, _ in batches:
+            for instrument, value in prices.items():
+                lines.extend(alert.render() for alert in engine.tick(instrument, value, fetched_at))
+        return [html_escape(line) for line in lines]
+
+    # -------------------------------------------------------------
+    # Xu hướng (1N / 7N / 30N, MA, min-max, biến động) từ lịch sử giá
+    # -------------------------------------------------------------
+    DEFAULT_TREND_INSTRUMENTS = [
+        {"label": "Vàng SJC (bán)", "match": "gold.*sjc*.sell"},
+        {"label": "Xăng RON 95", "match": "fuel.*ron_95*"},
+        {"label": "USD/VND", "match": "fx.usd"},
+    ]
+
+    def _trend_analyzer(self) -> Optional[TrendAnalyzer]:
+        history = get_history()
+        if not history.enabled:
+            return None
+        # Giữ analyzer giữa các lần chạy (daemon) -> chỉ nạp thêm điểm mới
+        if self._trends is None or self._trends.history is not history:
+            trends_cfg = self.config.get("trends", {})
+            self._trends = TrendAnalyzer(
+                history,
+                window_days=int(trends_cfg.get("window_days", 30)),
+                ma_short_days=int(trends_cfg.get("ma_short_days", 7)),
+                ma_long_days=int(trends_cfg.get("ma_long_days", 30)),
+            )
+        return self._trends
+
+    def _render_trends(self) -> list[str]:
+        trends_cfg = self.config.get("trends", {})
+        if not trends_cfg.get("enabled", True):
+            return []
+        analyzer = self._trend_analyzer()
+        if analyzer is None:
+            return []
+
+        instruments = trends_cfg.get("instruments") or self.DEFAULT_TREND_INSTRUMENTS
+        stats = analyzer.compute_many([item["match"] for item in instruments])
+
+        def pct(v: Optional[float]) -> str:
+            return f"<code>{v:+.2f}%</code>" if v is not None else "<code>n/a</code>"
+
+        def num(v: Optional[float]) -> str:
+            return f"<code>{self.pretty_number(v)}</code>" if v is not None else "<code>n/a</code>"
+
+        lines = []
+        for item in instruments:
+            st = stats.get(item["match"])
+            if st is None:
+                continue
+            changes = " · ".join(f"{label} {pct(st.changes.get(label))}" for label, _ in HORIZONS)
+            lines.append(f"- {html_escape(item['label'])}: {num(st.last)} · {changes}")
+            detail = (
+                f"  MA{analyzer.ma_short_days} {num(st.ma_short)} · MA{analyzer.ma_long_days} {num(st.ma_long)}"
+                f" · min/max {num(st.low)} – {num(st.high)}"
+            )
+            if st.volatility is not None:
+                detail += f" · σ <code>{st.volatility:.2f}%</code>/ngày"
+            lines.append(detail)
+
+        if not lines:
+            return []
+        return ["📈 <b>Xu hướng</b>"] + lines
+
+    # -------------------------------------------------------------
+    # Render từng section (prev: snapshot lần trước để hiện chênh lệch)
+    # -------------------------------------------------------------
+    def _render_gold(self, gold_list, as_of: str, prev: Optional[Dict[str, list]]) -> list[str]:
+        lines = [f"🏆 <b>Giá vàng PNJ (Giá mua → Giá bán):</b>{as_of}"]
+
+        def gold_line(name: str, buy: int, sell: int) -> str:
+            line = f"- {html_escape(name)}: <code>{buy:,}</code> → <code>{sell:,}</code>"
+            old = (prev or {}).get(name)
+            if old and (old[0] != buy or old[1] != sell):
+                line += f" <i>(mua {buy - old[0]:+,}, bán {sell - old[1]:+,})</i>"
+            return line
+
+        # Lấy SJC nổi bật trước
+        for name, buy, sell in gold_list:
+            if "SJC" in name:
+                lines.append(gold_line(name, buy, sell))
+                break
+
+        # Những vàng khác
+        for name, buy, sell in gold_list:
+            if "SJC" not in name:
+                lines.append(gold_line(name, buy, sell))
+        return lines
+
+    def _render_fuel(self, gases, as_of: str, prev: Optional[Dict[str, int]]) -> list[str]:
+        lines = [f"⛽ <b>Bảng giá xăng dầu PVOIL</b>{as_of}"]
+        for r in gases:
+            delta = f"{r['delta']:+d}" if r.get("delta") is not None else "0"
+            safe_name = html_escape(r["name"])
+            line = f"{r['stt']}. {safe_name}: <code>{r['price']:,} đ</code> (Δ <code>{delta}</code>)"
+            old = (prev or {}).get(r["name"])
+            if old is not None and r.get("price") is not None and old != r["price"]:
+                line += f" <i>(so với lần trước {r['price'] - old:+,} đ)</i>"
+            lines.append(line)
+        return lines
+
+    def _render_fx(
+        self, rates_vnd: Dict[str, float], timestamp, as_of: str, prev: Optional[Dict[str, float]]
+    ) -> list[str]:
+        # convert_timestamp_to_vn có lỗi thì vẫn hiển thị N/A
+        try:
+            ts_vn = self.convert_timestamp_to_vn(timestamp)
+        except Exception:
+            ts_vn = "N/A"
+
+        lines = [f"💰 <b>Cập nhật tỷ giá VND: {ts_vn} (UTC+7)</b>{as_of}"]
+
+        def change_note(label: str, val: float) -> str:
+            old = (prev or {}).get(label)
+            if not old or old == val:
+                return ""
+            return f" <i>({(val - old) / old * 100:+.2f}%)</i>"
+
+        # Helper nhỏ để tránh KeyError từng currency
+        def add_rate(key: str, label: str, extra_note: str | None = None):
+            value = rates_vnd.get(key)
+            if value is None:
+                return
+            val = self.round_sig(value, 3)
+            line = f"- 1 {html_escape(label)} = <code>{self.pretty_number(val)} VND</code>"
+            if extra_note:
+                line += f"  <i>({html_escape(extra_note)})</i>"
+            line += change_note(label, val)
+            lines.append(line)
+
+        # 1 USD, 1 JPY, 1 MAN, 1 KRW, 1 CNY
+        add_rate("VNDUSD", "USD")
+
+        jpy_value = rates_vnd.get("VNDJPY")
+        if jpy_value is not None:
+            jpy = self.round_sig(jpy_value, 3)
+            add_rate("VNDJPY", "JPY", "Yên Nhật")
+            man = self.round_sig(jpy * 10000, 3)
+            lines.append(
+                f"- 1 MAN = <code>{self.pretty_number(man)} VND</code>  "
+                f"<i>(Man Nhật – 10,000 Yên)</i>"
+            )
+
+        krw_value = rates_vnd.get("VNDKRW")
+        if krw_value is not None:
+            krw = self.round_sig(krw_value, 3)
+            lines.append(
+                f"- 1 KRW = <code>{self.pretty_number(krw)} VND</code>  "
+                f"<i>(Won Hàn Quốc)</i>{change_note('KRW', krw)}"
+            )
+
+        cny_value = rates_vnd.get("VNDCNY")
+        if cny_value is not None:
+            cny = self.round_sig(cny_value, 3)
+            lines.append(
+                f"- 1 CNY = <code>{self.pretty_number(cny)} VND</code>  "
+                f"<i>(Nhân dân tệ Trung Quốc)</i>{change_note('CNY', cny)}"
+            )
+        return lines
+
+    def render_section(self, section: str) -> str:
+        """
+        Trả lời lệnh /gold, /fuel, /fx từ dữ liệu đã cache (không chờ upstream).
+        Cache quá hạn -> trả bản đang có, refresh nền.
+        """
+        cache = get_ttl_cache()
+        warming = "⏳ Đang cập nhật dữ liệu, thử lại sau ít giây."
+        if section == "gold":
+            gold = cache.peek("gold_fx:pnj", refresh=self.fetch_pnj_gold)
+            if not gold or not gold.value:
+                return warming
+            return "\n".join(self._render_gold(gold.value, gold.as_of_note(), None))
+        if section == "fuel":
+            fuel = cache.peek("gold_fx:pvoil", refresh=self.fetch_pvoil_price_table)
+            if not fuel or not fuel.value:
+                return warming
+            return "\n".join(self._render_fuel(fuel.value, fuel.as_of_note(), None))
+        if section == "fx":
+            fx = cache.peek("gold_fx:fx", refresh=self.fetch_fx_snapshot)
+            if not fx or not fx.value:
+                return warming
+            return "\n".join(
+                self._render_fx(fx.value["rates"], fx.value["timestamp"], fx.as_of_note(), None)
+            )
+        raise ValueError(f"Unknown gold_fx section: {section}")
+
+    def build_summary(self, state: Optional[Dict[str, Any]] = None) -> str:
+        """
+        state != None: bật change detection (config "change_detection"):
+        - "collapse" (mặc định): section không đổi thu gọn thành 1 dòng "không đổi".
+        - "suppress": bỏ hẳn section không đổi.
+        - "off": luôn gửi đầy đủ.
+        Không section nào đổi -> trả "" (không gửi message).
+        """
         if not self.config.get("enabled", True):
             return ""
 
-        # Dùng HTML: <b>, <i>, <code>...
-        lines = ["💰 <b>Giá vàng / xăng / tỷ giá</b>"]
+        mode = self.config.get("change_detection", "collapse")
+        snapshots = SectionSnapshots(state if mode != "off" else None, "gold_fx")
+        cache = get_ttl_cache()
+
+        # PNJ / PVOIL / tỷ giá độc lập nhau -> fetch song song, nguồn chậm không kéo nguồn khác
+        fetched = run_parallel(
+            {
+                "gold": lambda: cache.get("gold_fx:pnj", self.fetch_pnj_gold),
+                "fuel": lambda: cache.get("gold_fx:pvoil", self.fetch_pvoil_price_table),
+                "fx": lambda: cache.get("gold_fx:fx", self.fetch_fx_snapshot),
+            },
+            thread_name_prefix="gold_fx",
+        )
+
+        # Bản cache / fallback có fetched_at cũ -> history tự bỏ qua (không ghi trùng)
+        batches = self._instrument_prices(fetched["gold"], fetched["fuel"], fetched["fx"])
+        try:
+            self._record_history(batches)
+        except Exception as exc:
+            self.logger.exception("Recording price history failed: %s", exc)
+        try:
+            alert_lines = self._check_alerts(batches)
+        except Exception as exc:
+            self.logger.exception("Price alert evaluation failed: %s", exc)
+            alert_lines = []
+
+        # (tiêu đề thu gọn, snapshot, lines đầy đủ) hoặc lines báo lỗi
+        sections: list[tuple[str, Optional[Any], list[str]]] = []
 
         # ---------------------------
         # GOLD
         # ---------------------------
-        try:
-            gold_list = self.fetch_pnj_gold()
-        except Exception:
-            gold_list = None
-
+        gold = fetched["gold"]
+        gold_list = gold.value if gold else None
         if gold_list:
-            lines.append("🏆 <b>Giá vàng PNJ (Giá mua → Giá bán):</b>")
-
-            # Lấy SJC nổi bật trước
-            for name, buy, sell in gold_list:
-                if "SJC" in name:
-                    safe_name = html_escape(name)
-                    lines.append(
-                        f"- {safe_name}: <code>{buy:,}</code> → <code>{sell:,}</code>"
-                    )
-                    break
-
-            # Những vàng khác
-            for name, buy, sell in gold_list:
-                if "SJC" not in name:
-                    safe_name = html_escape(name)
-                    lines.append(
-                        f"- {safe_name}: <code>{buy:,}</code> → <code>{sell:,}</code>"
-                    )
+            snap = self._gold_snapshot(gold_list)
+            lines = self._render_gold(gold_list, gold.as_of_note(), snapshots.previous("gold"))
+            sections.append(("gold", snap, lines))
         else:
-            lines.append("- Vàng: <i>không lấy được dữ liệu</i>")
+            sections.append(("gold", None, ["- Vàng: <i>không lấy được dữ liệu</i>"]))
 
         # ---------------------------
         # GAS (PVOIL)
         # ---------------------------
-        try:
-            gases = self.fetch_pvoil_price_table()
-        except Exception:
-            gases = None
-
+        fuel = fetched["fuel"]
+        gases = fuel.value if fuel else None
         if gases:
-            lines.append("⛽ <b>Bảng giá xăng dầu PVOIL</b>")
-            for r in gases:
-                delta = f"{r['delta']:+d}" if r.get("delta") is not None else "0"
-                safe_name = html_escape(r["name"])
-                lines.append(
-                    f"{r['stt']}. {safe_name}: <code>{r['price']:,} đ</code> (Δ <code>{delta}</code>)"
-                )
+            snap = self._fuel_snapshot(gases)
+            lines = self._render_fuel(gases, fuel.as_of_note(), snapshots.previous("fuel"))
+            sections.append(("fuel", snap, lines))
         else:
-            lines.append("⛽ Bảng giá xăng dầu: <i>không lấy được dữ liệu</i>")
+            sections.append(("fuel", None, ["⛽ Bảng giá xăng dầu: <i>không lấy được dữ liệu</i>"]))
 
         # ---------------------------
         # FX RATES
         # ---------------------------
-        try:
-            rates_vnd = self.fetch_vnd_rates()
-        except Exception:
-            rates_vnd = None
-
+        fx = fetched["fx"]
+        rates_vnd = fx.value["rates"] if fx else None
         if rates_vnd:
-            # convert_timestamp_to_vn có lỗi thì vẫn hiển thị N/A
-            try:
-                ts_vn = self.convert_timestamp_to_vn(self.fx_timestamp)
-            except Exception:
-                ts_vn = "N/A"
-
-            lines.append(f"💰 <b>Cập nhật tỷ giá VND: {ts_vn} (UTC+7)</b>")
-
-            # Helper nhỏ để tránh KeyError từng currency
-            def add_rate(key: str, label: str, extra_note: str | None = None):
-                value = rates_vnd.get(key)
-                if value is None:
-                    return
-                val = self.round_sig(value, 3)
-                line = f"- 1 {html_escape(label)} = <code>{self.pretty_number(val)} VND</code>"
-                if extra_note:
-                    line += f"  <i>({html_escape(extra_note)})</i>"
-                lines.append(line)
-
-            # 1 USD, 1 JPY, 1 MAN, 1 KRW, 1 CNY
-            add_rate("VNDUSD", "USD")
-
-            jpy_value = rates_vnd.get("VNDJPY")
-            if jpy_value is not None:
-                jpy = self.round_sig(jpy_value, 3)
-                add_rate("VNDJPY", "JPY", "Yên Nhật")
-                man = self.round_sig(jpy * 10000, 3)
-                lines.append(
-                    f"- 1 MAN = <code>{self.pretty_number(man)} VND</code>  "
-                    f"<i>(Man Nhật – 10,000 Yên)</i>"
-                )
+            snap = self._fx_snapshot(rates_vnd)
+            lines = self._render_fx(
+                rates_vnd, fx.value["timestamp"], fx.as_of_note(), snapshots.previous("fx")
+            )
+            sections.append(("fx", snap, lines))
+        else:
+            sections.append(
+                ("fx", None, ["💰 <b>Cập nhật tỷ giá VND:</b> <i>không lấy được dữ liệu tỷ giá</i>"])
+            )
 
-            krw_value = rates_vnd.get("VNDKRW")
-            if krw_value is not None:
-                krw = self.round_sig(krw_value, 3)
-                lines.append(
-                    f"- 1 KRW = <code>{self.pretty_number(krw)} VND</code>  "
-                    f"<i>(Won Hàn Quốc)</i>"
-                )
+        collapsed_titles = {
+            "gold": "🏆 Giá vàng PNJ",
+            "fuel": "⛽ Giá xăng dầu PVOIL",
+            "fx": "💰 Tỷ giá VND",
+        }
 
-            cny_value = rates_vnd.get("VNDCNY")
-            if cny_value is not None:
-                cny = self.round_sig(cny_value, 3)
-                lines.append(
-                    f"- 1 CNY = <code>{self.pretty_number(cny)} VND</code>  "
-                    f"<i>(Nhân dân tệ Trung Quốc)</i>"
-                )
-        else:
-            lines.append("💰 <b>Cập nhật tỷ giá VND:</b> <i>không lấy được dữ liệu tỷ giá</i>")
+        # Dùng HTML: <b>, <i>, <code>...
+        out = ["💰 <b>Giá vàng / xăng / tỷ giá</b>"]
+        out.extend(alert_lines)
+        any_changed = bool(alert_lines)
+        for name, snap, lines in sections:
+            if snap is None:
+                # Lỗi lấy dữ liệu: vẫn báo như cũ
+                any_changed = True
+                out.extend(lines)
+                continue
+            if snapshots.is_changed(name, snap):
+                any_changed = True
+                out.extend(lines)
+                snapshots.save(name, snap)
+            elif mode == "collapse":
+                out.append(f"{collapsed_titles[name]}: <i>không đổi</i>")
+
+        if snapshots.enabled and not any_changed:
+            self.logger.info("Gold / fuel / FX unchanged since last run, nothing to send")
+            return ""
+
+        # Xu hướng chỉ đi kèm khi có gửi message (không tự kích hoạt gửi)
+        try:
+            out.extend(self._render_trends())
+        except Exception as exc:
+            self.logger.exception("Trend analytics failed: %s", exc)
 
-        return "\n".join(lines)
+        return "\n".join(out)
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# Mặc định: <project root>/.cache/http
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".cache" / "http"
+
+
+class HttpCache:
+    """
+    Cache HTTP trên đĩa cho conditional GET (ETag / Last-Modified).
+    Mỗi (url, params, tag) = 1 file JSON gồm validators + kết quả đã parse,
+    để khi upstream trả 304 thì dùng lại kết quả parse cũ (không parse lại HTML/JSON).
+    Không lưu body gốc: trang HTML (PVOIL, PNJ...) nặng hàng trăm KB mà không bao giờ đọc lại.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None) -> None:
+        # Đường dẫn tương đối tính từ project root (giống config.json / state.json)
+        self.cache_dir = PROJECT_ROOT / cache_dir if cache_dir else DEFAULT_CACHE_DIR
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]] = None, tag: str = "") -> str:
+        # params có thể chứa API key -> chỉ dùng để hash, không ghi ra file
+        raw = json.dumps([url, sorted((params or {}).items()), tag], default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            self.logger.warning("Bad HTTP cache entry %s: %s", path, exc)
+            return None
+
+    def validator_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if not entry:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(
+        self,
+        key: str,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        parsed: Any,
+    ) -> None:
+        # Không có validator thì không conditional GET được -> khỏi lưu
+        if not etag and not last_modified:
+            return
+        entry = {
+            "url": url.split("?", 1)[0],
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+            "parsed": parsed,
+        }
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as exc:
+            # parsed không serialize được JSON / lỗi đĩa -> bỏ qua cache, không ảnh hưởng request
+            self.logger.warning("Cannot write HTTP cache entry for %s: %s", url, exc)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HttpCache
+from metrics import get_metrics
+from retry_policy import CircuitBreakerRegistry, RetryPolicy
+
+DEFAULT_HEADERS = {
+    "User-Agent": "telegram_super_bot/1.0",
+}
+
+HTTP_DURATION = get_metrics().histogram(
+    "http_request_duration_seconds",
+    "Upstream HTTP request latency (each attempt)",
+    ("host", "endpoint"),
+)
+HTTP_REQUESTS = get_metrics().counter(
+    "http_requests_total",
+    "Upstream HTTP requests by response status (or exception type)",
+    ("host", "endpoint", "status"),
+)
+
+
+@lru_cache(maxsize=512)
+def endpoint_labels(url: str) -> Tuple[str, str]:
+    """
+    URL (không gồm query params) -> (host, path) làm label metric.
+    """
+    parts = urlsplit(url)
+    return parts.hostname or "", parts.path or "/"
+
+
+class HttpClient:
+    """
+    HTTP layer dùng chung cho cả process:
+    - 1 requests.Session (keep-alive), connection pool riêng cho từng host
+      -> các lần gọi lặp lại tới cùng host (VD: /weather rồi /forecast) dùng lại TCP/TLS.
+    - Header + timeout mặc định.
+    - Retry policy + circuit breaker theo host (dùng trong util.http_get_json / http_get_text).
+    - Cache conditional GET trên đĩa (None = tắt).
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        timeout: float = 10.0,
+        headers: Optional[Dict[str, str]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        cache: Optional[HttpCache] = None,
+    ) -> None:
+        self.timeout = float(timeout)
+        self.pool_maxsize = int(pool_maxsize)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or CircuitBreakerRegistry()
+        self.cache = cache
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        # pool_connections: số host giữ pool; pool_maxsize: số connection tối đa / host
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls, http_cfg: Dict[str, Any]) -> "HttpClient":
+        cache_cfg = http_cfg.get("cache", {})
+        cache = None
+        if cache_cfg.get("enabled", True):
+            cache = HttpCache(cache_cfg.get("dir"))
+        return cls(
+            pool_connections=int(http_cfg.get("pool_connections", 10)),
+            pool_maxsize=int(http_cfg.get("pool_maxsize", 10)),
+            timeout=float(http_cfg.get("timeout_sec", 10)),
+            headers=http_cfg.get("headers"),
+            retry_policy=RetryPolicy.from_config(http_cfg.get("retry", {})),
+            breakers=CircuitBreakerRegistry.from_config(http_cfg.get("circuit_breaker", {})),
+            cache=cache,
+        )
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            resp = self.session.get(
+                url,
+                params=params,
+                headers=headers,
+                timeout=timeout if timeout is not None else self.timeout,
+            )
+            status = str(resp.status_code)
+            return resp
+        except Exception as exc:
+            status = type(exc).__name__
+            raise
+        finally:
+            host, endpoint = endpoint_labels(url)
+            HTTP_DURATION.labels(host, endpoint).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(host, endpoint, status).inc()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def configure_http(http_cfg: Dict[str, Any]) -> HttpClient:
+    """
+    Khởi tạo (lại) HTTP client dùng chung từ config["http"]. Gọi 1 lần lúc start.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = HttpClient.from_config(http_cfg or {})
+        return _client
+
+
+def get_http_client() -> HttpClient:
+    """
+    Lấy HTTP client dùng chung (tự tạo với cấu hình mặc định nếu chưa configure).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+
+def close_http() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
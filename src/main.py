@@ -1,16 +1,36 @@
+import argparse
 import logging
+import signal
+import threading
 import time
+from typing import Any, Callable, Dict, List, Optional
 
-from util import load_json, save_json, should_run
+from util import load_json
+from http_client import configure_http, close_http, get_http_client
 from telegram_client import TelegramClient
 from gold_fx_service import GoldFxService
 from weather_service import WeatherService
 from news_service import NewsService
+from scheduler import ScheduledJob, Scheduler
+from service_runner import ServiceJob, ServiceRunner
+from ttl_cache import configure_ttl_cache
+from state_store import StateStore
+from timeseries import configure_history
+from alert_rules import configure_alerts
+from bot_commands import CommandPoller, CommandRouter
+from webhook_server import WebhookServer
+from metrics import configure_metrics, start_metrics_server, write_metrics_textfile
+from profiling import DEFAULT_PROFILE_DIR, PROFILE_ENV, Profiler, profile_dir_from
 
 
 CONFIG_PATH = "config.json"
 SECRETS_PATH = "secrets.json"
+# state.json cũ chỉ còn dùng để migrate 1 lần sang state.db
 STATE_PATH = "state.json"
+STATE_DB_PATH = "state.db"
+
+# Thứ tự gửi message cố định: GOLD / FX -> WEATHER -> NEWS
+SERVICE_ORDER = ["gold_fx", "weather", "news"]
 
 
 def setup_logging() -> None:
@@ -20,79 +40,271 @@ def setup_logging() -> None:
     )
 
 
-def main() -> None:
+def open_state() -> StateStore:
+    state = StateStore(STATE_DB_PATH)
+    legacy = load_json(STATE_PATH, default={}) if not len(state) else {}
+    if legacy and state.import_legacy(legacy):
+        logging.getLogger("telegram_super_bot").info(
+            "Migrated %d key(s) from %s to %s", len(legacy), STATE_PATH, STATE_DB_PATH
+        )
+    return state
+
+
+def persist_state(state: StateStore) -> None:
+    state["http_breakers"] = get_http_client().breakers.dump_state()
+    state.commit()
+
+
+def run_services(
+    names: List[str],
+    services: Dict[str, Callable[[], str]],
+    runner: ServiceRunner,
+    runner_cfg: Dict[str, Any],
+    tg: TelegramClient,
+    state: StateStore,
+) -> None:
+    """
+    Chạy song song các service trong names, gửi message theo SERVICE_ORDER,
+    cập nhật "<service>_last_sent" và lưu state.
+    """
+    # Process khác (VD: one-shot chạy tay khi daemon đang chạy) có thể vừa ghi state
+    state.refresh()
+    # Message gửi hỏng ở lượt trước (daemon không restart) / process khác để lại -> gửi lại
+    tg.retry_pending()
+    service_timeouts = runner_cfg.get("service_timeouts", {})
+    ordered = [name for name in SERVICE_ORDER if name in names]
+    jobs = [
+        ServiceJob(f"{name}_service", services[name], service_timeouts.get(f"{name}_service"))
+        for name in ordered
+    ]
+
+    now_ts = time.time()
+    for name, result in zip(ordered, runner.run_all(jobs)):
+        if result.message:
+            tg.send_message(result.message)
+            if tg.has_broadcast_targets():
+                # Chạy nền: flood wait của broadcast không chặn message của service sau
+                tg.broadcast_async(result.message)
+        if result.ok:
+            state[f"{name}_last_sent"] = now_ts
+
+    persist_state(state)
+
+
+def run_daemon(
+    schedule_cfg: Dict[str, Any],
+    run_batch: Callable[[List[str]], None],
+    state: StateStore,
+) -> None:
+    """
+    Daemon mode: giữ process (và HTTP keep-alive) chạy liên tục,
+    lên lịch từng service theo config["schedule"], dừng sạch khi SIGTERM / Ctrl+C.
+    """
+    logger = logging.getLogger("telegram_super_bot")
+
+    jobs = []
+    for name in SERVICE_ORDER:
+        interval_min = float(schedule_cfg.get(f"{name}_interval_min", 60))
+        last = state.get(f"{name}_last_sent")
+        try:
+            last_run = float(last) if last is not None else None
+        except (TypeError, ValueError):
+            last_run = None
+        jobs.append(ScheduledJob(name, interval_min * 60, last_run))
+
+    scheduler = Scheduler(
+        run_batch,
+        catchup_stagger_sec=float(schedule_cfg.get("catchup_stagger_sec", 5)),
+    )
+    scheduler.add_jobs(jobs)
+
+    def handle_signal(signum: int, _frame: Any) -> None:
+        logger.info("Received signal %s, shutting down...", signum)
+        scheduler.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    scheduler.run_forever()
+
+
+def wait_for_shutdown() -> None:
+    """
+    Chỉ nhận lệnh (không lên lịch gửi): chờ tới khi SIGTERM / Ctrl+C.
+    """
+    logger = logging.getLogger("telegram_super_bot")
+    stop_event = threading.Event()
+
+    def handle_signal(signum: int, _frame: Any) -> None:
+        logger.info("Received signal %s, shutting down...", signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    while not stop_event.wait(1.0):
+        pass
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Telegram Super Bot")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Chạy liên tục, lên lịch từng service theo config.json schedule",
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Trả lời lệnh /gold /fuel /fx /weather /news qua long polling "
+        "(kết hợp được với --daemon)",
+    )
+    parser.add_argument(
+        "--webhook",
+        action="store_true",
+        help="Trả lời lệnh qua webhook (HTTP server theo config.json webhook, "
+        "thay cho --polling, kết hợp được với --daemon)",
+    )
+    parser.add_argument(
+        "--config",
+        default=CONFIG_PATH,
+        help="File config (mặc định config.json; VD: bản trỏ về bench/fake_upstream.py)",
+    )
+    parser.add_argument("--secrets", default=SECRETS_PATH, help="File secrets (mặc định secrets.json)")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=DEFAULT_PROFILE_DIR,
+        default=None,
+        metavar="DIR",
+        help="cProfile + tracemalloc từng service và lần gửi Telegram, ghi vào DIR/<timestamp>/ "
+        f"(mặc định profiles/; hoặc đặt biến môi trường {PROFILE_ENV}=1)",
+    )
+    args = parser.parse_args(argv)
+    if args.polling and args.webhook:
+        # Telegram không cho getUpdates khi đang đặt webhook
+        parser.error("--polling and --webhook are mutually exclusive")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
     setup_logging()
     logger = logging.getLogger("telegram_super_bot")
 
-    config = load_json(CONFIG_PATH)
-    secrets = load_json(SECRETS_PATH)
-    state = load_json(STATE_PATH, default={})
+    config = load_json(args.config)
+    secrets = load_json(args.secrets)
 
     bot_token = secrets.get("telegram_bot_token")
     chat_id = secrets.get("telegram_chat_id")
 
     if not bot_token or chat_id is None:
-        logger.error("Missing telegram_bot_token or telegram_chat_id in secrets.json")
+        logger.error("Missing telegram_bot_token or telegram_chat_id in %s", args.secrets)
         return
+    if args.webhook and not secrets.get("telegram_webhook_secret"):
+        logger.error("Missing telegram_webhook_secret in %s (required for --webhook)", args.secrets)
+        return
+
+    state = open_state()
+    metrics_cfg = config.get("metrics", {})
+    configure_metrics(metrics_cfg)
+
+    telegram_cfg = config.get("telegram", {})
+    tg = TelegramClient(bot_token=bot_token, chat_id=chat_id, send_cfg=telegram_cfg)
 
-    tg = TelegramClient(bot_token=bot_token, chat_id=chat_id)
+    # 1 HTTP session (keep-alive, pool theo host) cho tất cả service
+    configure_http(config.get("http", {}))
+    # Circuit breaker state từ lần chạy trước (tránh dội request vào upstream đang chết)
+    get_http_client().breakers.load_state(state.get("http_breakers"))
+    # TTL cache theo nguồn (stale-while-revalidate, fallback bản cũ khi upstream lỗi)
+    ttl_cache = configure_ttl_cache(config.get("cache", {}))
+    # Lịch sử giá vàng / xăng / tỷ giá (append-only, bỏ block quá hạn retention)
+    history = configure_history(config.get("history", {}))
+    history.apply_retention()
+    # Rules cảnh báo giá / mưa (ngưỡng "rain_alert_mm" lấy từ config weather)
+    alerts_cfg = dict(config.get("alerts", {}))
+    alerts_cfg["variables"] = {
+        "rain_alert_mm": config.get("weather", {}).get("rain_alert_mm", 5.0),
+        **alerts_cfg.get("variables", {}),
+    }
+    configure_alerts(alerts_cfg, state, history)
 
     gold_fx_service = GoldFxService(config.get("gold_fx", {}), secrets)
     weather_service = WeatherService(config.get("weather", {}), secrets)
     news_service = NewsService(config.get("news", {}), secrets)
 
-    # schedule_cfg = config.get("schedule", {})
-    # gold_fx_interval = int(schedule_cfg.get("gold_fx_interval_min", 60))
-    # weather_interval = int(schedule_cfg.get("weather_interval_min", 60))
-    # news_interval = int(schedule_cfg.get("news_interval_min", 120))
-    # loop_sleep_seconds = int(schedule_cfg.get("loop_sleep_seconds", 30))
+    services: Dict[str, Callable[[], str]] = {
+        "gold_fx": lambda: gold_fx_service.build_summary(state),
+        "weather": weather_service.build_summary,
+        "news": lambda: news_service.build_summary(state),
+    }
 
-    logger.info("Telegram Super Bot started. Chat ID: %s", chat_id)
+    profile_dir = profile_dir_from(args.profile)
+    profiler: Optional[Profiler] = None
+    if profile_dir:
+        profiler = Profiler(profile_dir)
+        profiler.start()
+        services = {name: profiler.wrap(f"{name}_service", func) for name, func in services.items()}
+        tg.send_queue.send_func = profiler.wrap("telegram_send", tg.send_queue.send_func)
 
-    # try:
-    #     while True:
-    # now_ts = time.time()
+    runner_cfg = config.get("runner", {})
+    runner = ServiceRunner.from_config(runner_cfg)
 
-    # GOLD / FX
-    # if should_run(state, "gold_fx_last_sent", gold_fx_interval, now_ts):
-    logger.info("Running gold_fx_service...")
-    try:
-        msg = gold_fx_service.build_summary()
-        if msg:
-            tg.send_message(msg)
-            # state["gold_fx_last_sent"] = now_ts
-    except Exception as exc:
-        logger.exception("gold_fx_service error: %s", exc)
-
-    # WEATHER
-    # if should_run(state, "weather_last_sent", weather_interval, now_ts):
-    logger.info("Running weather_service...")
-    try:
-        msg = weather_service.build_summary()
-        if msg:
-            tg.send_message(msg)
-            # state["weather_last_sent"] = now_ts
-    except Exception as exc:
-        logger.exception("weather_service error: %s", exc)
-
-    # NEWS
-    # if should_run(state, "news_last_sent", news_interval, now_ts):
-    logger.info("Running news_service...")
-    try:
-        msg = news_service.build_summary(state)
-        if msg:
-            tg.send_message(msg)
-            # state["news_last_sent"] = now_ts
-    except Exception as exc:
-        logger.exception("news_service error: %s", exc)
+    def run_batch(names: List[str]) -> None:
+        run_services(names, services, runner, runner_cfg, tg, state)
 
-    # Lưu state mỗi vòng (hoặc có thể tối ưu: chỉ lưu nếu có thay đổi)
-    # save_json(STATE_PATH, state)
+    logger.info("Telegram Super Bot started. Chat ID: %s", chat_id)
 
-    # time.sleep(loop_sleep_seconds)
+    commands_cfg = config.get("commands", {})
+    listener: Optional[Any] = None
+    if (args.polling or args.webhook) and commands_cfg.get("enabled", True):
+        router = CommandRouter.from_services(
+            commands_cfg, gold_fx_service, weather_service, news_service
+        )
+        if args.webhook:
+            webhook_cfg = config.get("webhook", {})
+            secret_token = secrets["telegram_webhook_secret"]
+            listener = WebhookServer.from_config(router, tg.reply, secret_token, webhook_cfg)
+            listener.start()
+            public_url = webhook_cfg.get("public_url")
+            if public_url:
+                tg.set_webhook(
+                    public_url.rstrip("/") + listener.path,
+                    secret_token,
+                    max_connections=int(webhook_cfg.get("max_connections", 40)),
+                )
+        else:
+            listener = CommandPoller.from_config(bot_token, router, tg.reply, commands_cfg, tg.bot_base_url)
+            listener.start()
 
-    # except KeyboardInterrupt:
-    #     logger.info("Bot stopped by user (KeyboardInterrupt).")
+    # Chạy lâu (daemon / nhận lệnh): Prometheus scrape /metrics; one-shot: ghi textfile lúc thoát
+    long_running = args.daemon or listener is not None
+    metrics_server = start_metrics_server(metrics_cfg) if long_running else None
+
+    try:
+        if args.daemon:
+            run_daemon(config.get("schedule", {}), run_batch, state)
+        elif listener is not None:
+            wait_for_shutdown()
+        else:
+            # One-shot (cron): chạy tất cả service 1 lần
+            run_batch(SERVICE_ORDER)
+    finally:
+        if listener is not None:
+            listener.stop()
+        # Gửi nốt hàng đợi Telegram (message chưa gửi được vẫn nằm trong outbox)
+        tg.close(float(telegram_cfg.get("flush_timeout_sec", 60)))
+        # Refresh nền (stale-while-revalidate) phải xong trước khi đóng HTTP session
+        ttl_cache.wait_pending()
+        persist_state(state)
+        state.close()
+        close_http()
+        if metrics_server is not None:
+            metrics_server.stop()
+        elif not long_running:
+            write_metrics_textfile(metrics_cfg)
+        if profiler is not None:
+            for line in profiler.finish():
+                print(line)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+import logging
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Bucket mặc định cho độ trễ (giây)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bucket cho độ dài message (ký tự; giới hạn Telegram 4096)
+SIZE_BUCKETS = (64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """
+    1 metric + các bộ label của nó. Mỗi bộ label (child) giữ số liệu riêng + lock riêng,
+    nên thread ghi metric khác nhau không tranh nhau lock.
+    """
+
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: Iterable[str]) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock", "_registry")
+
+    def __init__(self, registry: "MetricsRegistry") -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+        self._registry = registry
+
+    def inc(self, amount: float = 1.0) -> None:
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild(self.registry)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in sorted(self._children.items())
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_registry")
+
+    def __init__(self, registry: "MetricsRegistry") -> None:
+        self.value = 0.0
+        self._registry = registry
+
+    def set(self, value: float) -> None:
+        if self._registry.enabled:
+            self.value = float(value)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild(self.registry)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in sorted(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock", "_registry")
+
+    def __init__(self, registry: "MetricsRegistry", bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # counts[i] = số quan sát rơi vào bucket i (không cộng dồn); phần tử cuối = +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+        self._registry = registry
+
+    def observe(self, value: float) -> None:
+        if not self._registry.enabled:
+            return
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.registry, self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for key, child in sorted(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total_sum = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registry metric kiểu Prometheus (counter / gauge / histogram có label), trong process.
+    Ghi metric chỉ tốn 1 lần tra dict + 1 lock ngắn; tắt (enabled=False) thì gần như 0.
+    Xuất ra text format của Prometheus: qua HTTP /metrics (daemon) hoặc file cho
+    textfile collector của node_exporter (one-shot / cron).
+    """
+
+    def __init__(self, namespace: str = "telegram_super_bot", enabled: bool = True) -> None:
+        self.namespace = namespace
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        full_name = f"{self.namespace}_{name}" if self.namespace else name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = cls(self, full_name, *args, **kwargs)
+                self._metrics[full_name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            if metric._children:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        """
+        Ghi atomic (file tạm + rename) để textfile collector không đọc phải file ghi dở.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+class MetricsServer:
+    """
+    HTTP server nhỏ (thread nền) trả GET /metrics cho Prometheus scrape.
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464) -> None:
+        self.registry = registry
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, int(port)), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        self.logger.info("Metrics endpoint on http://%s:%s/metrics", host, port)
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_registry = MetricsRegistry()
+
+
+def configure_metrics(metrics_cfg: Dict[str, Any]) -> MetricsRegistry:
+    """
+    Bật / tắt thu thập metric theo config["metrics"]. Metric được khai báo lúc import module
+    nên registry là 1 object cố định, ở đây chỉ đổi cờ enabled.
+    """
+    _registry.enabled = bool(metrics_cfg.get("enabled", True))
+    return _registry
+
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
+
+
+def start_metrics_server(metrics_cfg: Dict[str, Any]) -> Optional[MetricsServer]:
+    """
+    Daemon mode: mở endpoint /metrics. Lỗi bind cổng chỉ log, bot vẫn chạy.
+    """
+    if not _registry.enabled or not metrics_cfg.get("port"):
+        return None
+    try:
+        server = MetricsServer(_registry, metrics_cfg.get("listen", "127.0.0.1"), int(metrics_cfg["port"]))
+    except OSError as exc:
+        logging.getLogger("MetricsServer").error("Cannot start metrics endpoint: %s", exc)
+        return None
+    server.start()
+    return server
+
+
+def write_metrics_textfile(metrics_cfg: Dict[str, Any]) -> Optional[Path]:
+    """
+    One-shot mode: ghi metric ra file cho node_exporter textfile collector.
+    """
+    textfile = metrics_cfg.get("textfile")
+    if not _registry.enabled or not textfile:
+        return None
+    path = PROJECT_ROOT / textfile
+    try:
+        _registry.write_textfile(path)
+    except OSError as exc:
+        logging.getLogger("MetricsRegistry").warning("Cannot write metrics to %s: %s", path, exc)
+        return None
+    return path
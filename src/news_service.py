@@ -1,13 +1,18 @@
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import count
+from typing import Any, Dict, Iterator, List, Optional
 
 from util import http_get_json
+from ttl_cache import CachedValue, get_ttl_cache
+from dedupe import RecentHashSet, url_hash
+from service_runner import run_parallel
 from html import escape as html_escape  # HTML escape cho text động
 
 
 class NewsService:
     """
-    Lấy tin tức tổng hợp (NewsAPI), lọc chỉ tin mới nếu cấu hình only_new=true.
+    Lấy tin tức tổng hợp (NewsAPI) từ nhiều feed song song, lọc chỉ tin mới nếu cấu hình
+    only_new=true (nhớ hash URL đã gửi trong state["news_seen"], giới hạn dedupe_capacity).
     """
 
     def __init__(self, config: Dict[str, Any], secrets: Dict[str, Any]) -> None:
@@ -21,85 +26,297 @@ class NewsService:
         self.country = config.get("country", "vn")
         self.category = config.get("category", "general")
         self.page_size = int(config.get("page_size", 5))
+        # pageSize khi phân trang NewsAPI (tách khỏi page_size: đổi số bài / request
+        # không làm đổi số bài hiển thị)
+        self.fetch_page_size = int(config.get("fetch_page_size", self.page_size))
         self.only_new = bool(config.get("only_new", True))
+        # Số bài tối đa trong 1 message (sau khi gộp tất cả feed)
+        self.max_items = int(config.get("max_items", self.page_size))
+        # Số hash URL đã gửi được nhớ trong state (LRU)
+        self.dedupe_capacity = int(config.get("dedupe_capacity", 2000))
+        self.max_concurrency = int(config.get("max_concurrency", 4))
+        # Số bài tối đa kéo về cho 1 feed mỗi lượt (chặn số trang phải request)
+        self.item_budget = int(config.get("item_budget", 40))
+
+        # Nhiều feed (sources / query) -> fetch song song rồi gộp.
+        # Không cấu hình "feeds" -> 1 feed top-headlines theo "sources" như cũ.
+        self.feeds: List[Dict[str, Any]] = []
+        for i, feed in enumerate(config.get("feeds") or []):
+            self.feeds.append(
+                {
+                    "name": feed.get("name") or f"feed{i + 1}",
+                    "endpoint": feed.get("endpoint", "top-headlines"),
+                    "params": dict(feed.get("params") or {}),
+                    "item_budget": int(feed.get("item_budget", self.item_budget)),
+                }
+            )
+        if not self.feeds:
+            self.feeds.append(
+                {
+                    "name": self.sources,
+                    "endpoint": "top-headlines",
+                    "params": {"sources": self.sources},
+                    "item_budget": self.item_budget,
+                }
+            )
 
     def is_configured(self) -> bool:
         return self.enabled and self.api_key is not None
 
-    def fetch_latest(self) -> Optional[Dict[str, Any]]:
-        url = f"{self.api_base}/top-headlines"
-        params = {
-            # "country": self.country,
-            # "category": self.category,
-            # "pageSize": self.page_size,
-            "sources": self.sources,
-            "apiKey": self.api_key,
+    def iter_pages(self, feed: Dict[str, Any]) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Lazy: trả từng trang (page=1, 2, ...) của 1 feed, chỉ request trang sau khi
+        trang trước đã được xử lý xong -> caller break là không tốn thêm request nào.
+        Dừng khi trang lỗi, trang thiếu (hết bài) hoặc đã đủ totalResults.
+        """
+        url = f"{self.api_base}/{feed['endpoint']}"
+        params = dict(feed["params"])
+        page_size = max(1, min(100, int(params.pop("pageSize", self.fetch_page_size))))
+        params["pageSize"] = page_size
+        params["apiKey"] = self.api_key
+
+        for page in count(1):
+            params["page"] = page
+            data = http_get_json(url, params=dict(params), use_cache=True)
+            yield data
+            if not data or data.get("status") != "ok":
+                return
+            total = data.get("totalResults")
+            if len(data.get("articles") or []) < page_size:
+                return
+            if isinstance(total, int) and page * page_size >= total:
+                return
+
+    def fetch_feed(
+        self, feed: Dict[str, Any], watermark: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Gom các trang của 1 feed cho tới khi:
+        - gặp bài có publishedAt <= watermark (các trang sau chỉ còn bài cũ hơn), hoặc
+        - đủ item_budget bài.
+        Trang đầu lỗi -> trả nguyên response lỗi / None; trang sau lỗi -> giữ các bài đã có.
+        Kết quả ghi kèm watermark đã dùng (vào cache): chỉ đủ bài cho caller có watermark >= nó.
+        """
+        budget = feed["item_budget"]
+        articles: List[Dict[str, Any]] = []
+        pages = 0
+        for data in self.iter_pages(feed):
+            pages += 1
+            if not data or data.get("status") != "ok":
+                if pages == 1:
+                    return data
+                self.logger.warning(
+                    "News feed %s: page %d failed, keeping %d articles",
+                    feed["name"],
+                    pages,
+                    len(articles),
+                )
+                break
+
+            page_articles = data.get("articles") or []
+            articles.extend(page_articles[: budget - len(articles)])
+            if len(articles) >= budget:
+                break
+            if watermark and any(
+                (a.get("publishedAt") or "") and a["publishedAt"] <= watermark
+                for a in page_articles
+            ):
+                break
+
+        self.logger.info(
+            "News feed %s: %d articles from %d page(s)", feed["name"], len(articles), pages
+        )
+        return {
+            "status": "ok",
+            "totalResults": len(articles),
+            "articles": articles,
+            "watermark": watermark,
         }
-        return http_get_json(url, params=params)
 
     @staticmethod
-    def _filter_new_articles(
-        articles: List[Dict[str, Any]], last_published_at: Optional[str]
-    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    def _covers(value: Dict[str, Any], watermark: Optional[str]) -> bool:
         """
-        Lọc ra những bài có publishedAt > last_published_at.
-        Vì publishedAt là ISO 8601 nên so sánh string được (lexico ~ time).
+        Bản feed (fetch với watermark của lúc đó) có đủ mọi bài mới hơn watermark hiện tại không:
+        fetch không watermark / watermark cũ hơn -> phân trang sâu hơn -> đủ.
         """
-        if not articles:
-            return [], last_published_at
+        fetched_with = value.get("watermark")
+        return not fetched_with or bool(watermark and fetched_with <= watermark)
+
+    def _fetch_cached_feed(self, feed: Dict[str, Any], watermark: Optional[str]) -> Optional[CachedValue]:
+        cache = get_ttl_cache()
+        source = "news:" + feed["endpoint"].replace("-", "_")
+        cached = cache.get(source, lambda: self.fetch_feed(feed, watermark), feed["name"])
+        if cached and cached.value.get("status") == "ok" and not self._covers(cached.value, watermark):
+            # Bản trong cache dừng phân trang ở watermark mới hơn (VD: refresh nền / process khác)
+            # -> có thể thiếu bài, fetch lại theo watermark hiện tại
+            fresh = self.fetch_feed(feed, watermark)
+            if fresh and fresh.get("status") == "ok":
+                return cache.put(source, fresh, feed["name"])
+        return cached
 
-        if not last_published_at:
-            # lần đầu: gửi hết và lấy timestamp tối đa
-            new_last = max(
-                (a.get("publishedAt") for a in articles if a.get("publishedAt")),
-                default=None,
+    def _fetch_all_feeds(
+        self, watermarks: Dict[str, str]
+    ) -> Dict[str, Optional[CachedValue]]:
+        tasks = {
+            feed["name"]: (
+                lambda feed=feed: self._fetch_cached_feed(feed, watermarks.get(feed["name"]))
             )
-            return articles, new_last
+            for feed in self.feeds
+        }
+        return run_parallel(tasks, self.max_concurrency, thread_name_prefix="news")
+
+    @staticmethod
+    def _article_key(article: Dict[str, Any]) -> Optional[str]:
+        url = article.get("url")
+        if url:
+            return url_hash(url)
+        title = (article.get("title") or "").strip()
+        return url_hash("title:" + title) if title else None
 
+    @classmethod
+    def _filter_new_articles(
+        cls, articles: List[Dict[str, Any]], seen: RecentHashSet
+    ) -> List[Dict[str, Any]]:
+        """
+        Lọc ra những bài chưa gửi (theo hash URL đã chuẩn hoá), không ghi gì vào seen:
+        chỉ bài thực sự hiển thị mới được ghi nhận (_mark_sent).
+        Bài trùng giữa các feed trong cùng lượt chỉ giữ 1 lần.
+        Bài đã gửi mà vẫn còn trong feed được "touch" để không bị đẩy khỏi LRU.
+        """
+        keys = set()
         filtered: List[Dict[str, Any]] = []
-        new_last = last_published_at
+        for a in articles:
+            key = cls._article_key(a)
+            if key is None or key in keys or seen.touch(key):
+                continue
+            keys.add(key)
+            filtered.append(a)
+        return filtered
+
+    @classmethod
+    def _mark_sent(cls, articles: List[Dict[str, Any]], seen: RecentHashSet) -> None:
+        for a in articles:
+            key = cls._article_key(a)
+            if key is not None:
+                seen.add(key)
 
+    @classmethod
+    def _dedupe_batch(cls, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        keys = set()
+        out: List[Dict[str, Any]] = []
         for a in articles:
-            ts = a.get("publishedAt")
-            if not ts:
+            key = cls._article_key(a)
+            if key is None or key in keys:
                 continue
-            if ts > last_published_at:
-                filtered.append(a)
-                if ts > new_last:
-                    new_last = ts
+            keys.add(key)
+            out.append(a)
+        return out
 
-        return filtered, new_last
+    @classmethod
+    def _hold_watermarks(
+        cls,
+        watermarks: Dict[str, str],
+        old_marks: Dict[str, str],
+        by_feed: Dict[str, List[Dict[str, Any]]],
+        leftovers: List[Dict[str, Any]],
+    ) -> None:
+        """
+        Bài mới nhưng chưa hiển thị (quá max_items): watermark của feed chứa nó không được
+        vượt publishedAt của bài đó, nếu không lượt sau dừng phân trang trước khi tới nó.
+        Bài không có publishedAt -> giữ nguyên watermark cũ của feed.
+        """
+        leftover_keys = {cls._article_key(a) for a in leftovers}
+        for name, feed_articles in by_feed.items():
+            pending = [a for a in feed_articles if cls._article_key(a) in leftover_keys]
+            if not pending:
+                continue
+            times = [a.get("publishedAt") or "" for a in pending]
+            if not all(times):
+                if old_marks.get(name):
+                    watermarks[name] = old_marks[name]
+                else:
+                    watermarks.pop(name, None)
+                continue
+            oldest = min(times)
+            current = watermarks.get(name)
+            if not current or oldest < current:
+                watermarks[name] = oldest
 
     def build_summary(self, state: Dict[str, Any]) -> str:
         if not self.is_configured():
             self.logger.warning("NewsService is not properly configured.")
             return ""
 
-        data = self.fetch_latest()
-        if not data:
-            return "📰 <b>Tin tức</b>: không lấy được dữ liệu."
+        # Watermark (publishedAt mới nhất đã thấy) theo từng feed: dừng phân trang sớm
+        old_marks = state.get("news_watermarks") or {}
+        fetched = self._fetch_all_feeds(old_marks)
+        watermarks: Dict[str, str] = {}
+        articles: List[Dict[str, Any]] = []
+        by_feed: Dict[str, List[Dict[str, Any]]] = {}
+        ok_feeds = 0
+        for name, cached in fetched.items():
+            if old_marks.get(name):
+                watermarks[name] = old_marks[name]
+            if not cached:
+                self.logger.warning("News feed %s: no data", name)
+                continue
+            status = cached.value.get("status")
+            if status != "ok":
+                self.logger.warning("NewsAPI status not ok for feed %s: %s", name, status)
+                continue
+            ok_feeds += 1
+            feed_articles = cached.value.get("articles") or []
+            by_feed[name] = feed_articles
+            articles.extend(feed_articles)
+            newest = max((a.get("publishedAt") or "" for a in feed_articles), default="")
+            if newest > watermarks.get(name, ""):
+                watermarks[name] = newest
 
-        status = data.get("status")
-        if status != "ok":
-            self.logger.warning("NewsAPI status not ok: %s", status)
-            return "📰 <b>Tin tức</b>: lỗi từ NewsAPI."
+        # Chỉ giữ watermark của các feed đang cấu hình
+        state["news_watermarks"] = watermarks
 
-        articles = data.get("articles", [])
+        if not ok_feeds:
+            if any(fetched.values()):
+                return "📰 <b>Tin tức</b>: lỗi từ NewsAPI."
+            return "📰 <b>Tin tức</b>: không lấy được dữ liệu."
         if not articles:
             return "📰 <b>Tin tức</b>: hiện không có bài mới."
 
-        last_published_at = state.get("news_last_published_at")
+        # Gộp các feed: mới nhất trước (ISO 8601 so sánh string được)
+        articles.sort(key=lambda a: a.get("publishedAt") or "", reverse=True)
 
         if self.only_new:
-            articles, new_last = self._filter_new_articles(articles, last_published_at)
+            seen = RecentHashSet.from_state(state.get("news_seen"), self.dedupe_capacity)
+
+            # Chuyển từ watermark cũ: lần đầu dùng set, coi các bài <= watermark là đã gửi
+            legacy_last = state.pop("news_last_published_at", None)
+            if legacy_last and not len(seen):
+                for a in articles:
+                    ts = a.get("publishedAt")
+                    key = self._article_key(a)
+                    if ts and key and ts <= legacy_last:
+                        seen.add(key)
+
+            # Chỉ ghi nhận "đã gửi" các bài nằm trong message; phần dư để lượt sau
+            new_articles = self._filter_new_articles(articles, seen)
+            articles = new_articles[: self.max_items]
+            self._mark_sent(articles, seen)
+            state["news_seen"] = seen.to_state()
+            leftovers = new_articles[self.max_items :]
+            if leftovers:
+                self._hold_watermarks(watermarks, old_marks, by_feed, leftovers)
+                state["news_watermarks"] = watermarks
             if not articles:
                 # Không có tin mới hơn lần trước -> không gửi gì
                 return ""
-            if new_last:
-                state["news_last_published_at"] = new_last
+        else:
+            articles = self._dedupe_batch(articles)
+
+        return "\n".join(self._render_articles(articles, "📰 <b>Tin tức mới</b>"))
 
-        lines = ["📰 <b>Tin tức mới</b>"]
-        for a in articles[: self.page_size]:
+    def _render_articles(self, articles: List[Dict[str, Any]], header: str) -> List[str]:
+        lines = [header]
+        for a in articles[: self.max_items]:
             title = a.get("title") or "(Không tiêu đề)"
             url = a.get("url") or ""
             source_name = (a.get("source") or {}).get("name") or ""
@@ -118,4 +335,25 @@ class NewsService:
 
             lines.append(line)
 
-        return "\n".join(lines)
+        return lines
+
+    def render_latest(self) -> str:
+        """
+        Trả lời lệnh /news: các bài mới nhất trong cache của mọi feed (không lọc "đã gửi",
+        không chờ upstream; cache quá hạn thì refresh nền).
+        """
+        if not self.is_configured():
+            return "📰 <b>Tin tức</b>: chưa cấu hình."
+
+        cache = get_ttl_cache()
+        articles: List[Dict[str, Any]] = []
+        for feed in self.feeds:
+            source = "news:" + feed["endpoint"].replace("-", "_")
+            cached = cache.peek(source, feed["name"], lambda feed=feed: self.fetch_feed(feed))
+            if cached and cached.value.get("status") == "ok":
+                articles.extend(cached.value.get("articles") or [])
+
+        if not articles:
+            return "📰 <b>Tin tức</b>: đang cập nhật dữ liệu, thử lại sau ít giây."
+        articles.sort(key=lambda a: a.get("publishedAt") or "", reverse=True)
+        return "\n".join(self._render_articles(self._dedupe_batch(articles), "📰 <b>Tin tức</b>"))
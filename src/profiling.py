@@ -0,0 +1,190 @@
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Bật profiling không cần sửa lệnh chạy (VD: cron): "1" -> thư mục mặc định, khác -> thư mục đó
+PROFILE_ENV = "TELEGRAM_SUPER_BOT_PROFILE"
+DEFAULT_PROFILE_DIR = "profiles"
+
+# Số frame giữ cho mỗi allocation (chỉ frame trên cùng dùng để gom theo dòng code)
+TRACEMALLOC_FRAMES = 10
+
+# Hàm chờ (block), không tính là hotspot trong summary (vẫn có trong file .pstats)
+WAIT_FUNCTIONS = frozenset({"<method 'acquire' of '_thread.lock' objects>"})
+
+
+def profile_dir_from(cli_value: Optional[str]) -> Optional[str]:
+    """
+    --profile [DIR] ưu tiên hơn biến môi trường; không bật -> None.
+    """
+    if cli_value:
+        return cli_value
+    env = os.environ.get(PROFILE_ENV, "").strip()
+    if not env or env.lower() in ("0", "false", "no", "off"):
+        return None
+    if env.lower() in ("1", "true", "yes", "on"):
+        return DEFAULT_PROFILE_DIR
+    return env
+
+
+class Profiler:
+    """
+    Profiling opt-in cho từng lần chạy service / gửi Telegram:
+    - cProfile cho mỗi lần gọi (thread đang chạy), gộp theo tên -> <name>.pstats
+      (xem bằng `python -m pstats` / snakeviz). Phần việc ở thread con (fetch song song)
+      chỉ hiện như thời gian chờ future.
+    - tracemalloc: chênh lệch bộ nhớ theo dòng code trước / sau mỗi lần gọi, cộng dồn theo tên
+      -> <name>.allocs.txt. tracemalloc tính chung cả process nên service chạy song song
+      có thể lẫn allocation của nhau.
+    Kết quả nằm trong <base_dir>/<YYYYmmdd-HHMMSS>/, summary() trả về vài dòng hotspot.
+    """
+
+    def __init__(self, base_dir: str, top_n: int = 10) -> None:
+        base = Path(base_dir)
+        if not base.is_absolute():
+            base = PROJECT_ROOT / base
+        self.out_dir = base / datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.top_n = int(top_n)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._wall: Dict[str, float] = defaultdict(float)
+        # name -> "file:line" -> (tổng byte chênh lệch, tổng số block)
+        self._allocs: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self.logger.info("Profiling enabled, writing to %s", self.out_dir)
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+
+    def wrap(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+            before = self._snapshot()
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: chỉ 1 profiler hoạt động 1 lúc (lần gọi song song khác đang đo)
+                profile = None
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if profile is not None:
+                    profile.disable()
+                diff = self._snapshot().compare_to(before, "lineno")
+                self._record(name, profile, elapsed, diff)
+
+        return profiled
+
+    def _record(
+        self,
+        name: str,
+        profile: Optional[cProfile.Profile],
+        elapsed: float,
+        diff: List[tracemalloc.StatisticDiff],
+    ) -> None:
+        with self._lock:
+            self._calls[name] += 1
+            self._wall[name] += elapsed
+            if profile is not None:
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+            sites = self._allocs[name]
+            for stat in diff:
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                site = sites[f"{frame.filename}:{frame.lineno}"]
+                site[0] += stat.size_diff
+                site[1] += stat.count_diff
+
+    def _top_functions(self, stats: pstats.Stats, limit: int) -> List[Tuple[str, int, float, float]]:
+        """
+        [(hàm, số lần gọi, tottime, cumtime)] theo tottime giảm dần. Bỏ lock.acquire
+        (thời gian chờ future của fetch song song, không phải việc của thread này).
+        """
+        rows = []
+        for (filename, lineno, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            if func in WAIT_FUNCTIONS:
+                continue
+            where = f"{Path(filename).name}:{lineno}({func})" if lineno else func
+            rows.append((where, calls, tottime, cumtime))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def _top_allocs(self, name: str, limit: int) -> List[Tuple[str, int, int]]:
+        sites = self._allocs.get(name, {})
+        rows = [(site, size, count) for site, (size, count) in sites.items()]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows[:limit]
+
+    def dump(self) -> None:
+        with self._lock:
+            names = sorted(set(self._calls))
+            for name in names:
+                stats = self._stats.get(name)
+                if stats is not None:
+                    stats.dump_stats(str(self.out_dir / f"{name}.pstats"))
+                with (self.out_dir / f"{name}.allocs.txt").open("w", encoding="utf-8") as f:
+                    f.write(f"# {name}: {self._calls[name]} call(s), top allocation sites (bytes, blocks)\n")
+                    for site, size, count in self._top_allocs(name, self.top_n * 3):
+                        f.write(f"{size:>12,} B {count:>8,}  {site}\n")
+
+    def summary(self, per_name: int = 3) -> List[str]:
+        with self._lock:
+            lines = [f"Profile summary ({self.out_dir}):"]
+            for name in sorted(self._calls, key=lambda n: self._wall[n], reverse=True):
+                calls = self._calls[name]
+                lines.append(f"  {name}: {calls} call(s), {self._wall[name]:.3f}s total")
+                stats = self._stats.get(name)
+                if stats is not None:
+                    for where, ncalls, tottime, cumtime in self._top_functions(stats, per_name):
+                        lines.append(f"    time  {tottime:8.3f}s self {cumtime:8.3f}s cum  {ncalls:>7} x {where}")
+                for site, size, _ in self._top_allocs(name, per_name):
+                    lines.append(f"    alloc {size / 1024:10,.1f} KiB  {Path(site).name}")
+            return lines
+
+    def finish(self) -> List[str]:
+        """
+        Ghi file pstats / allocs + summary.txt, tắt tracemalloc; trả về các dòng summary.
+        """
+        self.dump()
+        lines = self.summary()
+        (self.out_dir / "summary.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        return lines
@@ -0,0 +1,143 @@
+import re
+from typing import List, Optional
+
+import lxml.html
+from lxml.etree import ParserError
+
+# Trang tin giá PVOIL rất nặng (menu, tin tức, script...) nhưng chỉ cần 1 bảng trong
+# .oilpricescontainer -> cắt đúng đoạn HTML từ container tới hết bảng đầu tiên của nó rồi mới
+# parse bằng lxml, không dựng cây BeautifulSoup cho cả trang.
+CONTAINER_MARKER = "oilpricescontainer"
+
+# Marker phải nằm trong class="..." của 1 thẻ mở (không khớp CSS / script / comment
+# hay class khác kiểu "oilpricescontainer-legacy"): đoạn từ "<" gần nhất tới marker
+_CLASS_PREFIX_RE = re.compile(r"<\w+[^<>]*?\bclass\s*=\s*(?:\"[^\"<>]*|'[^'<>]*)", re.IGNORECASE)
+_TABLE_TAG_RE = re.compile(r"<(/?)table\b", re.IGNORECASE)
+_TAG_NAME_RE = re.compile(r"<(\w+)")
+
+_NON_DIGIT_RE = re.compile(r"[^\d]")
+_DELTA_RE = re.compile(r"([+-]?\d+)")
+
+
+def parse_int_from_text(s: str) -> Optional[int]:
+    # "20.570 đ" -> 20570
+    digits = _NON_DIGIT_RE.sub("", s)
+    return int(digits) if digits else None
+
+
+def parse_delta(s: str) -> Optional[int]:
+    # "+160" -> 160, "-50" -> -50
+    m = _DELTA_RE.search(s)
+    return int(m.group(1)) if m else None
+
+
+def _cell_text(td: lxml.html.HtmlElement) -> str:
+    # Giống BeautifulSoup get_text(strip=True): strip từng đoạn text rồi nối lại
+    return "".join(part.strip() for part in td.itertext())
+
+
+def _slice_container_table(html: str) -> Optional[str]:
+    """
+    Cắt đoạn '<tag class="... oilpricescontainer ...">...</table>' tới thẻ đóng của bảng
+    đầu tiên trong container (đếm cả bảng lồng bên trong). None nếu không có container
+    hoặc container không chứa bảng nào.
+    """
+    # str.find cho từng lần xuất hiện rồi mới kiểm tra bằng regex (regex quét cả trang chậm hơn nhiều)
+    idx = html.find(CONTAINER_MARKER)
+    while idx >= 0:
+        start = html.rfind("<", 0, idx)
+        after = html[idx + len(CONTAINER_MARKER) : idx + len(CONTAINER_MARKER) + 1]
+        if (
+            start >= 0
+            and _CLASS_PREFIX_RE.fullmatch(html, start, idx)
+            and html[idx - 1] in "\"' \t\r\n"
+            and not (after.isalnum() or after in "-_")
+        ):
+            break
+        idx = html.find(CONTAINER_MARKER, idx + 1)
+    else:
+        return None
+
+    first = _TABLE_TAG_RE.search(html, idx)
+    if first is None or first.group(1):
+        return None
+    # Bảng phải nằm trong container: thẻ container (VD: div) chưa đóng trước <table
+    # (container không còn bảng -> None để _find_table fallback, không lấy bảng ngoài container)
+    name = _TAG_NAME_RE.match(html, start).group(1)
+    container_depth = 1
+    for tag in re.compile(rf"<(/?){re.escape(name)}\b", re.IGNORECASE).finditer(html, idx, first.start()):
+        container_depth += -1 if tag.group(1) else 1
+        if container_depth == 0:
+            return None
+
+    depth = 0
+    for tag in _TABLE_TAG_RE.finditer(html, first.start()):
+        if not tag.group(1):
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                end = html.find(">", tag.end())
+                if end < 0:
+                    return None
+                return html[start : end + 1]
+    return None
+
+
+def _find_table(html: str) -> Optional[lxml.html.HtmlElement]:
+    fragment = _slice_container_table(html)
+    if fragment is not None:
+        root = lxml.html.fragment_fromstring(fragment, create_parent="div")
+        table = next(root.iter("table"), None)
+        if table is not None:
+            return table
+
+    # Fallback: layout đổi, không còn .oilpricescontainer -> table.table đầu tiên của cả trang
+    try:
+        root = lxml.html.fromstring(html)
+    except ParserError:
+        return None
+    for table in root.iter("table"):
+        if "table" in (table.get("class") or "").split():
+            return table
+    return None
+
+
+def parse_pvoil_price_table(html: str) -> Optional[List[dict]]:
+    """
+    Trả về list các dòng dạng:
+    [
+      {"stt": 1, "name": "Xăng RON 95-III", "price": 20570, "delta": 160},
+      ...
+    ]
+    hoặc None nếu không tìm thấy bảng / bảng rỗng.
+    """
+    if not html:
+        return None
+
+    table = _find_table(html)
+    if table is None:
+        return None
+
+    rows: List[dict] = []
+    for tr in table.iter("tr"):
+        tds = [_cell_text(td) for td in tr if td.tag == "td"]
+        if len(tds) < 4:
+            continue
+
+        try:
+            stt = int(tds[0])
+        except ValueError:
+            # dòng header hoặc rác
+            continue
+
+        rows.append(
+            {
+                "stt": stt,
+                "name": tds[1],                       # cột "Mặt hàng" (colspan=2)
+                "price": parse_int_from_text(tds[-2]),  # cột giá điều chỉnh
+                "delta": parse_delta(tds[-1]),          # cột chênh lệch
+            }
+        )
+
+    return rows or None
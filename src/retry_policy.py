@@ -0,0 +1,211 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+
+class RetryPolicy:
+    """
+    Retry với exponential backoff + full jitter.
+    - Retry được: 5xx, 429 (tôn trọng Retry-After), lỗi kết nối / timeout.
+    - Không retry: 4xx khác, lỗi decode JSON.
+    """
+
+    RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        multiplier: float = 2.0,
+        max_retry_after: float = 30.0,
+    ) -> None:
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.multiplier = float(multiplier)
+        self.max_retry_after = float(max_retry_after)
+
+    @classmethod
+    def from_config(cls, retry_cfg: Dict[str, Any]) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(retry_cfg.get("max_attempts", 3)),
+            base_delay=float(retry_cfg.get("base_delay_sec", 0.5)),
+            max_delay=float(retry_cfg.get("max_delay_sec", 8.0)),
+            multiplier=float(retry_cfg.get("multiplier", 2.0)),
+            max_retry_after=float(retry_cfg.get("max_retry_after_sec", 30.0)),
+        )
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        if isinstance(exc, requests.HTTPError):
+            resp = exc.response
+            return resp is not None and resp.status_code in self.RETRYABLE_STATUS
+        if isinstance(exc, ValueError):
+            # JSON decode lỗi (requests.JSONDecodeError cũng là ValueError)
+            return False
+        return isinstance(
+            exc,
+            (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full jitter: random trong [0, min(max_delay, base * multiplier^(attempt-1))].
+        """
+        cap = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def parse_retry_after(resp: Optional[requests.Response]) -> Optional[float]:
+        if resp is None:
+            return None
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            # Retry-After dạng HTTP-date
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def delay_for(self, exc: BaseException, attempt: int) -> Optional[float]:
+        """
+        Thời gian chờ trước lần thử tiếp theo, hoặc None nếu không nên retry nữa.
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(exc):
+            return None
+
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            retry_after = self.parse_retry_after(exc.response)
+            if retry_after is not None:
+                # Upstream bắt chờ quá lâu -> bỏ, để lần chạy sau thử lại
+                if retry_after > self.max_retry_after:
+                    return None
+                return retry_after
+
+        return self.backoff(attempt)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho 1 host:
+    - closed: cho request đi bình thường, đếm lỗi liên tiếp.
+    - open: lỗi liên tiếp >= failure_threshold -> fail fast trong cooldown giây.
+    - half-open: hết cooldown -> cho đúng 1 request "thăm dò"; thành công thì đóng lại.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 300.0) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probe_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self._probe_in_flight = False
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"failures": self.failures, "opened_at": self.opened_at}
+
+    def load_state(self, data: Dict[str, Any]) -> None:
+        self.failures = int(data.get("failures", 0))
+        opened_at = data.get("opened_at")
+        self.opened_at = float(opened_at) if opened_at is not None else None
+
+
+class CircuitBreakerRegistry:
+    """
+    1 CircuitBreaker / host. State lưu vào state.json (key "http_breakers")
+    để các lần chạy cron liên tiếp không dội request vào upstream đang chết.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 300.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, breaker_cfg: Dict[str, Any]) -> "CircuitBreakerRegistry":
+        return cls(
+            failure_threshold=int(breaker_cfg.get("failure_threshold", 5)),
+            cooldown=float(breaker_cfg.get("cooldown_sec", 300)),
+        )
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def for_url(self, url: str) -> CircuitBreaker:
+        host = self.host_of(url)
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.cooldown)
+                self._breakers[host] = breaker
+            return breaker
+
+    def load_state(self, data: Optional[Dict[str, Any]]) -> None:
+        if not data:
+            return
+        with self._lock:
+            for host, item in data.items():
+                breaker = CircuitBreaker(self.failure_threshold, self.cooldown)
+                try:
+                    breaker.load_state(item)
+                except (TypeError, ValueError, AttributeError):
+                    logging.warning("Ignoring bad circuit breaker state for %s", host)
+                    continue
+                self._breakers[host] = breaker
+
+    def dump_state(self) -> Dict[str, Any]:
+        # Chỉ lưu host đang có lỗi để state.json không phình ra
+        with self._lock:
+            return {
+                host: b.to_state()
+                for host, b in self._breakers.items()
+                if b.failures or b.opened_at is not None
+            }
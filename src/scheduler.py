@@ -0,0 +1,115 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class ScheduledJob:
+    def __init__(self, name: str, interval_sec: float, last_run: Optional[float] = None) -> None:
+        self.name = name
+        self.interval_sec = float(interval_sec)
+        self.last_run = last_run
+
+
+class Scheduler:
+    """
+    Scheduler cho daemon mode: min-heap theo thời điểm đến hạn (next due),
+    ngủ tới đúng job kế tiếp thay vì poll mỗi N giây.
+    - Job quá hạn lúc khởi động (VD: daemon tắt lâu) được chạy bù nhưng rải ra
+      theo catchup_stagger_sec (+ jitter) để không dồn cùng 1 lúc.
+    - Các job đến hạn cùng lúc được gom thành 1 batch (chạy song song bởi ServiceRunner).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[str]], None],
+        catchup_stagger_sec: float = 5.0,
+        stop_event: Optional[threading.Event] = None,
+    ) -> None:
+        self.run_batch = run_batch
+        self.catchup_stagger_sec = float(catchup_stagger_sec)
+        self.stop_event = stop_event or threading.Event()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._jobs: Dict[str, ScheduledJob] = {}
+        # (due_ts, seq, name) — seq giữ thứ tự ổn định khi trùng due_ts
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+
+    def _push(self, due: float, name: str) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, name))
+
+    def add_jobs(self, jobs: List[ScheduledJob], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        overdue: List[Tuple[float, ScheduledJob]] = []
+
+        for job in jobs:
+            if job.interval_sec <= 0:
+                self.logger.info("Job %s disabled (interval <= 0)", job.name)
+                continue
+            self._jobs[job.name] = job
+            due = (job.last_run or 0.0) + job.interval_sec
+            if due <= now:
+                overdue.append((due, job))
+            else:
+                self._push(due, job.name)
+
+        # Quá hạn lâu nhất chạy trước, các job sau lùi dần catchup_stagger_sec
+        overdue.sort(key=lambda item: item[0])
+        for i, (_, job) in enumerate(overdue):
+            jitter = random.uniform(0, self.catchup_stagger_sec / 2) if i else 0.0
+            self._push(now + i * self.catchup_stagger_sec + jitter, job.name)
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Tuple[float, str]]:
+        due_jobs: List[Tuple[float, str]] = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, name = heapq.heappop(self._heap)
+            due_jobs.append((due, name))
+        return due_jobs
+
+    def _reschedule(self, due: float, name: str, finished_at: float) -> None:
+        job = self._jobs[name]
+        job.last_run = finished_at
+        # Bám theo lịch (không trôi dần); chạy trễ quá 1 chu kỳ thì tính lại từ bây giờ
+        next_due = due + job.interval_sec
+        if next_due <= finished_at:
+            next_due = finished_at + job.interval_sec
+        self._push(next_due, name)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run_forever(self) -> None:
+        self.logger.info("Scheduler started with %d job(s)", len(self._jobs))
+        while not self.stop_event.is_set():
+            due = self.next_due()
+            if due is None:
+                self.logger.warning("No jobs scheduled, scheduler exiting")
+                return
+
+            wait = due - time.time()
+            if wait > 0:
+                # Event.wait: SIGTERM set stop_event là thoát ngay, không phải chờ hết giấc
+                if self.stop_event.wait(wait):
+                    break
+                continue
+
+            batch = self.pop_due(time.time())
+            names = [name for _, name in batch]
+            self.logger.info("Due jobs: %s", ", ".join(names))
+            try:
+                self.run_batch(names)
+            except Exception as exc:
+                self.logger.exception("Scheduled batch %s failed: %s", names, exc)
+
+            finished_at = time.time()
+            for job_due, name in batch:
+                self._reschedule(job_due, name, finished_at)
+
+        self.logger.info("Scheduler stopped")
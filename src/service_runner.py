@@ -0,0 +1,158 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import SIZE_BUCKETS, get_metrics
+
+SERVICE_DURATION = get_metrics().histogram(
+    "service_run_duration_seconds",
+    "Service build_summary duration by outcome (ok, error, timeout)",
+    ("service", "outcome"),
+)
+MESSAGE_SIZE = get_metrics().histogram(
+    "message_size_chars", "Rendered message length per service", ("service",), buckets=SIZE_BUCKETS
+)
+SERVICE_LAST_SUCCESS = get_metrics().gauge(
+    "service_last_success_timestamp_seconds", "Unix time of the last successful run", ("service",)
+)
+
+
+class ServiceJob:
+    """
+    1 job = 1 service cần build message (gold_fx, weather, news...).
+    func không nhận tham số, trả về text message ("" nếu không cần gửi).
+    """
+
+    def __init__(self, name: str, func: Callable[[], str], timeout: Optional[float] = None) -> None:
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+
+
+class ServiceResult:
+    def __init__(
+        self,
+        name: str,
+        message: str = "",
+        error: Optional[BaseException] = None,
+        timed_out: bool = False,
+        elapsed: float = 0.0,
+    ) -> None:
+        self.name = name
+        self.message = message
+        self.error = error
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+
+class ServiceRunner:
+    """
+    Chạy nhiều service song song trên 1 thread pool giới hạn số worker.
+    - Mỗi service có timeout riêng (tính từ lúc bắt đầu chạy cả batch).
+    - Service lỗi / timeout không ảnh hưởng service khác.
+    - Kết quả trả về đúng thứ tự của danh sách job (để gửi Telegram theo thứ tự cố định).
+    """
+
+    def __init__(self, max_workers: int = 3, default_timeout: float = 90.0) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.default_timeout = float(default_timeout)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @classmethod
+    def from_config(cls, runner_cfg: Dict[str, Any]) -> "ServiceRunner":
+        return cls(
+            max_workers=int(runner_cfg.get("max_workers", 3)),
+            default_timeout=float(runner_cfg.get("service_timeout_sec", 90)),
+        )
+
+    def _timed_call(self, job: ServiceJob) -> ServiceResult:
+        start = time.perf_counter()
+        try:
+            message = job.func() or ""
+            return ServiceResult(job.name, message=message, elapsed=time.perf_counter() - start)
+        except Exception as exc:
+            self.logger.exception("%s error: %s", job.name, exc)
+            return ServiceResult(job.name, error=exc, elapsed=time.perf_counter() - start)
+
+    def run_all(self, jobs: List[ServiceJob]) -> List[ServiceResult]:
+        if not jobs:
+            return []
+
+        batch_start = time.perf_counter()
+        pool = ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(jobs)),
+            thread_name_prefix="service",
+        )
+        try:
+            futures = []
+            for job in jobs:
+                self.logger.info("Running %s...", job.name)
+                futures.append(pool.submit(self._timed_call, job))
+
+            results: List[ServiceResult] = []
+            for job, fut in zip(jobs, futures):
+                timeout = job.timeout if job.timeout is not None else self.default_timeout
+                remaining = max(0.0, batch_start + timeout - time.perf_counter())
+                try:
+                    result = fut.result(timeout=remaining)
+                except FutureTimeoutError:
+                    fut.cancel()
+                    elapsed = time.perf_counter() - batch_start
+                    self.logger.error("%s timed out after %.1fs", job.name, elapsed)
+                    result = ServiceResult(job.name, timed_out=True, elapsed=elapsed)
+                    SERVICE_DURATION.labels(job.name, "timeout").observe(elapsed)
+                else:
+                    SERVICE_DURATION.labels(job.name, "ok" if result.ok else "error").observe(result.elapsed)
+                    if result.ok:
+                        SERVICE_LAST_SUCCESS.labels(job.name).set(time.time())
+                    if result.message:
+                        MESSAGE_SIZE.labels(job.name).observe(len(result.message))
+                    self.logger.info(
+                        "%s finished in %.2fs (%s)",
+                        job.name,
+                        result.elapsed,
+                        "ok" if result.ok else "error",
+                    )
+                results.append(result)
+        finally:
+            # Không chờ các service bị timeout (thread vẫn chạy nốt cho tới khi HTTP timeout)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        self.logger.info(
+            "All services done in %.2fs (%d jobs, %d workers)",
+            time.perf_counter() - batch_start,
+            len(jobs),
+            min(self.max_workers, len(jobs)),
+        )
+        return results
+
+
+def run_parallel(
+    tasks: Dict[str, Callable[[], Any]],
+    max_workers: Optional[int] = None,
+    thread_name_prefix: str = "fetch",
+) -> Dict[str, Any]:
+    """
+    Chạy song song các hàm fetch độc lập trong 1 service (VD: PNJ / PVOIL / tỷ giá).
+    Task lỗi -> kết quả None (service tự hiển thị fallback "không lấy được dữ liệu").
+    """
+    if not tasks:
+        return {}
+
+    logger = logging.getLogger("run_parallel")
+    workers = max(1, min(max_workers or len(tasks), len(tasks)))
+    results: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix) as pool:
+        futures = {name: pool.submit(func) for name, func in tasks.items()}
+        for name, fut in futures.items():
+            try:
+                results[name] = fut.result()
+            except Exception as exc:
+                logger.exception("%s failed: %s", name, exc)
+                results[name] = None
+    return results
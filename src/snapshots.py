@@ -0,0 +1,54 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, Optional
+
+
+def fingerprint(data: Any) -> str:
+    """
+    Hash ổn định của dữ liệu (JSON canonical: sort_keys, không khoảng trắng).
+    """
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SectionSnapshots:
+    """
+    Snapshot có cấu trúc + fingerprint của từng section (gold, fuel, fx...), lưu trong
+    state["snapshots"][namespace][section] để lần chạy sau biết section nào đã thay đổi.
+    state=None -> tắt change detection (coi như section nào cũng mới).
+    save() gán lại cả state["snapshots"] (StateStore chỉ lưu giá trị được gán, không theo dõi
+    dict lồng bên trong).
+    """
+
+    STATE_KEY = "snapshots"
+
+    def __init__(self, state: Optional[Dict[str, Any]], namespace: str) -> None:
+        self.enabled = state is not None
+        self._state = state
+        self._namespace = namespace
+        self._store: Dict[str, Any] = {}
+        if state is not None:
+            self._store = dict((state.get(self.STATE_KEY) or {}).get(namespace) or {})
+
+    def previous(self, section: str) -> Optional[Any]:
+        entry = self._store.get(section)
+        return entry.get("data") if entry else None
+
+    def is_changed(self, section: str, data: Any) -> bool:
+        if not self.enabled:
+            return True
+        entry = self._store.get(section)
+        return entry is None or entry.get("fp") != fingerprint(data)
+
+    def save(self, section: str, data: Any) -> None:
+        if not self.enabled:
+            return
+        self._store[section] = {
+            "fp": fingerprint(data),
+            "data": data,
+            "at": time.time(),
+        }
+        snapshots = self._state.get(self.STATE_KEY) or {}
+        snapshots[self._namespace] = self._store
+        self._state[self.STATE_KEY] = snapshots
@@ -0,0 +1,196 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set
+
+# Thư mục project root (chứa state.db)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+class StateStore(MutableMapping):
+    """
+    State của bot (last_sent, snapshot, watermark, circuit breaker...) lưu trong SQLite (WAL):
+    mỗi key top-level là 1 dòng JSON.
+
+    - Dùng như dict (state.get / state[...] / pop), thay cho state.json.
+    - Giá trị được chụp thành JSON ngay lúc gán (state[key] = value) và mỗi lần đọc trả về
+      bản copy: service chạy ở thread khác (kể cả thread đã bị bỏ vì timeout) không sửa được
+      state đang commit. Sửa dict lồng bên trong phải gán lại cả giá trị vào key.
+    - commit(): chỉ ghi các key đã thay đổi so với lần đọc/ghi trước (so bản JSON).
+      Mỗi commit là 1 transaction SQLite -> crash giữa chừng không làm hỏng state.
+    - Daemon và lần chạy one-shot dùng chung file được: ghi theo từng key, busy_timeout chờ
+      lock, sau commit / refresh() nạp lại các key process khác vừa ghi (key mình đang
+      sửa dở thì giữ bản của mình).
+    """
+
+    def __init__(self, path: Path, busy_timeout: float = 30.0) -> None:
+        self.path = Path(path)
+        if not self.path.is_absolute():
+            self.path = PROJECT_ROOT / self.path
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.RLock()
+        # key -> JSON hiện tại (chụp lúc gán)
+        self._data: Dict[str, str] = {}
+        # Bản JSON đã đồng bộ với DB của từng key (để biết key nào "dirty")
+        self._synced: Dict[str, str] = {}
+        self._deleted: Set[str] = set()
+        self._seen_seq = 0
+
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=busy_timeout,
+            isolation_level=None,  # tự quản lý BEGIN / COMMIT
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT,"  # NULL = key đã bị xoá (để process khác cũng thấy)
+            " seq INTEGER NOT NULL)"
+        )
+        self.refresh()
+
+    # ---------------------------
+    # dict interface
+    # ---------------------------
+    def __getitem__(self, key: str) -> Any:
+        return json.loads(self._data[key])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        raw = _dumps(value)
+        with self._lock:
+            self._data[key] = raw
+            self._deleted.discard(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            del self._data[key]
+            self._deleted.add(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"StateStore({str(self.path)!r}, keys={len(self._data)})"
+
+    # ---------------------------
+    # persistence
+    # ---------------------------
+    def dirty_keys(self) -> Dict[str, Optional[str]]:
+        """
+        key -> JSON mới (None = bị xoá) của các key khác với bản trong DB.
+        """
+        with self._lock:
+            dirty: Dict[str, Optional[str]] = {key: None for key in self._deleted}
+            for key, raw in self._data.items():
+                if self._synced.get(key) != raw:
+                    dirty[key] = raw
+            return dirty
+
+    def refresh(self) -> int:
+        """
+        Nạp các key process khác đã ghi kể từ lần đồng bộ trước (trừ key đang dirty).
+        Trả về số key được cập nhật.
+        """
+        with self._lock:
+            dirty = self.dirty_keys()
+            return self._load_since(self._seen_seq, skip=dirty)
+
+    def commit(self) -> int:
+        """
+        Ghi các key đã thay đổi trong 1 transaction. Trả về số key đã ghi.
+        """
+        with self._lock:
+            dirty = self.dirty_keys()
+            if not dirty:
+                self._load_since(self._seen_seq, skip={})
+                return 0
+
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                # Nạp thay đổi của process khác trước (giữ nguyên key mình đang ghi)
+                self._load_since(self._seen_seq, skip=dirty, cursor=cur)
+                (max_seq,) = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM kv").fetchone()
+                seq = max_seq + 1
+                cur.executemany(
+                    "INSERT INTO kv (key, value, seq) VALUES (?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET value = excluded.value, seq = excluded.seq",
+                    [(key, raw, seq) for key, raw in dirty.items()],
+                )
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+            for key, raw in dirty.items():
+                if raw is None:
+                    self._synced.pop(key, None)
+                else:
+                    self._synced[key] = raw
+            self._deleted.difference_update(dirty)
+            self._seen_seq = max(self._seen_seq, seq)
+
+        self.logger.info("State committed: %d key(s) %s", len(dirty), sorted(dirty))
+        return len(dirty)
+
+    def _load_since(
+        self,
+        seq: int,
+        skip: Dict[str, Optional[str]],
+        cursor: Optional[sqlite3.Cursor] = None,
+    ) -> int:
+        cur = cursor or self._conn.cursor()
+        rows = cur.execute(
+            "SELECT key, value, seq FROM kv WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        loaded = 0
+        for key, raw, row_seq in rows:
+            self._seen_seq = max(self._seen_seq, row_seq)
+            if key in skip:
+                continue
+            if raw is None:
+                self._data.pop(key, None)
+                self._synced.pop(key, None)
+                loaded += 1
+                continue
+            try:
+                json.loads(raw)
+            except ValueError:
+                self.logger.warning("State key %s is not valid JSON, ignored", key)
+                continue
+            self._data[key] = raw
+            self._synced[key] = raw
+            loaded += 1
+        return loaded
+
+    def import_legacy(self, data: Dict[str, Any]) -> int:
+        """
+        Chuyển state.json cũ sang store (chỉ khi store còn rỗng). Trả về số key đã nhập.
+        """
+        with self._lock:
+            if self._data or not data:
+                return 0
+            for key, value in data.items():
+                self[key] = value
+            return self.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
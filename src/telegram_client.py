@@ -1,12 +1,147 @@
 import logging
-from typing import Optional
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 from telegram import Bot
 
+from metrics import get_metrics
+
+from telegram_queue import (
+    PROJECT_ROOT,
+    SEND_BLOCKED,
+    SEND_FAILED,
+    SEND_SENT,
+    TelegramSendQueue,
+)
+
+ChatId = Union[int, str]
+
+# Giới hạn độ dài 1 message của Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+DEFAULT_API_BASE_URL = "https://api.telegram.org"
+
+TELEGRAM_SEND_DURATION = get_metrics().histogram(
+    "telegram_send_duration_seconds",
+    "Telegram sendMessage latency by outcome (ok or exception type)",
+    ("outcome",),
+)
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Cắt message dài thành nhiều phần <= limit ký tự, cắt theo dòng;
+    khối <pre>...</pre> giữ nguyên trong 1 phần (nếu bản thân nó không vượt limit).
+    """
+    if len(text) <= limit:
+        return [text]
+
+    # Gom các dòng thành block: 1 dòng thường, hoặc cả khối <pre> nhiều dòng
+    blocks: List[str] = []
+    pre_lines: List[str] = []
+    for line in text.split("\n"):
+        if pre_lines:
+            pre_lines.append(line)
+            if "</pre>" in line:
+                blocks.append("\n".join(pre_lines))
+                pre_lines = []
+        elif "<pre>" in line and "</pre>" not in line:
+            pre_lines = [line]
+        else:
+            blocks.append(line)
+    if pre_lines:
+        blocks.append("\n".join(pre_lines))
+
+    parts: List[str] = []
+    current = ""
+    for block in blocks:
+        while len(block) > limit:
+            # Block quá dài (hiếm): cắt cứng
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(block[:limit])
+            block = block[limit:]
+        candidate = f"{current}\n{block}" if current else block
+        if len(candidate) > limit:
+            parts.append(current)
+            current = block
+        else:
+            current = candidate
+    if current.strip():
+        parts.append(current)
+    return parts
+
+
+def normalize_chat_id(raw: Any) -> Optional[ChatId]:
+    """
+    "123" / 123 / "-100..." -> int; "@channel" giữ nguyên string; rỗng -> None.
+    """
+    if raw is None:
+        return None
+    text = str(raw).strip()
+    if not text:
+        return None
+    if text.startswith("@"):
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def load_chat_ids(path: Path) -> List[ChatId]:
+    """
+    Đọc file danh sách chat: mỗi dòng 1 chat_id hoặc @channel, dòng "#" là comment.
+    """
+    chat_ids: List[ChatId] = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            chat_id = normalize_chat_id(line)
+            if chat_id is not None:
+                chat_ids.append(chat_id)
+    return chat_ids
+
+
+def save_chat_ids(path: Path, chat_ids: Iterable[ChatId]) -> None:
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for chat_id in chat_ids:
+            f.write(f"{chat_id}\n")
+    os.replace(tmp, path)
+
+
+class BroadcastReport:
+    def __init__(self) -> None:
+        self.sent = 0
+        self.failed = 0
+        # Phần message gửi hỏng (lỗi mạng hết lượt) đã ghi outbox cho lần chạy sau
+        self.kept = 0
+        self.skipped = 0
+        self.pruned: List[ChatId] = []
+        self.migrated: Dict[ChatId, ChatId] = {}
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"sent={self.sent} failed={self.failed} kept={self.kept} skipped={self.skipped} "
+            f"pruned={len(self.pruned)} in {self.elapsed:.2f}s "
+            f"({self.throughput:.1f} msg/s)"
+        )
+
 
 class TelegramClient:
     """
     Wrapper đơn giản cho Telegram Bot API (chỉ gửi message vào 1 chat_id).
+    Gửi qua TelegramSendQueue: send_message chỉ enqueue, thread nền gửi + rate limit + retry.
     """
 
     def __init__(
@@ -15,23 +150,248 @@ class TelegramClient:
         chat_id: int,
         # Dùng HTML cho an toàn, dễ escape hơn Markdown
         default_parse_mode: Optional[str] = "HTML",
+        send_cfg: Optional[Dict[str, Any]] = None,
     ) -> None:
-        self.bot = Bot(token=bot_token)
+        send_cfg = send_cfg or {}
+        # api_base_url: đổi sang server giả lập (bench/fake_upstream.py) khi load test
+        self.api_base_url = send_cfg.get("api_base_url") or DEFAULT_API_BASE_URL
+        self.bot = Bot(token=bot_token, base_url=self.bot_base_url)
         self.chat_id = chat_id
         self.default_parse_mode = default_parse_mode
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.send_queue = TelegramSendQueue.from_config(self._send_now, send_cfg)
+
+        broadcast_cfg = send_cfg.get("broadcast", {})
+        self.broadcast_chat_ids: List[ChatId] = [
+            chat_id
+            for chat_id in (normalize_chat_id(c) for c in broadcast_cfg.get("chat_ids", []))
+            if chat_id is not None
+        ]
+        chats_file = broadcast_cfg.get("chats_file")
+        self.broadcast_chats_file = PROJECT_ROOT / chats_file if chats_file else None
+        self.broadcast_max_in_flight = int(broadcast_cfg.get("max_in_flight", 8))
+        # broadcast_async: 1 thread nền, các lượt broadcast chạy lần lượt (không ghi chats_file song song)
+        self._broadcast_executor: Optional[ThreadPoolExecutor] = None
+        self._broadcast_futures: List["Future[BroadcastReport]"] = []
+
+    @property
+    def bot_base_url(self) -> str:
+        # python-telegram-bot nối token ngay sau base_url
+        return f"{self.api_base_url.rstrip('/')}/bot"
+
+    def _send_now(self, item: Dict[str, Any]) -> None:
+        """
+        Gửi thật 1 message (gọi từ thread của send_queue). Exception để send_queue xử lý retry.
+        """
+        options = item.get("options", {})
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            self.bot.send_message(
+                chat_id=item["chat_id"],
+                text=item["text"],
+                parse_mode=options.get("parse_mode", self.default_parse_mode),
+                disable_notification=options.get("disable_notification", False),
+                disable_web_page_preview=options.get("disable_web_page_preview"),
+            )
+        except Exception as exc:
+            outcome = type(exc).__name__
+            raise
+        finally:
+            TELEGRAM_SEND_DURATION.labels(outcome).observe(time.perf_counter() - start)
+        self.logger.info("Sent message to chat_id=%s", item["chat_id"])
 
     def send_message(self, text: str, disable_notification: bool = False) -> None:
+        """
+        Không chặn: đưa message vào hàng đợi (có lưu outbox), thread nền gửi đi.
+        Message dài hơn giới hạn Telegram được cắt thành nhiều message.
+        """
         if not text:
             return
-        try:
-            self.bot.send_message(
-                chat_id=self.chat_id,
-                text=text,
+        for part in split_message(text):
+            self.send_queue.enqueue(
+                self.chat_id,
+                part,
                 parse_mode=self.default_parse_mode,
                 disable_notification=disable_notification,
             )
-            self.logger.info("Sent message to chat_id=%s", self.chat_id)
-        except Exception as exc:
-            # Log rõ lỗi để sau debug nếu cần
-            self.logger.error("Failed to send message: %s", exc)
+
+    def reply(self, chat_id: ChatId, text: str) -> str:
+        """
+        Trả lời lệnh (blocking, gọi từ worker của webhook): gửi thẳng qua send_queue.deliver
+        (chung rate limit / retry), không ghi outbox - câu trả lời cũ không cần gửi lại sau.
+        """
+        item: Dict[str, Any] = {
+            "id": f"reply-{chat_id}",
+            "chat_id": chat_id,
+            "options": {"parse_mode": self.default_parse_mode, "disable_web_page_preview": True},
+        }
+        outcome = SEND_SENT
+        for part in split_message(text):
+            item["text"] = part
+            item["attempts"] = 0
+            outcome = self.send_queue.deliver(item)
+            if outcome != SEND_SENT:
+                break
+        return outcome
+
+    def set_webhook(
+        self,
+        url: str,
+        secret_token: str,
+        max_connections: int = 40,
+        drop_pending_updates: bool = True,
+    ) -> bool:
+        # secret_token chưa có tham số riêng trong python-telegram-bot 13 -> truyền qua api_kwargs
+        ok = self.bot.set_webhook(
+            url=url,
+            max_connections=max_connections,
+            allowed_updates=["message"],
+            drop_pending_updates=drop_pending_updates,
+            api_kwargs={"secret_token": secret_token},
+        )
+        self.logger.info("Webhook set to %s: %s", url, ok)
+        return ok
+
+    def delete_webhook(self) -> bool:
+        return self.bot.delete_webhook()
+
+    def has_broadcast_targets(self) -> bool:
+        return bool(self.broadcast_chat_ids) or (
+            self.broadcast_chats_file is not None and self.broadcast_chats_file.exists()
+        )
+
+    def broadcast(
+        self,
+        text: str,
+        chat_ids: Optional[Iterable[Any]] = None,
+        chats_file: Optional[Path] = None,
+        max_in_flight: Optional[int] = None,
+        disable_notification: bool = False,
+    ) -> BroadcastReport:
+        """
+        Gửi cùng 1 message (đã render sẵn) tới nhiều chat song song:
+        - Tối đa max_in_flight request cùng lúc, rate limit / retry / backoff theo từng chat
+          dùng chung với send_queue.
+        - Chat đã block bot / không tồn tại bị loại khỏi chats_file (nếu có).
+        - chat_id trùng, không hợp lệ, hoặc là chat chính (đã gửi qua send_message) -> skipped.
+        Mặc định dùng danh sách trong config telegram.broadcast.
+        """
+        report = BroadcastReport()
+        if not text:
+            return report
+
+        if chat_ids is None and chats_file is None:
+            chat_ids = self.broadcast_chat_ids
+            chats_file = self.broadcast_chats_file
+
+        raw_ids: List[Any] = list(chat_ids or [])
+        file_ids: List[ChatId] = []
+        if chats_file is not None and chats_file.exists():
+            file_ids = load_chat_ids(chats_file)
+            raw_ids.extend(file_ids)
+
+        targets: List[ChatId] = []
+        seen = {normalize_chat_id(self.chat_id)}
+        for raw in raw_ids:
+            chat_id = normalize_chat_id(raw)
+            if chat_id is None or chat_id in seen:
+                report.skipped += 1
+                continue
+            seen.add(chat_id)
+            targets.append(chat_id)
+
+        parts = split_message(text)
+
+        def send_one(chat_id: ChatId) -> Dict[str, Any]:
+            item: Dict[str, Any] = {
+                "id": f"broadcast-{chat_id}",
+                "chat_id": chat_id,
+                "options": {
+                    "parse_mode": self.default_parse_mode,
+                    "disable_notification": disable_notification,
+                },
+            }
+            # Dùng chung item cho các phần -> chat_id đã migrate được giữ cho phần sau
+            for i, part in enumerate(parts):
+                item["text"] = part
+                item["attempts"] = 0
+                item["outcome"] = self.send_queue.deliver(item)
+                if item["outcome"] != SEND_SENT:
+                    item["unsent_parts"] = parts[i:]
+                    break
+            return item
+
+        start = time.perf_counter()
+        workers = max(1, min(max_in_flight or self.broadcast_max_in_flight, len(targets) or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="broadcast") as pool:
+            for item in pool.map(send_one, targets):
+                if "migrated_from" in item:
+                    report.migrated[item["migrated_from"]] = item["chat_id"]
+                if item["outcome"] == SEND_SENT:
+                    report.sent += 1
+                elif item["outcome"] == SEND_BLOCKED:
+                    report.pruned.append(item["chat_id"])
+                    report.failed += 1
+                else:
+                    report.failed += 1
+                    if item["outcome"] == SEND_FAILED:
+                        # Như chat chính: giữ trong outbox, lần chạy sau gửi lại
+                        for part in item["unsent_parts"]:
+                            self.send_queue.keep_for_next_run(item["chat_id"], part, **item["options"])
+                            report.kept += 1
+        report.elapsed = time.perf_counter() - start
+
+        if chats_file is not None and file_ids and (report.pruned or report.migrated):
+            pruned = set(report.pruned)
+            kept: List[ChatId] = []
+            for chat_id in file_ids:
+                chat_id = report.migrated.get(chat_id, chat_id)
+                if chat_id not in pruned and chat_id not in kept:
+                    kept.append(chat_id)
+            save_chat_ids(chats_file, kept)
+            self.logger.info(
+                "Pruned %d chat(s) from %s", len(file_ids) - len(kept), chats_file
+            )
+
+        self.logger.info("Broadcast done: %s", report.summary())
+        return report
+
+    def broadcast_async(self, text: str, **kwargs: Any) -> "Future[BroadcastReport]":
+        """
+        Như broadcast nhưng chạy ở thread nền: batch service không phải chờ danh sách chat
+        dài / flood control (RetryAfter) mới gửi được message của service tiếp theo.
+        """
+        if self._broadcast_executor is None:
+            self._broadcast_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broadcast-batch")
+        future = self._broadcast_executor.submit(self.broadcast, text, **kwargs)
+        future.add_done_callback(self._log_broadcast_error)
+        self._broadcast_futures = [f for f in self._broadcast_futures if not f.done()] + [future]
+        return future
+
+    def _log_broadcast_error(self, future: "Future[BroadcastReport]") -> None:
+        exc = future.exception()
+        if exc is not None:
+            self.logger.error("Broadcast failed: %s", exc, exc_info=exc)
+
+    def retry_pending(self) -> int:
+        return self.send_queue.retry_pending()
+
+    def flush(self, timeout: float = 60.0) -> bool:
+        return self.send_queue.flush(timeout)
+
+    def close(self, timeout: float = 60.0) -> None:
+        """
+        Chờ broadcast nền + gửi nốt hàng đợi rồi dừng thread gửi (chung timeout);
+        message chưa gửi được vẫn nằm trong outbox.
+        """
+        deadline = time.monotonic() + timeout
+        if self._broadcast_futures:
+            _, not_done = wait(self._broadcast_futures, timeout=timeout)
+            if not_done:
+                self.logger.warning("%d broadcast(s) still running at shutdown", len(not_done))
+        self.send_queue.close(max(0.0, deadline - time.monotonic()))
+        if self._broadcast_executor is not None:
+            # send_queue đã dừng -> deliver trả SEND_FAILED, broadcast dở ghi outbox rồi thoát
+            self._broadcast_executor.shutdown(wait=True)
+            self._broadcast_executor = None
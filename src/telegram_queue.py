@@ -0,0 +1,468 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from telegram.error import (
+    BadRequest,
+    ChatMigrated,
+    NetworkError,
+    RetryAfter,
+    TelegramError,
+    Unauthorized,
+)
+
+from metrics import get_metrics
+
+try:
+    import fcntl  # khoá outbox khi daemon + one-shot cùng chạy (Linux / macOS)
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Kết quả gửi 1 message
+SEND_SENT = "sent"
+SEND_FAILED = "failed"      # lỗi mạng hết lượt retry / đang dừng -> có thể gửi lại sau
+SEND_DROPPED = "dropped"    # lỗi vĩnh viễn với message này (VD: HTML sai)
+SEND_BLOCKED = "blocked"    # chat không gửi được nữa (bot bị block, chat không tồn tại)
+
+TELEGRAM_MESSAGES = get_metrics().counter(
+    "telegram_messages_total", "Telegram message delivery outcomes", ("outcome",)
+)
+TELEGRAM_RETRIES = get_metrics().counter(
+    "telegram_retries_total", "Telegram send retries (flood_control, network)", ("reason",)
+)
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: rate token/giây, tối đa capacity token (cho phép burst nhỏ).
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """
+        Lấy 1 token, trả về số giây phải chờ trước khi được dùng token đó (0 nếu có sẵn).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def try_acquire(self) -> bool:
+        """
+        Lấy 1 token nếu có sẵn (không "nợ" token như reserve). False = đang bị giới hạn.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            if stop_event is not None:
+                stop_event.wait(wait)
+            else:
+                time.sleep(wait)
+
+
+class Outbox:
+    """
+    Danh sách message chưa gửi, lưu file JSON (ghi atomic) để crash / lỗi mạng
+    thì lần chạy sau vẫn gửi lại được.
+    Daemon và lần chạy one-shot có thể dùng chung file: mọi thao tác đọc lại file dưới
+    khoá <outbox>.lock (flock), mỗi process chỉ gửi lại các message nó đã "claim"
+    (claim của process đã chết được coi như hết hiệu lực).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock_path = path.with_suffix(".lock")
+        # pid + token ngẫu nhiên: pid bị hệ điều hành dùng lại không nhận nhầm claim cũ
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """
+        Khoá độc quyền giữa các process (gọi khi đã giữ self._lock).
+        """
+        if fcntl is None:
+            yield
+            return
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock_path.open("ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                items = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            self.logger.warning("Cannot read outbox %s: %s", self.path, exc)
+            return {}
+        return {
+            item["id"]: item
+            for item in items
+            if isinstance(item, dict) and item.get("id")
+        }
+
+    def _write(self, items: Dict[str, Dict[str, Any]]) -> None:
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(list(items.values()), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            self.logger.warning("Cannot write outbox %s: %s", self.path, exc)
+
+    def _claim_is_live(self, owner: Optional[str]) -> bool:
+        if not owner:
+            return False
+        if owner == self.owner:
+            return True
+        try:
+            os.kill(int(owner.split(":", 1)[0]), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Process của user khác vẫn đang chạy
+            return True
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self._lock, self._file_lock():
+            items = self._read()
+        return sorted(items.values(), key=lambda item: item.get("created_at", 0))
+
+    def add(self, item: Dict[str, Any], claim: bool = True) -> None:
+        """
+        claim=True: process này sẽ tự gửi message (đang nằm trong hàng đợi của nó).
+        """
+        with self._lock, self._file_lock():
+            items = self._read()
+            if claim:
+                item["claimed_by"] = self.owner
+            else:
+                item.pop("claimed_by", None)
+            items[item["id"]] = item
+            self._write(items)
+
+    def claim_pending(self) -> List[Dict[str, Any]]:
+        """
+        Nhận các message chưa ai claim (hoặc claim của process đã chết) để gửi lại,
+        cũ trước mới sau. Message process khác đang giữ thì bỏ qua.
+        """
+        with self._lock, self._file_lock():
+            items = self._read()
+            claimed = [
+                item for item in items.values() if not self._claim_is_live(item.get("claimed_by"))
+            ]
+            if not claimed:
+                return []
+            for item in claimed:
+                item["claimed_by"] = self.owner
+            self._write(items)
+        return sorted(claimed, key=lambda item: item.get("created_at", 0))
+
+    def release(self, item_id: Optional[str] = None) -> None:
+        """
+        Trả lại claim (item_id=None: mọi message process này đang giữ) -> message vẫn trong
+        outbox, lượt gửi sau (của process này hoặc process khác) nhận lại.
+        """
+        with self._lock, self._file_lock():
+            items = self._read()
+            changed = False
+            for item in items.values():
+                if item.get("claimed_by") != self.owner:
+                    continue
+                if item_id is None or item["id"] == item_id:
+                    del item["claimed_by"]
+                    changed = True
+            if changed:
+                self._write(items)
+
+    def remove(self, item_id: str) -> None:
+        with self._lock, self._file_lock():
+            items = self._read()
+            if items.pop(item_id, None) is not None:
+                self._write(items)
+
+
+class TelegramSendQueue:
+    """
+    Hàng đợi gửi Telegram chạy ở thread nền:
+    - Producer (các service) chỉ enqueue, không bao giờ chờ Telegram.
+    - Token bucket global (~30 msg/s) + theo từng chat (~1 msg/s).
+    - RetryAfter (429): chờ đúng retry_after rồi gửi lại.
+    - NetworkError / TimedOut: retry với backoff, hết lượt thì giữ trong outbox cho lần chạy sau.
+    - ChatMigrated: gửi lại vào chat_id mới.
+    - Lỗi khác (BadRequest, Unauthorized...): bỏ message, log lỗi.
+    """
+
+    def __init__(
+        self,
+        send_func: Callable[[Dict[str, Any]], None],
+        outbox_path: Optional[Path] = None,
+        global_rate: float = 30.0,
+        per_chat_rate: float = 1.0,
+        per_chat_burst: float = 3.0,
+        max_attempts: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.send_func = send_func
+        self.outbox = Outbox(outbox_path or PROJECT_ROOT / "outbox.json")
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = float(per_chat_rate)
+        self.per_chat_burst = float(per_chat_burst)
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_backoff = float(base_backoff)
+        self.max_backoff = float(max_backoff)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # Message còn sót từ lần chạy trước (crash / lỗi mạng) -> gửi trước
+        self.retry_pending()
+
+    @classmethod
+    def from_config(
+        cls, send_func: Callable[[Dict[str, Any]], None], tg_cfg: Dict[str, Any]
+    ) -> "TelegramSendQueue":
+        outbox_path = tg_cfg.get("outbox_path")
+        return cls(
+            send_func,
+            outbox_path=PROJECT_ROOT / outbox_path if outbox_path else None,
+            global_rate=float(tg_cfg.get("global_rate_per_sec", 30)),
+            per_chat_rate=float(tg_cfg.get("per_chat_rate_per_sec", 1)),
+            per_chat_burst=float(tg_cfg.get("per_chat_burst", 3)),
+            max_attempts=int(tg_cfg.get("max_attempts", 5)),
+            base_backoff=float(tg_cfg.get("base_backoff_sec", 1)),
+            max_backoff=float(tg_cfg.get("max_backoff_sec", 30)),
+        )
+
+    def retry_pending(self) -> int:
+        """
+        Đưa lại vào hàng đợi các message còn trong outbox mà chưa process nào giữ:
+        sót từ lần chạy trước, gửi hỏng ở lượt trước (daemon gọi mỗi lượt chạy service).
+        Trả về số message được đưa lại.
+        """
+        leftovers = self.outbox.claim_pending()
+        if leftovers:
+            self.logger.info("Outbox has %d unsent message(s), retrying", len(leftovers))
+            for item in leftovers:
+                item["attempts"] = 0
+                self._queue.put(item)
+            self._ensure_started()
+        return len(leftovers)
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._worker, name="telegram-sender", daemon=True
+                )
+                self._thread.start()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        key = str(chat_id)
+        with self._buckets_lock:
+            bucket = self._chat_buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+                self._chat_buckets[key] = bucket
+            return bucket
+
+    @staticmethod
+    def _new_item(chat_id: Any, text: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": uuid.uuid4().hex,
+            "chat_id": chat_id,
+            "text": text,
+            "options": options,
+            "created_at": time.time(),
+            "attempts": 0,
+        }
+
+    def enqueue(self, chat_id: Any, text: str, **options: Any) -> str:
+        item = self._new_item(chat_id, text, options)
+        # Ghi outbox trước, crash ngay sau đó vẫn không mất message
+        self.outbox.add(item)
+        self._queue.put(item)
+        self._ensure_started()
+        return item["id"]
+
+    def keep_for_next_run(self, chat_id: Any, text: str, **options: Any) -> str:
+        """
+        Message gửi trực tiếp qua deliver (VD: broadcast) bị SEND_FAILED: chỉ ghi outbox
+        (không claim), lượt retry_pending sau gửi lại như message còn sót của hàng đợi.
+        """
+        item = self._new_item(chat_id, text, options)
+        self.outbox.add(item, claim=False)
+        return item["id"]
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+
+    def deliver(self, item: Dict[str, Any]) -> str:
+        """
+        Gửi 1 message (blocking) theo rate limit + retry. Thread-safe, dùng chung cho
+        worker của hàng đợi và broadcast. Trả về 1 trong các SEND_* outcome.
+        """
+        outcome = self._deliver(item)
+        TELEGRAM_MESSAGES.labels(outcome).inc()
+        return outcome
+
+    def _deliver(self, item: Dict[str, Any]) -> str:
+        while not self._stop.is_set():
+            self._chat_bucket(item["chat_id"]).acquire(self._stop)
+            self.global_bucket.acquire(self._stop)
+            item["attempts"] = item.get("attempts", 0) + 1
+            try:
+                self.send_func(item)
+            except RetryAfter as exc:
+                # 429 không tính là 1 lần thử hỏng
+                item["attempts"] -= 1
+                TELEGRAM_RETRIES.labels("flood_control").inc()
+                self.logger.warning(
+                    "Telegram flood control for chat_id=%s, retry after %ss",
+                    item["chat_id"],
+                    exc.retry_after,
+                )
+                self._stop.wait(float(exc.retry_after))
+                continue
+            except ChatMigrated as exc:
+                # Group được nâng lên supergroup -> gửi lại vào chat_id mới
+                self.logger.info(
+                    "chat_id=%s migrated to %s", item["chat_id"], exc.new_chat_id
+                )
+                item["migrated_from"] = item["chat_id"]
+                item["chat_id"] = exc.new_chat_id
+                item["attempts"] -= 1
+                continue
+            except Unauthorized as exc:
+                # Bot bị block / bị kick / user bị xoá
+                self.logger.warning("chat_id=%s unreachable: %s", item["chat_id"], exc)
+                return SEND_BLOCKED
+            except BadRequest as exc:
+                # BadRequest là subclass của NetworkError trong python-telegram-bot -> bắt trước
+                if "chat not found" in str(exc).lower():
+                    self.logger.warning("chat_id=%s unreachable: %s", item["chat_id"], exc)
+                    return SEND_BLOCKED
+                self.logger.error("Dropping message to chat_id=%s: %s", item["chat_id"], exc)
+                return SEND_DROPPED
+            except NetworkError as exc:
+                if item["attempts"] >= self.max_attempts:
+                    self.logger.error(
+                        "Giving up on message to chat_id=%s after %d attempts: %s",
+                        item["chat_id"],
+                        item["attempts"],
+                        exc,
+                    )
+                    return SEND_FAILED
+                delay = self._backoff(item["attempts"])
+                TELEGRAM_RETRIES.labels("network").inc()
+                self.logger.warning(
+                    "Telegram network error for chat_id=%s (attempt %d/%d), retry in %.1fs: %s",
+                    item["chat_id"],
+                    item["attempts"],
+                    self.max_attempts,
+                    delay,
+                    exc,
+                )
+                self._stop.wait(delay)
+                continue
+            except TelegramError as exc:
+                self.logger.error("Dropping message to chat_id=%s: %s", item["chat_id"], exc)
+                return SEND_DROPPED
+
+            return SEND_SENT
+
+        return SEND_FAILED
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is None:
+                self._queue.task_done()
+                break
+            try:
+                outcome = self.deliver(item)
+                if outcome == SEND_FAILED:
+                    self.logger.warning("Message %s kept in outbox for next run", item["id"])
+                    self.outbox.release(item["id"])
+                else:
+                    self.outbox.remove(item["id"])
+            except Exception as exc:
+                self.logger.exception("Unexpected error sending message: %s", exc)
+            finally:
+                self._queue.task_done()
+
+    def pending_count(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout: float = 60.0) -> bool:
+        """
+        Chờ gửi hết hàng đợi (tối đa timeout giây). Trả False nếu còn message chưa gửi
+        (vẫn nằm trong outbox, lần chạy sau gửi tiếp).
+        """
+        if self._queue.unfinished_tasks:
+            self._ensure_started()
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self._queue.unfinished_tasks == 0
+
+    def close(self, timeout: float = 60.0) -> None:
+        if not self.flush(timeout):
+            self.logger.warning(
+                "%d message(s) not sent, kept in outbox for next run", self.pending_count()
+            )
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        # Message chưa gửi: trả claim để process khác (VD: daemon) gửi luôn, không chờ lần chạy sau
+        self.outbox.release()
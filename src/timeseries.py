@@ -0,0 +1,526 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from bisect import bisect_right
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl  # khoá file khi daemon + one-shot cùng ghi (Linux / macOS)
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_HISTORY_DIR = PROJECT_ROOT / "data" / "history"
+
+# Index: mỗi block 1 entry (ts đầu block, offset trong file .ts)
+_INDEX_ENTRY = struct.Struct("<qQ")
+
+Point = Tuple[int, float]
+
+
+# ---------------------------
+# Varint / zigzag
+# ---------------------------
+def _zigzag(n: int) -> int:
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def _unzigzag(z: int) -> int:
+    return (z >> 1) if not z & 1 else -((z + 1) >> 1)
+
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    """
+    Trả về (giá trị, vị trí tiếp theo). IndexError nếu varint bị cắt cụt (ghi dở).
+    """
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _decode_records(buf: bytes, pos: int = 0) -> Iterator[Tuple[int, int, int, bool]]:
+    """
+    Duyệt bản ghi trong buf: (ts, value, vị trí kết thúc bản ghi, là keyframe).
+    Bản ghi:  varint(dts) zigzag(dvalue)           (dts >= 1 vì ts tăng dần)
+    Keyframe: varint(0) varint(ts) zigzag(value)  (đầu mỗi block, giá trị tuyệt đối)
+    Dừng ở bản ghi cắt cụt cuối file (crash khi đang ghi).
+    """
+    ts = value = 0
+    size = len(buf)
+    while pos < size:
+        try:
+            dts, p = _get_varint(buf, pos)
+            if dts == 0:
+                ts, p = _get_varint(buf, p)
+                z, p = _get_varint(buf, p)
+                value = _unzigzag(z)
+                keyframe = True
+            else:
+                z, p = _get_varint(buf, p)
+                ts += dts
+                value += _unzigzag(z)
+                keyframe = False
+        except IndexError:
+            return
+        pos = p
+        yield ts, value, pos, keyframe
+
+
+class Series:
+    """
+    1 chuỗi thời gian (1 instrument) append-only trên đĩa:
+    - <name>.ts: các block liên tiếp, mỗi block = 1 keyframe + tối đa block_records-1 bản ghi
+      delta (varint), giá trị là số nguyên = round(value * scale).
+    - <name>.idx: index thưa (ts đầu block, offset) -> range query chỉ đọc các block cần.
+    - <name>.lock: flock giữa các process (daemon + one-shot). File riêng, không bao giờ bị
+      thay: retention os.replace file .ts / .idx, khoá trên chính file .ts sẽ nằm ở inode cũ.
+    Block tự chứa (bắt đầu bằng keyframe) nên retention chỉ cần bỏ các block cũ ở đầu file.
+    """
+
+    def __init__(self, path: Path, scale: int = 1, block_records: int = 256) -> None:
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".idx")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.scale = max(1, int(scale))
+        self.block_records = max(2, int(block_records))
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+        self._block_ts: List[int] = []
+        self._block_off: List[int] = []
+        self._size = 0  # kích thước file .ts đã đồng bộ
+        self._ino: Optional[int] = None  # inode file .ts đã đồng bộ (retention thay file -> đổi)
+        self._last: Optional[Tuple[int, int]] = None  # (ts, value int) bản ghi cuối
+        self._tail_count = 0  # số bản ghi trong block cuối
+        with self._file_lock():
+            self._sync()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """
+        Khoá độc quyền giữa các process (gọi khi đã giữ self._lock nếu cần).
+        """
+        if fcntl is None:
+            yield
+            return
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock_path.open("ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---------------------------
+    # Đồng bộ index / trạng thái cuối file
+    # ---------------------------
+    def _sync(self) -> None:
+        """
+        Nạp index + quét block cuối (và phần chưa được index) để biết bản ghi cuối.
+        Cắt bỏ bản ghi ghi dở ở cuối file, bổ sung index còn thiếu (không có .idx -> dựng lại
+        từ keyframe). Phải giữ _file_lock: process khác đang ghi dở thì không được cắt.
+        """
+        self._block_ts, self._block_off = [], []
+        if self.index_path.exists():
+            raw = self.index_path.read_bytes()
+            torn = len(raw) % _INDEX_ENTRY.size
+            if torn:
+                # Entry ghi dở (crash) -> cắt đi, nếu không entry ghi thêm sau sẽ lệch vị trí
+                raw = raw[: len(raw) - torn]
+                with self.index_path.open("r+b") as f:
+                    f.truncate(len(raw))
+            for first_ts, offset in _INDEX_ENTRY.iter_unpack(raw):
+                self._block_ts.append(first_ts)
+                self._block_off.append(offset)
+
+        try:
+            st = self.path.stat()
+            size, self._ino = st.st_size, st.st_ino
+        except FileNotFoundError:
+            size, self._ino = 0, None
+        # Index trỏ ra ngoài file (file .ts bị cắt / ghi lại) -> bỏ các entry đó
+        while self._block_off and self._block_off[-1] >= size:
+            self._block_off.pop()
+            self._block_ts.pop()
+
+        start = self._block_off[-1] if self._block_off else 0
+        self._last = None
+        self._tail_count = 0
+        end = start
+        missing: List[Tuple[int, int]] = []
+        if size > start:
+            with self.path.open("rb") as f:
+                f.seek(start)
+                buf = f.read(size - start)
+            rec_start = 0
+            for ts, value, pos, keyframe in _decode_records(buf):
+                if keyframe:
+                    if start + rec_start not in self._block_off:
+                        missing.append((ts, start + rec_start))
+                    self._tail_count = 0
+                self._tail_count += 1
+                self._last = (ts, value)
+                rec_start = pos
+            end = start + rec_start
+
+        if end < size:
+            self.logger.warning("%s: dropping %d byte(s) of partial record", self.path.name, size - end)
+            with self.path.open("r+b") as f:
+                f.truncate(end)
+            size = end
+
+        if missing:
+            with self.index_path.open("ab") as f:
+                for first_ts, offset in missing:
+                    f.write(_INDEX_ENTRY.pack(first_ts, offset))
+                    self._block_ts.append(first_ts)
+                    self._block_off.append(offset)
+        self._size = size
+
+    # ---------------------------
+    # Ghi
+    # ---------------------------
+    def append(self, ts: float, value: float) -> bool:
+        """
+        Thêm 1 điểm. Bỏ qua (False) nếu ts không mới hơn điểm cuối (dữ liệu cache / trùng).
+        """
+        ts_i = int(ts)
+        value_i = int(round(float(value) * self.scale))
+        with self._lock, self._file_lock():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Mở file sau khi có khoá -> luôn là file .ts hiện tại (kể cả vừa bị retention thay)
+            with self.path.open("ab") as f:
+                st = os.fstat(f.fileno())
+                # Process khác vừa ghi thêm / thay file -> đọc lại trạng thái cuối file
+                if st.st_ino != self._ino or st.st_size != self._size:
+                    self._sync()
+                if self._last is not None and ts_i <= self._last[0]:
+                    return False
+
+                out = bytearray()
+                new_block = self._last is None or self._tail_count >= self.block_records
+                if new_block:
+                    _put_varint(out, 0)
+                    _put_varint(out, ts_i)
+                    _put_varint(out, _zigzag(value_i))
+                else:
+                    _put_varint(out, ts_i - self._last[0])
+                    _put_varint(out, _zigzag(value_i - self._last[1]))
+
+                offset = self._size
+                f.write(out)
+                f.flush()
+                if new_block:
+                    # Index ghi sau data: crash ở giữa thì _sync() tự bổ sung entry
+                    with self.index_path.open("ab") as idx:
+                        idx.write(_INDEX_ENTRY.pack(ts_i, offset))
+                    self._block_ts.append(ts_i)
+                    self._block_off.append(offset)
+                    self._tail_count = 0
+                self._size = offset + len(out)
+                self._tail_count += 1
+                self._last = (ts_i, value_i)
+                return True
+
+    # ---------------------------
+    # Đọc
+    # ---------------------------
+    def last(self) -> Optional[Point]:
+        with self._lock, self._file_lock():
+            self._refresh_if_changed()
+            last = self._last
+        if last is None:
+            return None
+        return last[0], last[1] / self.scale
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Point]:
+        """
+        Các điểm có start <= ts <= end (None = không giới hạn), chỉ đọc các block liên quan.
+        """
+        # Đọc khi giữ _file_lock: retention không thay file / process khác không ghi dở
+        # giữa lúc tính offset và lúc đọc
+        with self._lock, self._file_lock():
+            self._refresh_if_changed()
+            if not self._block_off:
+                return []
+            first = 0
+            if start is not None:
+                first = max(0, bisect_right(self._block_ts, int(start)) - 1)
+            last = len(self._block_off)
+            if end is not None:
+                last = max(first + 1, bisect_right(self._block_ts, int(end)))
+            read_from = self._block_off[first]
+            read_to = self._block_off[last] if last < len(self._block_off) else self._size
+
+            with self.path.open("rb") as f:
+                f.seek(read_from)
+                buf = f.read(read_to - read_from)
+
+        points: List[Point] = []
+        scale = self.scale
+        for ts, value, _, _ in _decode_records(buf):
+            if start is not None and ts < start:
+                continue
+            if end is not None and ts > end:
+                break
+            points.append((ts, value / scale))
+        return points
+
+    def _refresh_if_changed(self) -> None:
+        """
+        File .ts đã bị process khác thay (retention) hoặc ghi thêm -> nạp lại index / block cuối.
+        Phải giữ _file_lock.
+        """
+        try:
+            st = self.path.stat()
+            ino, size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            ino, size = None, 0
+        if ino != self._ino or size != self._size:
+            self._sync()
+
+    # ---------------------------
+    # Retention
+    # ---------------------------
+    def apply_retention(self, cutoff_ts: float) -> int:
+        """
+        Bỏ các block mà toàn bộ điểm đều cũ hơn cutoff (block sau bắt đầu <= cutoff).
+        Ghi file mới rồi os.replace, giữ _file_lock suốt quá trình. Trả về số block đã bỏ.
+        """
+        with self._lock, self._file_lock():
+            # Index trong RAM có thể thiếu block process khác vừa ghi
+            self._sync()
+            drop = max(0, bisect_right(self._block_ts, int(cutoff_ts)) - 1)
+            if drop == 0:
+                return 0
+            base = self._block_off[drop]
+            with self.path.open("rb") as f:
+                f.seek(base)
+                data = f.read(self._size - base)
+            tmp = self.path.with_suffix(".ts.tmp")
+            tmp.write_bytes(data)
+            index = b"".join(
+                _INDEX_ENTRY.pack(ts, off - base)
+                for ts, off in zip(self._block_ts[drop:], self._block_off[drop:])
+            )
+            tmp_idx = self.index_path.with_suffix(".idx.tmp")
+            tmp_idx.write_bytes(index)
+            # .ts và .idx không thay được atomic cùng lúc: xoá index trước -> crash ở bất kỳ
+            # bước nào thì _sync() chỉ gặp "không có index" và dựng lại từ keyframe,
+            # không bao giờ gặp index cũ trỏ sai offset trên file mới
+            try:
+                self.index_path.unlink()
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, self.path)
+            os.replace(tmp_idx, self.index_path)
+            self._sync()
+            return drop
+
+
+def downsample(points: List[Point], step: float, how: str = "last") -> List[Point]:
+    """
+    Gộp điểm theo bucket step giây (ts bucket = ts // step * step).
+    how: "last" | "first" | "mean" | "min" | "max".
+    """
+    step_i = max(1, int(step))
+    out: List[Point] = []
+    bucket_ts: Optional[int] = None
+    values: List[float] = []
+
+    def flush() -> None:
+        if how == "last":
+            v = values[-1]
+        elif how == "first":
+            v = values[0]
+        elif how == "mean":
+            v = sum(values) / len(values)
+        elif how == "min":
+            v = min(values)
+        elif how == "max":
+            v = max(values)
+        else:
+            raise ValueError(f"Unknown downsample mode: {how}")
+        out.append((bucket_ts, v))
+
+    for ts, value in points:
+        b = ts - ts % step_i
+        if b != bucket_ts and values:
+            flush()
+            values = []
+        bucket_ts = b
+        values.append(value)
+    if values:
+        flush()
+    return out
+
+
+def instrument_slug(name: str) -> str:
+    """
+    "Xăng RON 95-III" -> "xang_ron_95_iii" (bỏ dấu tiếng Việt, dùng làm tên instrument / file).
+    """
+    text = unicodedata.normalize("NFKD", name.replace("đ", "d").replace("Đ", "D"))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return re.sub(r"[^a-z0-9]+", "_", text).strip("_") or "unknown"
+
+
+class TimeSeriesStore:
+    """
+    Lịch sử giá (vàng / xăng / tỷ giá...): mỗi instrument 1 Series trong cache_dir,
+    series.json lưu scale của từng instrument (để đọc lại đúng số thập phân).
+    """
+
+    MANIFEST = "series.json"
+
+    def __init__(
+        self,
+        history_dir: Optional[Path] = None,
+        retention_days: float = 3 * 365,
+        block_records: int = 256,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.dir = PROJECT_ROOT / history_dir if history_dir else DEFAULT_HISTORY_DIR
+        self.retention_days = float(retention_days)
+        self.block_records = int(block_records)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._series: Dict[str, Series] = {}
+        self._manifest: Dict[str, Dict[str, Any]] = self._read_manifest() if enabled else {}
+
+    @classmethod
+    def from_config(cls, history_cfg: Dict[str, Any]) -> "TimeSeriesStore":
+        return cls(
+            history_dir=history_cfg.get("dir"),
+            retention_days=float(history_cfg.get("retention_days", 3 * 365)),
+            block_records=int(history_cfg.get("block_records", 256)),
+            enabled=bool(history_cfg.get("enabled", True)),
+        )
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        path = self.dir / self.MANIFEST
+        if not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            self.logger.warning("History manifest %s is corrupt, ignored", path)
+            return {}
+
+    def _reload_manifest(self) -> None:
+        # Process khác (VD: daemon) có thể đã tạo instrument sau khi store này mở manifest
+        with self._lock:
+            self._manifest.update(self._read_manifest())
+
+    def instruments(self) -> List[str]:
+        if self.enabled:
+            self._reload_manifest()
+        return sorted(self._manifest)
+
+    def series(self, instrument: str, scale: int = 1) -> Series:
+        with self._lock:
+            s = self._series.get(instrument)
+            if s is not None:
+                return s
+            meta = self._manifest.get(instrument)
+            if meta is None:
+                # Đọc lại manifest trước khi ghi: process khác có thể vừa thêm instrument
+                self._manifest.update(self._read_manifest())
+                meta = self._manifest.setdefault(
+                    instrument, {"file": instrument_slug(instrument) + ".ts", "scale": int(scale)}
+                )
+                self.dir.mkdir(parents=True, exist_ok=True)
+                tmp = self.dir / f"{self.MANIFEST}.{os.getpid()}.tmp"
+                tmp.write_text(json.dumps(self._manifest, indent=2, sort_keys=True), encoding="utf-8")
+                os.replace(tmp, self.dir / self.MANIFEST)
+            s = Series(self.dir / meta["file"], int(meta.get("scale", 1)), self.block_records)
+            self._series[instrument] = s
+            return s
+
+    def record(self, ts: float, values: Dict[str, float], scale: int = 1) -> int:
+        """
+        Ghi 1 lượt giá: {instrument: value}. Trả về số điểm mới đã ghi.
+        """
+        if not self.enabled:
+            return 0
+        written = 0
+        for instrument, value in values.items():
+            if value is None:
+                continue
+            try:
+                if self.series(instrument, scale).append(ts, value):
+                    written += 1
+            except OSError as exc:
+                self.logger.warning("History append %s failed: %s", instrument, exc)
+        return written
+
+    def query(
+        self,
+        instrument: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        step: Optional[float] = None,
+        how: str = "last",
+    ) -> List[Point]:
+        if not self.enabled:
+            return []
+        if instrument not in self._manifest:
+            self._reload_manifest()
+            if instrument not in self._manifest:
+                return []
+        points = self.series(instrument).range(start, end)
+        return downsample(points, step, how) if step else points
+
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        if not self.enabled or self.retention_days <= 0:
+            return 0
+        cutoff = (now or time.time()) - self.retention_days * 86400
+        dropped = 0
+        for instrument in self.instruments():
+            dropped += self.series(instrument).apply_retention(cutoff)
+        if dropped:
+            self.logger.info("History retention: dropped %d block(s)", dropped)
+        return dropped
+
+
+_history: Optional[TimeSeriesStore] = None
+_history_lock = threading.Lock()
+
+
+def configure_history(history_cfg: Dict[str, Any]) -> TimeSeriesStore:
+    global _history
+    with _history_lock:
+        _history = TimeSeriesStore.from_config(history_cfg or {})
+        return _history
+
+
+def get_history() -> TimeSeriesStore:
+    """
+    Chưa configure (VD: chạy bench / thử service riêng lẻ) -> store tắt, không ghi gì.
+    """
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = TimeSeriesStore(enabled=False)
+    return _history
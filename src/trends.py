@@ -0,0 +1,157 @@
+import fnmatch
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from timeseries import TimeSeriesStore
+
+DAY = 86400
+# Ngày tính theo giờ Việt Nam (UTC+7) khi lấy giá đóng cửa theo ngày
+VN_OFFSET_SEC = 7 * 3600
+
+# Các mốc so sánh: 1 ngày / 7 ngày / 30 ngày
+HORIZONS = (("1N", 1 * DAY), ("7N", 7 * DAY), ("30N", 30 * DAY))
+
+
+class TrendStats:
+    """
+    Thống kê xu hướng của 1 instrument tại thời điểm now.
+    changes: nhãn -> % thay đổi (None nếu lịch sử chưa đủ dài).
+    volatility: độ lệch chuẩn log-return theo ngày (%), None nếu < 2 ngày dữ liệu.
+    """
+
+    __slots__ = ("instrument", "last", "changes", "ma_short", "ma_long", "low", "high", "volatility")
+
+    def __init__(
+        self,
+        instrument: str,
+        last: float,
+        changes: Dict[str, Optional[float]],
+        ma_short: Optional[float],
+        ma_long: Optional[float],
+        low: float,
+        high: float,
+        volatility: Optional[float],
+    ) -> None:
+        self.instrument = instrument
+        self.last = last
+        self.changes = changes
+        self.ma_short = ma_short
+        self.ma_long = ma_long
+        self.low = low
+        self.high = high
+        self.volatility = volatility
+
+
+class TrendAnalyzer:
+    """
+    Tính xu hướng trên lịch sử giá (TimeSeriesStore) bằng NumPy.
+    Mỗi instrument giữ 1 cửa sổ (window_days + 1 ngày) dạng mảng ts int64 / value float64
+    trong RAM: lần đầu đọc từ đĩa, các lần sau chỉ nạp thêm điểm mới và cắt phần quá cũ,
+    nên mỗi tick chỉ tốn vài phép searchsorted / reduce trên mảng.
+    """
+
+    def __init__(
+        self,
+        history: TimeSeriesStore,
+        window_days: int = 30,
+        ma_short_days: int = 7,
+        ma_long_days: int = 30,
+    ) -> None:
+        self.history = history
+        self.window = (int(window_days) + 1) * DAY
+        self.ma_short_days = int(ma_short_days)
+        self.ma_long_days = int(ma_long_days)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._horizons = np.array([h for _, h in HORIZONS], dtype=np.int64)
+
+    def resolve(self, pattern: str) -> Optional[str]:
+        """
+        Pattern kiểu glob ("gold.*sjc*.sell") -> instrument đầu tiên khớp trong history.
+        """
+        matches = fnmatch.filter(self.history.instruments(), pattern)
+        return matches[0] if matches else None
+
+    def _window(self, instrument: str, now: float) -> Tuple[np.ndarray, np.ndarray]:
+        start = int(now) - self.window
+        cached = self._windows.get(instrument)
+        if cached is None:
+            points = self.history.query(instrument, start)
+            ts = np.fromiter((p[0] for p in points), dtype=np.int64, count=len(points))
+            values = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+        else:
+            ts, values = cached
+            since = int(ts[-1]) + 1 if len(ts) else start
+            points = self.history.query(instrument, since)
+            if points:
+                ts = np.concatenate((ts, np.array([p[0] for p in points], dtype=np.int64)))
+                values = np.concatenate((values, np.array([p[1] for p in points], dtype=np.float64)))
+            cut = int(np.searchsorted(ts, start, side="left"))
+            if cut:
+                ts, values = ts[cut:], values[cut:]
+        self._windows[instrument] = (ts, values)
+        return ts, values
+
+    def _daily_closes(self, ts: np.ndarray, values: np.ndarray) -> np.ndarray:
+        # Giá cuối cùng của mỗi ngày (UTC+7): vị trí cuối trước mỗi lần đổi ngày
+        days = (ts + VN_OFFSET_SEC) // DAY
+        last_of_day = np.flatnonzero(np.diff(days))
+        return values[np.append(last_of_day, len(values) - 1)]
+
+    def compute(self, instrument: str, now: Optional[float] = None) -> Optional[TrendStats]:
+        now = time.time() if now is None else now
+        with self._lock:
+            ts, values = self._window(instrument, now)
+        if len(ts) < 2:
+            return None
+
+        last = float(values[-1])
+
+        # Giá tại (hoặc ngay trước) now - horizon cho cả 3 mốc cùng lúc
+        idx = np.searchsorted(ts, int(now) - self._horizons, side="right") - 1
+        base = values[np.maximum(idx, 0)]
+        pct = np.where((idx >= 0) & (base != 0), (last - base) / np.where(base != 0, base, 1) * 100, np.nan)
+        changes = {
+            label: (None if np.isnan(p) else float(p)) for (label, _), p in zip(HORIZONS, pct)
+        }
+
+        closes = self._daily_closes(ts, values)
+        ma_short = float(closes[-self.ma_short_days:].mean()) if len(closes) >= 2 else None
+        ma_long = float(closes[-self.ma_long_days:].mean()) if len(closes) >= 2 else None
+
+        in_range = values[np.searchsorted(ts, int(now) - HORIZONS[-1][1], side="left"):]
+        if not len(in_range):
+            in_range = values[-1:]
+
+        volatility = None
+        positive = closes[closes > 0]
+        if len(positive) >= 3:
+            volatility = float(np.diff(np.log(positive)).std(ddof=1) * 100)
+
+        return TrendStats(
+            instrument,
+            last,
+            changes,
+            ma_short,
+            ma_long,
+            float(in_range.min()),
+            float(in_range.max()),
+            volatility,
+        )
+
+    def compute_many(self, patterns: List[str], now: Optional[float] = None) -> Dict[str, Optional[TrendStats]]:
+        """
+        pattern -> TrendStats (None nếu chưa có instrument / chưa đủ dữ liệu).
+        """
+        now = time.time() if now is None else now
+        out: Dict[str, Optional[TrendStats]] = {}
+        for pattern in patterns:
+            instrument = self.resolve(pattern)
+            out[pattern] = self.compute(instrument, now) if instrument else None
+        return out
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".cache" / "ttl"
+
+VN_TZ = timezone(timedelta(hours=7))
+
+
+class CachedValue:
+    """
+    Giá trị lấy từ TtlCache.
+    - fetched_at: thời điểm lấy từ upstream (UTC timestamp).
+    - from_fallback: True nếu upstream lỗi và đang dùng bản cũ còn lưu.
+    """
+
+    def __init__(self, value: Any, fetched_at: float, from_fallback: bool = False) -> None:
+        self.value = value
+        self.fetched_at = fetched_at
+        self.from_fallback = from_fallback
+
+    def as_of_note(self) -> str:
+        """
+        Ghi chú "dữ liệu lúc ..." (HTML) khi đang dùng bản cũ, "" nếu dữ liệu mới.
+        """
+        if not self.from_fallback:
+            return ""
+        dt_vn = datetime.fromtimestamp(self.fetched_at, tz=VN_TZ)
+        return f" <i>(dữ liệu cũ lúc {dt_vn.strftime('%H:%M %d/%m')})</i>"
+
+
+class TtlCache:
+    """
+    Cache theo (service, endpoint) với TTL riêng cho từng nguồn, lưu trên đĩa:
+    - age < ttl: trả luôn từ cache.
+    - ttl <= age < ttl + swr: trả bản cũ ngay, refresh ở thread nền (stale-while-revalidate).
+    - còn lại: gọi upstream; lỗi thì trả bản cũ gần nhất (tối đa stale_if_error) kèm "as of".
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        sources: Optional[Dict[str, Dict[str, Any]]] = None,
+        default_ttl_min: float = 10.0,
+        default_swr_min: float = 10.0,
+        stale_if_error_min: float = 24 * 60,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.cache_dir = PROJECT_ROOT / cache_dir if cache_dir else DEFAULT_CACHE_DIR
+        self.sources = sources or {}
+        self.default_ttl_min = float(default_ttl_min)
+        self.default_swr_min = float(default_swr_min)
+        self.stale_if_error = float(stale_if_error_min) * 60
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, threading.Thread] = {}
+
+    @classmethod
+    def from_config(cls, cache_cfg: Dict[str, Any]) -> "TtlCache":
+        return cls(
+            cache_dir=cache_cfg.get("dir"),
+            sources=cache_cfg.get("sources", {}),
+            default_ttl_min=float(cache_cfg.get("default_ttl_min", 10)),
+            default_swr_min=float(cache_cfg.get("default_swr_min", 10)),
+            stale_if_error_min=float(cache_cfg.get("stale_if_error_min", 24 * 60)),
+            enabled=bool(cache_cfg.get("enabled", True)),
+        )
+
+    def _policy(self, source: str) -> Tuple[float, float]:
+        cfg = self.sources.get(source, {})
+        ttl = float(cfg.get("ttl_min", self.default_ttl_min)) * 60
+        swr = float(cfg.get("swr_min", self.default_swr_min)) * 60
+        return ttl, swr
+
+    def _key(self, source: str, variant: str) -> str:
+        if not variant:
+            return source.replace(":", "_")
+        digest = hashlib.sha1(variant.encode("utf-8")).hexdigest()[:12]
+        return f"{source.replace(':', '_')}_{digest}"
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None:
+            return entry
+        try:
+            with self._path(key).open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            self.logger.warning("Bad TTL cache entry %s: %s", key, exc)
+            return None
+        with self._lock:
+            self._memory[key] = entry
+        return entry
+
+    def _store(self, key: str, value: Any) -> Dict[str, Any]:
+        entry = {"fetched_at": time.time(), "value": value}
+        with self._lock:
+            self._memory[key] = entry
+
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as exc:
+            self.logger.warning("Cannot write TTL cache entry %s: %s", key, exc)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+        return entry
+
+    def _fetch_and_store(self, key: str, fetch: Callable[[], Any]) -> Optional[Dict[str, Any]]:
+        try:
+            value = fetch()
+        except Exception as exc:
+            self.logger.warning("Fetch for %s failed: %s", key, exc)
+            return None
+        if value is None:
+            return None
+        return self._store(key, value)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Any]) -> None:
+        with self._lock:
+            running = self._refreshing.get(key)
+            if running is not None and running.is_alive():
+                return
+
+            def worker() -> None:
+                try:
+                    self._fetch_and_store(key, fetch)
+                finally:
+                    with self._lock:
+                        self._refreshing.pop(key, None)
+
+            thread = threading.Thread(target=worker, name=f"ttl-refresh-{key}", daemon=True)
+            self._refreshing[key] = thread
+        thread.start()
+
+    def get(
+        self,
+        source: str,
+        fetch: Callable[[], Any],
+        variant: str = "",
+    ) -> Optional[CachedValue]:
+        """
+        source: "service:endpoint" (VD: "gold_fx:pnj"), dùng để tra TTL trong config.
+        variant: phân biệt các request cùng endpoint (VD: toạ độ).
+        fetch: hàm gọi upstream, trả None nếu lỗi. Giá trị phải serialize được JSON.
+        """
+        if not self.enabled:
+            try:
+                value = fetch()
+            except Exception as exc:
+                self.logger.warning("Fetch for %s failed: %s", source, exc)
+                value = None
+            return CachedValue(value, time.time()) if value is not None else None
+
+        key = self._key(source, variant)
+        ttl, swr = self._policy(source)
+        entry = self._load(key)
+        now = time.time()
+
+        if entry is not None:
+            age = now - float(entry.get("fetched_at", 0))
+            if age < ttl:
+                return CachedValue(entry["value"], entry["fetched_at"])
+            if age < ttl + swr:
+                self.logger.info("%s stale (%.0fs old), refreshing in background", key, age)
+                self._refresh_in_background(key, fetch)
+                return CachedValue(entry["value"], entry["fetched_at"])
+
+        fresh = self._fetch_and_store(key, fetch)
+        if fresh is not None:
+            return CachedValue(fresh["value"], fresh["fetched_at"])
+
+        if entry is not None and now - float(entry.get("fetched_at", 0)) < self.stale_if_error:
+            self.logger.warning("%s upstream failed, serving last good value", key)
+            return CachedValue(entry["value"], entry["fetched_at"], from_fallback=True)
+        return None
+
+    def put(self, source: str, value: Any, variant: str = "") -> CachedValue:
+        """
+        Ghi giá trị vừa fetch ngoài get() (VD: bản trong cache không dùng được, caller tự fetch lại).
+        """
+        if not self.enabled:
+            return CachedValue(value, time.time())
+        entry = self._store(self._key(source, variant), value)
+        return CachedValue(entry["value"], entry["fetched_at"])
+
+    def peek(
+        self,
+        source: str,
+        variant: str = "",
+        refresh: Optional[Callable[[], Any]] = None,
+    ) -> Optional[CachedValue]:
+        """
+        Đọc bản đang có trong cache, không chờ upstream (dùng cho lệnh bot tương tác).
+        - Bản quá ttl: vẫn trả về ngay, refresh nền (mỗi key tối đa 1 refresh cùng lúc,
+          nhiều lệnh dồn dập không nhân số request lên upstream).
+        - Quá ttl + swr: đánh dấu from_fallback để hiện "dữ liệu cũ lúc ...".
+        - Chưa có: None (refresh nền để lần sau có dữ liệu).
+        """
+        if not self.enabled:
+            return None
+
+        key = self._key(source, variant)
+        ttl, swr = self._policy(source)
+        entry = self._load(key)
+        if entry is None:
+            if refresh is not None:
+                self._refresh_in_background(key, refresh)
+            return None
+
+        age = time.time() - float(entry.get("fetched_at", 0))
+        if age >= ttl and refresh is not None:
+            self._refresh_in_background(key, refresh)
+        return CachedValue(entry["value"], entry["fetched_at"], from_fallback=age >= ttl + swr)
+
+    def wait_pending(self, timeout: float = 30.0) -> None:
+        """
+        Chờ các refresh nền chạy xong (gọi trước khi thoát process ở chế độ one-shot).
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+_cache: Optional[TtlCache] = None
+_cache_lock = threading.Lock()
+
+
+def configure_ttl_cache(cache_cfg: Dict[str, Any]) -> TtlCache:
+    global _cache
+    with _cache_lock:
+        _cache = TtlCache.from_config(cache_cfg or {})
+        return _cache
+
+
+def get_ttl_cache() -> TtlCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TtlCache()
+    return _cache
@@ -2,13 +2,25 @@ import json
 import logging
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 import requests
 
+from http_client import endpoint_labels, get_http_client
+from metrics import get_metrics
+
 # Thư mục project root (chứa config.json, secrets.json, state.json)
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+HTTP_RETRIES = get_metrics().counter(
+    "http_retries_total", "Upstream HTTP retries scheduled", ("host", "endpoint")
+)
+HTTP_FAILURES = get_metrics().counter(
+    "http_failures_total",
+    "Upstream HTTP calls that returned no result (circuit_open, not_retryable, exhausted)",
+    ("host", "endpoint", "reason"),
+)
+
 
 def load_json(relative_path: str, default: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
@@ -31,27 +43,125 @@ def save_json(relative_path: str, data: Dict[str, Any]) -> None:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
-def http_get_json(
+def _http_get_with_retry(
     url: str,
+    parse: Callable[[requests.Response], Any],
     params: Optional[Dict[str, Any]] = None,
-    retries: int = 3,
-    timeout: int = 10,
-) -> Optional[Dict[str, Any]]:
+    retries: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cache_tag: Optional[str] = None,
+) -> Any:
     """
-    GET JSON với retry đơn giản.
+    GET + parse theo RetryPolicy / circuit breaker của HTTP client dùng chung.
+    Trả về kết quả parse(resp), hoặc None nếu lỗi / circuit đang mở.
+
+    cache_tag != None: dùng conditional GET (ETag / Last-Modified) với HttpCache,
+    upstream trả 304 thì trả lại kết quả parse đã lưu, không gọi parse nữa.
     """
-    for attempt in range(1, retries + 1):
+    client = get_http_client()
+    policy = client.retry_policy
+    breaker = client.breakers.for_url(url)
+    max_attempts = max(1, retries if retries is not None else policy.max_attempts)
+
+    cache = client.cache if cache_tag is not None else None
+    cache_key = cache.make_key(url, params, cache_tag) if cache else None
+    cache_entry = cache.get(cache_key) if cache else None
+    headers = cache.validator_headers(cache_entry) if cache else None
+
+    for attempt in range(1, max_attempts + 1):
+        if not breaker.allow():
+            logging.warning("GET %s skipped: circuit open for %s", url, client.breakers.host_of(url))
+            HTTP_FAILURES.labels(*endpoint_labels(url), "circuit_open").inc()
+            return None
         try:
-            resp = requests.get(url, params=params, timeout=timeout)
+            resp = client.get(url, params=params, timeout=timeout, headers=headers)
+            if resp.status_code == 304 and cache_entry is not None:
+                breaker.record_success()
+                logging.info("GET %s not modified, using cached result", url)
+                return cache_entry.get("parsed")
             resp.raise_for_status()
-            return resp.json()
+            result = parse(resp)
+            if cache is not None:
+                cache.put(
+                    cache_key,
+                    url,
+                    resp.headers.get("ETag"),
+                    resp.headers.get("Last-Modified"),
+                    result,
+                )
         except Exception as exc:
-            logging.warning("GET %s failed (attempt %s/%s): %s", url, attempt, retries, exc)
-            time.sleep(1)
-    logging.error("GET %s failed after %s attempts.", url, retries)
+            if policy.is_retryable(exc):
+                breaker.record_failure()
+            else:
+                # 4xx / JSON lỗi: host vẫn sống, không tính vào circuit breaker
+                breaker.record_success()
+                logging.error("GET %s failed (not retryable): %s", url, exc)
+                HTTP_FAILURES.labels(*endpoint_labels(url), "not_retryable").inc()
+                return None
+
+            delay = policy.delay_for(exc, attempt) if attempt < max_attempts else None
+            logging.warning("GET %s failed (attempt %s/%s): %s", url, attempt, max_attempts, exc)
+            if delay is None:
+                break
+            HTTP_RETRIES.labels(*endpoint_labels(url)).inc()
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+    logging.error("GET %s failed after %s attempts.", url, attempt)
+    HTTP_FAILURES.labels(*endpoint_labels(url), "exhausted").inc()
     return None
 
 
+def http_get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    retries: Optional[int] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    GET JSON với retry (exponential backoff + jitter) và circuit breaker theo host.
+    use_cache=True: conditional GET qua HttpCache (304 -> trả JSON đã lưu).
+    """
+    return _http_get_with_retry(
+        url,
+        lambda resp: resp.json(),
+        params,
+        retries,
+        timeout,
+        cache_tag="json" if use_cache else None,
+    )
+
+
+def http_get_parsed(
+    url: str,
+    parse: Callable[[requests.Response], Any],
+    cache_tag: str,
+    params: Optional[Dict[str, Any]] = None,
+    retries: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Any:
+    """
+    GET + parse tuỳ ý (VD: scrape HTML) với conditional GET cache.
+    Kết quả parse phải serialize được JSON; upstream trả 304 thì parse không bị gọi.
+    """
+    return _http_get_with_retry(url, parse, params, retries, timeout, cache_tag=cache_tag)
+
+
+def http_get_text(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    retries: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Optional[str]:
+    """
+    GET text (HTML...) với cùng retry / circuit breaker như http_get_json.
+    """
+    return _http_get_with_retry(url, lambda resp: resp.text, params, retries, timeout)
+
+
 def should_run(state: Dict[str, Any], key: str, interval_min: int, now_ts: float) -> bool:
     """
     Kiểm tra đã đến lúc chạy service chưa (theo phút).
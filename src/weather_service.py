@@ -1,10 +1,17 @@
 import logging
-from typing import Any, Dict, Optional, Tuple, List
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, List
 from html import escape as html_escape
-from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 
 from util import http_get_json
+from http_client import get_http_client
+from ttl_cache import get_ttl_cache
+from forecast_model import ForecastIndex
+from ttl_cache import CachedValue
+from service_runner import run_parallel
+from alert_rules import get_alert_engine
+from timeseries import instrument_slug
 
 
 class WeatherService:
@@ -30,51 +37,85 @@ class WeatherService:
         # Số ngày muốn hiển thị forecast (3 hoặc 5)
         self.forecast_days = int(config.get("forecast_days", 3))
 
+        # Nhiều địa điểm: weather.locations = [{"name", "lat", "lon"}, ...]
+        # (không có thì dùng location_name / lat / lon như cũ)
+        self.locations: List[Dict[str, Any]] = []
+        for loc in config.get("locations") or []:
+            if loc.get("lat") is None or loc.get("lon") is None:
+                self.logger.warning("Skipping weather location without lat/lon: %s", loc)
+                continue
+            self.locations.append(
+                {"name": loc.get("name", "Vị trí"), "lat": loc["lat"], "lon": loc["lon"]}
+            )
+        if not self.locations and self.lat is not None and self.lon is not None:
+            self.locations.append({"name": self.location_name, "lat": self.lat, "lon": self.lon})
+
+        # Toạ độ làm tròn tới coord_precision chữ số thập phân trùng nhau -> chỉ fetch 1 lần
+        self.coord_precision = int(config.get("coord_precision", 2))
+        # Số request OpenWeather cùng lúc (mỗi địa điểm 2 request: /weather + /forecast)
+        self.max_concurrency = int(config.get("max_concurrency", 8))
+        # Nhiều địa điểm: có gửi kèm chi tiết từng nơi sau bảng tổng hợp không
+        self.details = bool(config.get("details", True))
+
     def is_configured(self) -> bool:
-        return (
-            self.enabled
-            and self.api_key is not None
-            and self.lat is not None
-            and self.lon is not None
-        )
+        return self.enabled and self.api_key is not None and bool(self.locations)
 
-    def _common_params(self) -> Dict[str, Any]:
+    def _common_params(
+        self, lat: Optional[float] = None, lon: Optional[float] = None
+    ) -> Dict[str, Any]:
         return {
-            "lat": self.lat,
-            "lon": self.lon,
+            "lat": self.lat if lat is None else lat,
+            "lon": self.lon if lon is None else lon,
             "units": self.units,
             "lang": self.lang,
             "appid": self.api_key,
         }
 
-    def fetch_current(self) -> Optional[Dict[str, Any]]:
+    def fetch_current(
+        self, lat: Optional[float] = None, lon: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
         url = f"{self.api_base}/weather"
-        return http_get_json(url, params=self._common_params())
+        return http_get_json(url, params=self._common_params(lat, lon))
 
-    def fetch_forecast(self) -> Optional[Dict[str, Any]]:
+    def fetch_forecast(
+        self, lat: Optional[float] = None, lon: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
         url = f"{self.api_base}/forecast"
-        return http_get_json(url, params=self._common_params())
+        return http_get_json(url, params=self._common_params(lat, lon))
+
+    def _coord_key(self, lat: float, lon: float) -> Tuple[float, float]:
+        return round(float(lat), self.coord_precision), round(float(lon), self.coord_precision)
+
+    def _variant(self, lat: float, lon: float) -> str:
+        return f"{lat},{lon},{self.units},{self.lang}"
+
+    def _location_tasks(self, lat: float, lon: float) -> Dict[str, Callable[[], Optional[CachedValue]]]:
+        """
+        /weather + /forecast của 1 toạ độ (qua TTL cache), để gom chung vào 1 pool fetch.
+        """
+        cache = get_ttl_cache()
+        variant = self._variant(lat, lon)
+        return {
+            "current": lambda: cache.get(
+                "weather:current", lambda: self.fetch_current(lat, lon), variant
+            ),
+            "forecast": lambda: cache.get(
+                "weather:forecast", lambda: self.fetch_forecast(lat, lon), variant
+            ),
+        }
 
     def _extract_rain_alert(
-        self, forecast: Dict[str, Any], hours_ahead: int = 12
+        self, fc: ForecastIndex, hours_ahead: int = 12
     ) -> Tuple[bool, float]:
         """
         Tìm lượng mưa lớn nhất trong n giờ tới (3h/slot).
         """
-        if not forecast:
+        if not len(fc):
             return False, 0.0
 
-        slots = forecast.get("list", [])
-        max_rain = 0.0
         # Mỗi slot là 3h, lấy số slot tương ứng với hours_ahead
         max_slots = max(1, hours_ahead // 3)
-        for item in slots[:max_slots]:
-            rain = item.get("rain") or {}
-            mm = rain.get("3h", 0.0)
-            try:
-                max_rain = max(max_rain, float(mm))
-            except (TypeError, ValueError):
-                continue
+        max_rain = fc.max_rain(max_slots)
 
         alert = max_rain >= self.rain_alert_mm
         return alert, max_rain
@@ -112,11 +153,11 @@ class WeatherService:
     # -----------------------------
     def _build_daily_forecast(
         self,
-        forecast: Dict[str, Any],
+        fc: ForecastIndex,
         today_date_str: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
         """
-        Từ dữ liệu /forecast (3h/slot), gom lại thành từng ngày:
+        Từ ForecastIndex (3h/slot), gom lại thành từng ngày:
         - date: "YYYY-MM-DD"
         - min_temp, max_temp
         - desc: mô tả chính trong ngày (ưu tiên khung giờ 12:00)
@@ -125,66 +166,24 @@ class WeatherService:
         today_date_str: nếu truyền vào (VD: '2025-11-16') thì sẽ BỎ ngày này khỏi danh sách.
         """
         result: List[Dict[str, Any]] = []
-        if not forecast:
-            return result
-
-        slots = forecast.get("list", [])
-        by_date: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-            "temps": [],
-            "rains": [],
-            "descs": [],
-            "noon_desc": None,
-        })
-
-        for item in slots:
-            dt_txt = item.get("dt_txt")  # "2025-11-16 12:00:00"
-            if not dt_txt:
-                continue
-
-            date_str, time_str = dt_txt.split(" ")
-            bucket = by_date[date_str]
-
-            main = item.get("main", {})
-            temp = main.get("temp")
-            if temp is not None:
-                bucket["temps"].append(float(temp))
 
-            weather_arr = item.get("weather") or []
-            desc = weather_arr[0].get("description") if weather_arr else None
-            if desc:
-                bucket["descs"].append(desc)
-                if time_str.startswith("12:00"):
-                    bucket["noon_desc"] = desc
-
-            rain = item.get("rain") or {}
-            mm = rain.get("3h", 0.0)
-            try:
-                bucket["rains"].append(float(mm))
-            except (TypeError, ValueError):
-                pass
-
-        all_dates = sorted(by_date.keys())
-        for date_str in all_dates:
+        for date_str in sorted(fc.date_ranges):
             # BỎ ngày hôm nay khỏi forecast
             if today_date_str and date_str == today_date_str:
                 continue
 
-            b = by_date[date_str]
-            if not b["temps"]:
+            start, end = fc.date_ranges[date_str]
+            min_temp, max_temp = fc.temp_range(start, end)
+            if min_temp is None:
                 continue
 
-            min_temp = min(b["temps"])
-            max_temp = max(b["temps"])
-            total_rain = sum(b["rains"]) if b["rains"] else 0.0
-            desc = b["noon_desc"] or (b["descs"][0] if b["descs"] else "không rõ")
-
             result.append(
                 {
                     "date": date_str,
                     "min_temp": round(min_temp),
                     "max_temp": round(max_temp),
-                    "desc": desc,
-                    "rain_mm": total_rain,
+                    "desc": fc.day_desc(start, end) or "không rõ",
+                    "rain_mm": fc.total_rain(start, end),
                 }
             )
 
@@ -195,44 +194,26 @@ class WeatherService:
         return result
 
     def _extract_today_temp_range(
-        self, forecast: Dict[str, Any], today_date_str: str
+        self, fc: ForecastIndex, today_date_str: str
     ) -> Tuple[Optional[float], Optional[float]]:
         """
-        Trích xuất min/max nhiệt độ của ngày hôm nay từ dữ liệu /forecast.
+        Trích xuất min/max nhiệt độ của ngày hôm nay từ ForecastIndex.
         today_date_str: "YYYY-MM-DD"
         """
-        if not forecast or not today_date_str:
+        if not today_date_str or today_date_str not in fc.date_ranges:
             return None, None
+        return fc.temp_range(*fc.date_ranges[today_date_str])
 
-        slots = forecast.get("list", [])
-        temps: List[float] = []
-
-        for item in slots:
-            dt_txt = item.get("dt_txt")  # "2025-11-16 09:00:00"
-            if not dt_txt:
-                continue
-
-            date_str, _ = dt_txt.split(" ")
-            if date_str != today_date_str:
-                continue
-
-            main = item.get("main", {})
-            t = main.get("temp")
-            if t is not None:
-                temps.append(float(t))
-
-        if not temps:
-            return None, None
-
-        return min(temps), max(temps)
-    def build_summary(self) -> str:
-        if not self.is_configured():
-            self.logger.warning("WeatherService is not properly configured.")
-            return ""
-
-        current = self.fetch_current()
-        if not current:
-            return "☁️ <b>Thời tiết</b>: không lấy được dữ liệu."
+    def _render_location(
+        self,
+        name: str,
+        cached_current: CachedValue,
+        cached_forecast: Optional[CachedValue],
+    ) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Render phần chi tiết 1 địa điểm + 1 dòng tóm tắt (dùng cho bảng tổng hợp).
+        """
+        current = cached_current.value
 
         main = current.get("main", {})
         weather_arr = current.get("weather", [])
@@ -253,10 +234,10 @@ class WeatherService:
         tz_offset_sec = current.get("timezone", 0)
         current_dt_ts = current.get("dt")
 
-        location_html = html_escape(self.location_name)
+        location_html = html_escape(name)
         desc_html = html_escape(desc)
 
-        lines = [f"🌦️ <b>Thời tiết - {location_html}</b>"]
+        lines = [f"🌦️ <b>Thời tiết - {location_html}</b>{cached_current.as_of_note()}"]
 
         # Hôm nay là ngày bao nhiêu (local)
         today_iso = None
@@ -266,11 +247,12 @@ class WeatherService:
             )
             lines.append(f"- Hôm nay: <code>{today_display}</code>")
 
-        forecast = self.fetch_forecast()
+        # Parse /forecast 1 lần, các bước sau chỉ đọc từ index
+        fc = ForecastIndex.from_forecast(cached_forecast.value if cached_forecast else None)
 
         today_min = today_max = None
-        if forecast and today_iso:
-            today_min, today_max = self._extract_today_temp_range(forecast, today_iso)
+        if today_iso:
+            today_min, today_max = self._extract_today_temp_range(fc, today_iso)
 
         if temp is not None and feels is not None:
             range_text = ""
@@ -309,8 +291,7 @@ class WeatherService:
                 f"sunset <code>{sunset_str}</code>"
             )
 
-        # forecast = self.fetch_forecast()
-        alert, max_rain = self._extract_rain_alert(forecast) if forecast else (False, 0.0)
+        alert, max_rain = self._extract_rain_alert(fc)
 
         if alert:
             lines.append(
@@ -321,7 +302,7 @@ class WeatherService:
             lines.append("✅ Không có cảnh báo mưa lớn trong ~12 giờ tới.")
 
         # Dự báo 3–5 ngày tới, BỎ ngày hôm nay
-        daily = self._build_daily_forecast(forecast, today_date_str=today_iso)
+        daily = self._build_daily_forecast(fc, today_date_str=today_iso)
         if daily:
             lines.append("")
             lines.append(f"📅 <b>Dự báo {len(daily)} ngày tới</b>:")
@@ -342,5 +323,146 @@ class WeatherService:
                     f"{desc_html}{rain_text}"
                 )
 
+        row = {
+            "name": name,
+            "temp": temp,
+            "min": today_min,
+            "max": today_max,
+            "rain": max_rain if alert else None,
+            "max_rain": max_rain,
+            "desc": desc,
+        }
+        return lines, row
+
+    def _render_table(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """
+        Bảng tổng hợp nhiều địa điểm (<pre> để thẳng cột).
+        """
+        width = min(16, max(len(r["name"]) for r in rows))
+
+        def fmt_temp(v: Optional[float]) -> str:
+            return f"{round(v)}" if v is not None else "?"
+
+        table = [f"{'Địa điểm':<{width}}  Nhiệt  Hôm nay  Mưa"]
+        for r in rows:
+            name = r["name"][:width]
+            if r.get("failed"):
+                table.append(f"{name:<{width}}  {'N/A':>5}")
+                continue
+            now = f"{fmt_temp(r['temp'])}°C"
+            today = f"{fmt_temp(r['min'])}–{fmt_temp(r['max'])}"
+            rain = f"⚠️{r['rain']:.0f}mm" if r["rain"] is not None else "-"
+            table.append(f"{name:<{width}}  {now:>5}  {today:>7}  {rain}")
+
+        return ["<pre>" + html_escape("\n".join(table)) + "</pre>"]
+
+    def _check_alerts(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """
+        Đưa lượng mưa ~12h tới của từng địa điểm vào rules engine
+        (instrument "weather.<tên địa điểm>.rain_12h", VD: rule "rain > rain_alert_mm").
+        """
+        engine = get_alert_engine()
+        lines: List[str] = []
+        for row in rows:
+            if row.get("failed") or row.get("max_rain") is None:
+                continue
+            instrument = f"weather.{instrument_slug(row['name'])}.rain_12h"
+            try:
+                fired = engine.tick(instrument, row["max_rain"])
+            except Exception as exc:
+                self.logger.exception("Rain alert evaluation failed: %s", exc)
+                continue
+            lines.extend(html_escape(alert.render()) for alert in fired)
+        return lines
+
+    def render_city(self, city: Optional[str] = None) -> str:
+        """
+        Trả lời lệnh /weather [city] từ dữ liệu đã cache (không chờ upstream).
+        city rỗng -> địa điểm đầu tiên; so khớp không dấu, theo tiền tố.
+        """
+        if not self.is_configured():
+            return "☁️ <b>Thời tiết</b>: chưa cấu hình."
+
+        loc = self.locations[0]
+        if city:
+            wanted = instrument_slug(city)
+            matches = [l for l in self.locations if instrument_slug(l["name"]).startswith(wanted)]
+            if not matches:
+                names = ", ".join(html_escape(l["name"]) for l in self.locations)
+                return f"☁️ Không có địa điểm <b>{html_escape(city)}</b>. Có thể chọn: {names}"
+            loc = matches[0]
+
+        # Cùng toạ độ (sau làm tròn) -> dùng đúng variant cache mà build_summary đã ghi
+        key = self._coord_key(loc["lat"], loc["lon"])
+        lat, lon = next(
+            (l["lat"], l["lon"]) for l in self.locations if self._coord_key(l["lat"], l["lon"]) == key
+        )
+        cache = get_ttl_cache()
+        variant = self._variant(lat, lon)
+        current = cache.peek("weather:current", variant, lambda: self.fetch_current(lat, lon))
+        forecast = cache.peek("weather:forecast", variant, lambda: self.fetch_forecast(lat, lon))
+        if not current:
+            return "☁️ <b>Thời tiết</b>: đang cập nhật dữ liệu, thử lại sau ít giây."
+        lines, _ = self._render_location(loc["name"], current, forecast)
         return "\n".join(lines)
 
+    def build_summary(self) -> str:
+        if not self.is_configured():
+            self.logger.warning("WeatherService is not properly configured.")
+            return ""
+
+        # Gom toạ độ trùng (sau khi làm tròn) để mỗi nơi chỉ fetch 1 lần
+        unique: Dict[Tuple[float, float], Tuple[float, float]] = {}
+        for loc in self.locations:
+            unique.setdefault(self._coord_key(loc["lat"], loc["lon"]), (loc["lat"], loc["lon"]))
+
+        # Mọi cặp (địa điểm, endpoint) trong 1 pool phẳng; số request cùng lúc không vượt
+        # http.pool_maxsize (quá thì urllib3 bỏ connection thừa, mất keep-alive)
+        tasks: Dict[str, Callable[[], Optional[CachedValue]]] = {}
+        for i, coords in enumerate(unique.values()):
+            for endpoint, func in self._location_tasks(*coords).items():
+                tasks[f"{i}:{endpoint}"] = func
+        workers = min(self.max_concurrency, get_http_client().pool_maxsize)
+
+        start = time.perf_counter()
+        results = run_parallel(tasks, workers, thread_name_prefix="weather")
+        fetched = {
+            key: (results[f"{i}:current"], results[f"{i}:forecast"])
+            for i, key in enumerate(unique)
+        }
+        self.logger.info(
+            "Fetched weather for %d location(s) (%d unique) in %.2fs",
+            len(self.locations),
+            len(unique),
+            time.perf_counter() - start,
+        )
+
+        # 1 địa điểm: giữ nguyên format cũ
+        if len(self.locations) == 1:
+            loc = self.locations[0]
+            current, forecast = fetched[self._coord_key(loc["lat"], loc["lon"])]
+            if not current:
+                return "☁️ <b>Thời tiết</b>: không lấy được dữ liệu."
+            lines, row = self._render_location(loc["name"], current, forecast)
+            return "\n".join(self._check_alerts([row]) + lines)
+
+        rows: List[Dict[str, Any]] = []
+        sections: List[str] = []
+        for loc in self.locations:
+            current, forecast = fetched[self._coord_key(loc["lat"], loc["lon"])]
+            if not current:
+                rows.append({"name": loc["name"], "failed": True})
+                sections.append(
+                    f"☁️ <b>Thời tiết - {html_escape(loc['name'])}</b>: không lấy được dữ liệu."
+                )
+                continue
+            lines, row = self._render_location(loc["name"], current, forecast)
+            rows.append(row)
+            sections.append("\n".join(lines))
+
+        out = [f"🌦️ <b>Thời tiết {len(self.locations)} địa điểm</b>"]
+        out.extend(self._check_alerts(rows))
+        out.extend(self._render_table(rows))
+        if self.details:
+            out.extend(["", "\n\n".join(sections)])
+        return "\n".join(out)
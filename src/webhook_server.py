@@ -0,0 +1,237 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from bot_commands import CommandRouter, ReplyFunc
+
+# Header Telegram gửi kèm mỗi update khi setWebhook có secret_token
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Telegram mở tới max_connections (mặc định 40) kết nối cùng lúc
+    request_queue_size = 128
+
+
+class WebhookServer:
+    """
+    Nhận update Telegram qua webhook (HTTP POST) và trả lời lệnh bằng CommandRouter.
+    - Thread HTTP chỉ kiểm tra secret token, đọc body, đưa vào hàng đợi rồi trả 200 ngay;
+      parse JSON + xử lý lệnh + gửi trả lời chạy trên pool worker.
+    - Hàng đợi có giới hạn (queue_size): đầy thì trả 503 + Retry-After, Telegram tự gửi lại
+      sau -> không nhận quá sức xử lý, RAM không phình khi bị dồn update.
+    """
+
+    def __init__(
+        self,
+        router: CommandRouter,
+        reply: ReplyFunc,
+        secret_token: str,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        path: str = "/telegram/webhook",
+        workers: int = 8,
+        queue_size: int = 1000,
+        max_body_bytes: int = 1024 * 1024,
+    ) -> None:
+        if not secret_token:
+            raise ValueError("Webhook secret_token is required")
+        self.router = router
+        self.reply = reply
+        self.secret_token = secret_token.encode("utf-8")
+        self.path = path
+        self.workers = max(1, int(workers))
+        self.max_body_bytes = int(max_body_bytes)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._threads: List[threading.Thread] = []
+        self._server = _HTTPServer((host, int(port)), self._handler_class())
+        self._server_thread: Optional[threading.Thread] = None
+
+        # Bộ đếm đơn giản (đọc qua stats())
+        self._stats_lock = threading.Lock()
+        self._stats = {"accepted": 0, "rejected": 0, "unauthorized": 0, "handled": 0, "replied": 0, "errors": 0}
+
+    @classmethod
+    def from_config(
+        cls,
+        router: CommandRouter,
+        reply: ReplyFunc,
+        secret_token: str,
+        webhook_cfg: Dict[str, Any],
+    ) -> "WebhookServer":
+        return cls(
+            router,
+            reply,
+            secret_token,
+            host=webhook_cfg.get("listen", "0.0.0.0"),
+            port=int(webhook_cfg.get("port", 8443)),
+            path=webhook_cfg.get("path", "/telegram/webhook"),
+            workers=int(webhook_cfg.get("workers", 8)),
+            queue_size=int(webhook_cfg.get("queue_size", 1000)),
+            max_body_bytes=int(webhook_cfg.get("max_body_kb", 1024)) * 1024,
+        )
+
+    @property
+    def address(self) -> tuple:
+        return self._server.server_address[:2]
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["queued"] = self._queue.qsize()
+        return out
+
+    def check_secret(self, header: Optional[str]) -> bool:
+        if not header:
+            return False
+        return hmac.compare_digest(header.encode("utf-8"), self.secret_token)
+
+    def submit(self, body: bytes) -> bool:
+        """
+        Đưa 1 update (raw JSON) vào hàng đợi; False nếu hàng đợi đầy.
+        """
+        try:
+            self._queue.put_nowait(body)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("accepted")
+        return True
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive: Telegram giữ nhiều kết nối (max_connections) và gửi liên tục
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, code: int, headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self) -> None:
+                if self.path.split("?", 1)[0] != server.path:
+                    self._respond(404)
+                    return
+                if not server.check_secret(self.headers.get(SECRET_HEADER)):
+                    server._count("unauthorized")
+                    self._respond(401)
+                    self.close_connection = True
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0 or length > server.max_body_bytes:
+                    self._respond(413)
+                    self.close_connection = True
+                    return
+                body = self.rfile.read(length)
+                if server.submit(body):
+                    self._respond(200)
+                else:
+                    self._respond(503, {"Retry-After": "1"})
+
+            def do_GET(self) -> None:
+                # Health check cho reverse proxy / load balancer
+                self._respond(200 if self.path == "/healthz" else 404)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # Không log từng request (hàng trăm update/giây)
+                pass
+
+        return Handler
+
+    @staticmethod
+    def parse_update(body: bytes) -> Optional[tuple]:
+        """
+        Raw JSON update -> (user_id, chat_id, text), None nếu không phải message có text.
+        """
+        update = json.loads(body)
+        message = update.get("message") or update.get("edited_message")
+        if not isinstance(message, dict):
+            return None
+        text = message.get("text")
+        chat = message.get("chat") or {}
+        chat_id = chat.get("id")
+        if not text or chat_id is None:
+            return None
+        user = message.get("from") or {}
+        return user.get("id", chat_id), chat_id, text
+
+    def handle(self, body: bytes) -> None:
+        try:
+            parsed = self.parse_update(body)
+        except (ValueError, AttributeError) as exc:
+            self._count("errors")
+            self.logger.warning("Malformed update: %s", exc)
+            return
+        if parsed is None:
+            return
+        user_id, chat_id, text = parsed
+        reply = self.router.handle(user_id, text)
+        self._count("handled")
+        if reply:
+            self.reply(chat_id, reply)
+            self._count("replied")
+
+    def _worker(self) -> None:
+        while True:
+            body = self._queue.get()
+            try:
+                if body is None:
+                    break
+                self.handle(body)
+            except Exception as exc:
+                self._count("errors")
+                self.logger.exception("Webhook worker error: %s", exc)
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"webhook-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._server_thread = threading.Thread(
+            target=self._server.serve_forever, name="webhook-http", daemon=True
+        )
+        self._server_thread.start()
+        host, port = self.address
+        self.logger.info(
+            "Webhook listening on %s:%s%s (%d workers, queue %d)",
+            host, port, self.path, self.workers, self._queue.maxsize,
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Ngừng nhận update, xử lý nốt hàng đợi (tối đa timeout giây) rồi dừng worker.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            # Sentinel phải vào được hàng đợi đang đầy -> chờ worker rút bớt
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                self._queue.put(None, timeout=remaining)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self.logger.info("Webhook stopped: %s", self.stats())
@@ -0,0 +1,200 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from alert_rules import AlertEngine, AlertRule, parse_duration, parse_rule_text  # noqa: E402
+from state_store import StateStore  # noqa: E402
+from timeseries import TimeSeriesStore  # noqa: E402
+
+T0 = 1_763_000_000.0
+ALIASES = {
+    "SJC buy": "gold.*sjc*.buy",
+    "RON95": "fuel.*ron_95*",
+    "USD/VND": "fx.usd",
+    "rain": "weather.*.rain_12h",
+}
+
+
+def fired_ids(alerts):
+    return [alert.rule.id for alert in alerts]
+
+
+class Ticker:
+    """
+    Gọi engine.tick lần lượt, mỗi lần cách nhau 1 phút.
+    """
+
+    def __init__(self, engine: AlertEngine, instrument: str) -> None:
+        self.engine = engine
+        self.instrument = instrument
+        self.now = T0
+
+    def __call__(self, value: float):
+        self.now += 60
+        return fired_ids(self.engine.tick(self.instrument, value, self.now))
+
+
+# (op, giá không báo ở ngưỡng / sát ngưỡng, giá báo, giá trong dải hysteresis, giá mở khoá)
+# threshold 100, hysteresis 5
+OPERATOR_CASES = [
+    (">", 100, 101, 95, 94.9),
+    (">=", 99.9, 100, 95, 94.9),
+    ("<", 100, 99, 105, 105.1),
+    ("<=", 100.1, 100, 105, 105.1),
+]
+
+
+@pytest.mark.parametrize("op, quiet, trigger, band, rearm", OPERATOR_CASES)
+def test_operator_fires_once_and_rearms_past_hysteresis(op, quiet, trigger, band, rearm):
+    rule = AlertRule("r", "gold.sjc.buy", op, 100, hysteresis=5, cooldown_sec=0)
+    tick = Ticker(AlertEngine([rule]), "gold.sjc.buy")
+
+    assert tick(quiet) == []
+    assert tick(trigger) == ["r"]
+    # Vẫn bên kia ngưỡng -> không báo lại
+    assert tick(trigger) == []
+    # Lùi về nhưng chưa qua threshold -+ hysteresis -> chưa mở khoá
+    assert tick(band) == []
+    assert tick(trigger) == []
+    assert tick(rearm) == []
+    assert tick(trigger) == ["r"]
+
+
+@pytest.mark.parametrize("op, quiet, trigger, band, rearm", OPERATOR_CASES)
+def test_operator_cooldown_suppresses_refire(op, quiet, trigger, band, rearm):
+    rule = AlertRule("r", "gold.sjc.buy", op, 100, hysteresis=5, cooldown_sec=600)
+    tick = Ticker(AlertEngine([rule]), "gold.sjc.buy")
+
+    assert tick(trigger) == ["r"]
+    assert tick(rearm) == []
+    # Đã mở khoá nhưng còn trong cooldown -> giữ armed, không báo
+    assert tick(trigger) == []
+    tick.now += 600
+    assert tick(trigger) == ["r"]
+
+
+def test_rules_on_same_instrument_fire_independently():
+    rules = [
+        AlertRule("above_90", "gold.*sjc*.buy", ">", 90_000_000, cooldown_sec=0),
+        AlertRule("above_95", "gold.*sjc*.buy", ">", 95_000_000, cooldown_sec=0),
+        AlertRule("below_85", "gold.*sjc*.buy", "<", 85_000_000, cooldown_sec=0),
+        AlertRule("fuel", "fuel.*ron_95*", ">", 1, cooldown_sec=0),
+    ]
+    tick = Ticker(AlertEngine(rules), "gold.pnj.sjc.buy")
+    assert tick(91_000_000) == ["above_90"]
+    assert tick(96_000_000) == ["above_95"]
+    assert tick(84_000_000) == ["below_85"]
+    assert tick(96_000_000) == ["above_90", "above_95"]
+    assert fired_ids(tick.engine.tick("gold.pnj.sjc.sell", 99_000_000, T0)) == []
+    assert fired_ids(tick.engine.tick("gold.pnj.sjc.buy", None, T0)) == []
+
+
+def test_change_rule_uses_history(tmp_path):
+    history = TimeSeriesStore(history_dir=tmp_path)
+    history.record(T0 - 7200, {"fx.usd": 25_000}, scale=100)
+    history.record(T0 - 3600, {"fx.usd": 25_100}, scale=100)
+    rule = AlertRule("fx", "fx.usd", ">", 0.5, kind="change", window_sec=3600, cooldown_sec=0)
+    engine = AlertEngine([rule], history=history)
+
+    assert engine.tick("fx.usd", 25_200, T0) == []
+    alerts = engine.tick("fx.usd", 24_900, T0 + 60)
+    assert fired_ids(alerts) == ["fx"]
+    # Giá trị hiển thị giữ dấu (giảm), so sánh theo |%|
+    assert alerts[0].value == pytest.approx(-0.7968, abs=1e-4)
+    assert alerts[0].render() == "🔔 fx.usd biến động > 0.5% trong 60 phút (hiện tại: -0.80%)"
+    assert AlertEngine([rule]).tick("fx.usd", 30_000, T0) == []
+
+
+def test_state_round_trip(tmp_path):
+    state = StateStore(tmp_path / "state.db")
+    rules = [
+        AlertRule("gold", "gold.sjc.buy", ">", 100, hysteresis=5, cooldown_sec=600),
+        AlertRule("quiet", "gold.sjc.buy", "<", 10),
+    ]
+    engine = AlertEngine(rules, state)
+    assert fired_ids(engine.tick("gold.sjc.buy", 101, T0)) == ["gold"]
+    assert state["alerts"] == {"gold": {"armed": False, "last_fired": T0}}
+    state.commit()
+
+    # Lần chạy sau: rule vẫn disarmed, không báo lại
+    reopened = StateStore(tmp_path / "state.db")
+    engine = AlertEngine(rules, reopened)
+    assert engine.tick("gold.sjc.buy", 102, T0 + 60) == []
+    assert engine.tick("gold.sjc.buy", 94, T0 + 120) == []
+    assert reopened["alerts"]["gold"] == {"armed": True, "last_fired": T0}
+    # last_fired đã lưu -> cooldown vẫn tính tiếp
+    assert engine.tick("gold.sjc.buy", 101, T0 + 180) == []
+    assert fired_ids(engine.tick("gold.sjc.buy", 101, T0 + 600)) == ["gold"]
+    assert reopened["alerts"]["gold"] == {"armed": False, "last_fired": T0 + 600}
+
+
+def test_parse_threshold_rules():
+    assert parse_rule_text("SJC buy > 90,000,000", ALIASES) == {
+        "kind": "threshold",
+        "instrument": "gold.*sjc*.buy",
+        "op": ">",
+        "threshold": 90_000_000.0,
+        "label": "SJC buy",
+    }
+    assert parse_rule_text("RON95 <= 20.000", ALIASES)["threshold"] == 20_000.0
+    assert parse_rule_text("RON95>=19500", ALIASES)["op"] == ">="
+    assert parse_rule_text("fx.eur < 27,5", ALIASES)["instrument"] == "fx.eur"
+    assert parse_rule_text("fx.eur < 27,5", ALIASES)["threshold"] == 27.5
+    rain = parse_rule_text("rain > rain_alert_mm", ALIASES, {"rain_alert_mm": 5.0})
+    assert (rain["instrument"], rain["threshold"]) == ("weather.*.rain_12h", 5.0)
+
+
+def test_parse_change_rules():
+    assert parse_rule_text("USD/VND moves > 0.5% in 1h", ALIASES) == {
+        "kind": "change",
+        "instrument": "fx.usd",
+        "op": ">",
+        "threshold": 0.5,
+        "window": "1h",
+        "label": "USD/VND",
+    }
+    assert parse_rule_text("SJC buy move more than 2% in 30m", ALIASES)["window"] == "30m"
+
+
+@pytest.mark.parametrize("text", ["SJC buy", "SJC buy > lots", "USD/VND moves > 0.5% in forever"])
+def test_parse_invalid_rules(text):
+    with pytest.raises(ValueError):
+        AlertRule.from_dict({"text": text}, "r", {}, ALIASES)
+
+
+def test_parse_duration():
+    assert [parse_duration(t) for t in ("45s", "30m", "1h", "1.5h", "2d")] == [45, 1800, 3600, 5400, 172800]
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def test_from_config():
+    engine = AlertEngine.from_config(
+        {
+            "cooldown_min": 30,
+            "hysteresis": 100_000,
+            "aliases": ALIASES,
+            "variables": {"rain_alert_mm": 5.0},
+            "rules": [
+                "USD/VND moves > 0.5% in 1h",
+                {"text": "SJC buy > 90,000,000", "id": "sjc", "cooldown_min": 5},
+                {"instrument": "RON95", "op": "<", "threshold": 19_000, "label": "Xăng RON95"},
+                "rain > rain_alert_mm",
+                "not a rule",
+                {"instrument": "RON95", "op": "!=", "threshold": 1},
+            ],
+        }
+    )
+    rules = {rule.id: rule for rule in engine.rules}
+    assert sorted(rules) == ["rule1", "rule3", "rule4", "sjc"]
+    assert (rules["rule1"].kind, rules["rule1"].window_sec, rules["rule1"].cooldown_sec) == ("change", 3600, 1800)
+    assert (rules["sjc"].cooldown_sec, rules["sjc"].hysteresis) == (300, 100_000)
+    assert rules["rule3"].instrument == "fuel.*ron_95*"
+    assert rules["rule3"].describe() == "Xăng RON95 < 19,000"
+    assert rules["rule4"].threshold == 5.0
+
+    assert AlertEngine.from_config({"enabled": False, "rules": ["RON95 > 1"]}).rules == []
@@ -0,0 +1,217 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import news_service  # noqa: E402
+from dedupe import RecentHashSet, normalize_url, url_hash  # noqa: E402
+from news_service import NewsService  # noqa: E402
+from ttl_cache import CachedValue, TtlCache  # noqa: E402
+
+FEEDS = [
+    {"name": "bbc", "endpoint": "top-headlines", "params": {"sources": "bbc-news"}},
+    {"name": "vn", "endpoint": "everything", "params": {"q": "Việt Nam"}},
+]
+
+
+def article(n: int, published: str, url: str = None, source: str = "BBC News"):
+    return {
+        "title": f"Bài {n}",
+        "url": url or f"https://news.example.com/story/{n}",
+        "publishedAt": published,
+        "source": {"name": source},
+    }
+
+
+def make_service(**config) -> NewsService:
+    return NewsService({"feeds": FEEDS, **config}, {"news_api_key": "test"})
+
+
+def serve(service: NewsService, feeds):
+    """
+    Thay _fetch_all_feeds bằng dữ liệu cố định: feeds = {tên feed: [bài, ...]}.
+    Ghi lại watermark mà build_summary truyền vào.
+    """
+    calls = []
+
+    def fetch_all(watermarks):
+        calls.append(dict(watermarks))
+        return {
+            name: CachedValue({"status": "ok", "articles": list(items)}, 0.0)
+            for name, items in feeds.items()
+        }
+
+    service._fetch_all_feeds = fetch_all
+    return calls
+
+
+def rendered_titles(message: str):
+    return [line.split(">", 2)[1].split("<", 1)[0] for line in message.splitlines()[1:]]
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://News.Example.com/a/b/#comments") == "https://news.example.com/a/b"
+    assert normalize_url("https://news.example.com") == "https://news.example.com/"
+    assert normalize_url("https://news.example.com/a?id=3&page=2") == "https://news.example.com/a?id=3&page=2"
+
+
+def test_tracking_params_stripped():
+    clean = "https://news.example.com/a?id=3"
+    tracked = (
+        "https://news.example.com/a/?utm_source=twitter&id=3&fbclid=XYZ"
+        "&at_medium=rss&ocid=msn&ns_campaign=x#top"
+    )
+    assert normalize_url(tracked) == clean
+    assert url_hash(tracked) == url_hash(clean)
+    assert url_hash("https://news.example.com/a?id=4") != url_hash(clean)
+    assert len(url_hash(clean)) == 16
+
+
+def test_recent_hash_set_lru():
+    seen = RecentHashSet(capacity=3)
+    for key in "abc":
+        seen.add(key)
+    # "a" vừa gặp lại -> "b" bị đẩy ra trước
+    assert seen.touch("a")
+    assert not seen.touch("z")
+    seen.add("d")
+    assert seen.to_state() == ["c", "a", "d"]
+
+    restored = RecentHashSet.from_state(seen.to_state() + [123], capacity=2)
+    assert restored.to_state() == ["a", "d"]
+
+
+def test_filter_new_articles_dedupes_across_feeds_without_recording():
+    bbc = article(1, "2025-11-13T08:00:00Z", "https://news.example.com/story/1?utm_source=bbc")
+    same_story = article(1, "2025-11-13T08:00:00Z", "https://NEWS.example.com/story/1/#x", "VnExpress")
+    old = article(2, "2025-11-13T07:00:00Z")
+    fresh = article(3, "2025-11-13T06:00:00Z")
+    no_url = {"title": "Chỉ có tiêu đề", "publishedAt": "2025-11-13T05:00:00Z"}
+    no_key = {"publishedAt": "2025-11-13T05:00:00Z"}
+
+    seen = RecentHashSet(capacity=10)
+    seen.add(NewsService._article_key(old))
+    seen.add("other")
+
+    filtered = NewsService._filter_new_articles([bbc, same_story, old, fresh, no_url, no_key], seen)
+    assert filtered == [bbc, fresh, no_url]
+    # Không ghi nhận bài mới; bài cũ được touch lên cuối LRU
+    assert seen.to_state() == ["other", NewsService._article_key(old)]
+
+    NewsService._mark_sent(filtered, seen)
+    assert NewsService._filter_new_articles([same_story, fresh, no_url], seen) == []
+
+
+def test_build_summary_merges_feeds_newest_first():
+    service = make_service(max_items=5)
+    serve(
+        service,
+        {
+            "bbc": [article(1, "2025-11-13T09:00:00Z"), article(2, "2025-11-13T07:00:00Z")],
+            "vn": [
+                article(3, "2025-11-13T08:00:00Z", source="VnExpress"),
+                article(1, "2025-11-13T09:00:00Z", "https://news.example.com/story/1?utm_medium=rss"),
+            ],
+        },
+    )
+    state = {}
+    message = service.build_summary(state)
+    assert message.splitlines()[0] == "📰 <b>Tin tức mới</b>"
+    assert rendered_titles(message) == ["Bài 1", "Bài 3", "Bài 2"]
+    assert "<i>(VnExpress)</i>" in message
+    assert len(state["news_seen"]) == 3
+    assert state["news_watermarks"] == {"bbc": "2025-11-13T09:00:00Z", "vn": "2025-11-13T09:00:00Z"}
+
+    # Lượt sau cùng dữ liệu -> không có gì mới, không gửi
+    assert service.build_summary(state) == ""
+
+
+def test_legacy_watermark_seeds_seen():
+    service = make_service(max_items=5)
+    serve(
+        service,
+        {
+            "bbc": [article(1, "2025-11-13T09:00:00Z"), article(2, "2025-11-13T07:00:00Z")],
+            "vn": [article(3, "2025-11-13T08:00:00Z")],
+        },
+    )
+    state = {"news_last_published_at": "2025-11-13T08:00:00Z"}
+    message = service.build_summary(state)
+
+    # Bài <= watermark cũ coi như đã gửi
+    assert rendered_titles(message) == ["Bài 1"]
+    assert "news_last_published_at" not in state
+    assert len(state["news_seen"]) == 3
+
+
+def test_legacy_watermark_ignored_when_seen_exists():
+    service = make_service(max_items=5)
+    serve(service, {"bbc": [article(2, "2025-11-13T07:00:00Z")], "vn": []})
+    state = {"news_seen": ["other"], "news_last_published_at": "2025-11-13T08:00:00Z"}
+    assert rendered_titles(service.build_summary(state)) == ["Bài 2"]
+    assert "news_last_published_at" not in state
+
+
+def test_only_new_disabled_renders_deduped_batch():
+    service = make_service(max_items=5, only_new=False)
+    serve(
+        service,
+        {
+            "bbc": [article(1, "2025-11-13T09:00:00Z")],
+            "vn": [article(1, "2025-11-13T09:00:00Z", "https://news.example.com/story/1?fbclid=1")],
+        },
+    )
+    state = {}
+    assert rendered_titles(service.build_summary(state)) == ["Bài 1"]
+    assert rendered_titles(service.build_summary(state)) == ["Bài 1"]
+    assert "news_seen" not in state
+
+
+class PagedFeed:
+    """
+    Feed NewsAPI giả, mới nhất trước; iter_pages chỉ "request" trang khi được lấy tới.
+    """
+
+    def __init__(self, service: NewsService, articles) -> None:
+        self.articles = list(articles)
+        self.requests = 0
+        service.iter_pages = self.iter_pages
+        self.page_size = service.fetch_page_size
+
+    def iter_pages(self, feed):
+        for start in range(0, len(self.articles), self.page_size):
+            self.requests += 1
+            yield {
+                "status": "ok",
+                "totalResults": len(self.articles),
+                "articles": self.articles[start : start + self.page_size],
+            }
+
+
+def test_leftovers_beyond_max_items_sent_in_next_digest(monkeypatch):
+    monkeypatch.setattr(news_service, "get_ttl_cache", lambda: TtlCache(enabled=False))
+    service = NewsService(
+        {"feeds": FEEDS[:1], "max_items": 5, "fetch_page_size": 5, "item_budget": 40},
+        {"news_api_key": "test"},
+    )
+    # 12 bài, bài 12 mới nhất
+    feed = PagedFeed(service, [article(n, f"2025-11-13T{n:02d}:00:00Z") for n in range(12, 0, -1)])
+    state = {}
+
+    assert rendered_titles(service.build_summary(state)) == [f"Bài {n}" for n in range(12, 7, -1)]
+    assert len(state["news_seen"]) == 5
+    # Watermark dừng ở bài cũ nhất chưa hiển thị
+    assert state["news_watermarks"] == {"bbc": "2025-11-13T01:00:00Z"}
+
+    # Lượt 2: thêm 2 bài mới -> 2 bài mới + 3 bài còn dư của lượt 1
+    feed.articles[:0] = [article(n, f"2025-11-13T{n:02d}:00:00Z") for n in (14, 13)]
+    assert rendered_titles(service.build_summary(state)) == ["Bài 14", "Bài 13", "Bài 7", "Bài 6", "Bài 5"]
+
+    # Lượt 3: 4 bài còn lại, sau đó watermark lên tới bài mới nhất
+    assert rendered_titles(service.build_summary(state)) == ["Bài 4", "Bài 3", "Bài 2", "Bài 1"]
+    assert state["news_watermarks"] == {"bbc": "2025-11-13T14:00:00Z"}
+    requests_before = feed.requests
+    assert service.build_summary(state) == ""
+    # Không còn bài dư -> dừng phân trang ngay trang đầu
+    assert feed.requests - requests_before == 1
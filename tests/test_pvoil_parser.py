@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = ROOT / "bench" / "fixtures"
+sys.path.insert(0, str(ROOT / "src"))
+
+from pvoil_parser import _slice_container_table, parse_pvoil_price_table  # noqa: E402
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+def test_recorded_page():
+    rows = parse_pvoil_price_table(read_fixture("pvoil_tin_gia_xang_dau.html"))
+    assert [row["stt"] for row in rows] == list(range(1, 9))
+    assert rows[1] == {"stt": 2, "name": "Xăng RON 95-III", "price": 20570, "delta": 160}
+
+
+def test_marker_in_css_script_and_comment():
+    # Marker xuất hiện trong <style>, <script>, comment; bảng "table" khác đứng trước container;
+    # bảng lồng trong bảng giá -> vẫn phải lấy đúng bảng trong div.oilpricescontainer
+    html = read_fixture("pvoil_marker_in_css.html")
+    fragment = _slice_container_table(html)
+    assert fragment.startswith('<div id="gia" class="box oilpricescontainer">')
+    assert fragment.endswith("</table>")
+    assert parse_pvoil_price_table(html) == [
+        {"stt": 1, "name": "Xăng RON 95-III", "price": 20570, "delta": 160},
+        {"stt": 2, "name": "Xăng E5 RON 92-II", "price": 19950, "delta": -40},
+        {"stt": 3, "name": "Dầu DO 0,05S-II", "price": 18780, "delta": -110},
+    ]
+
+
+def test_container_without_table_falls_back():
+    # Layout đổi: container còn nhưng không còn bảng -> không lấy bảng đứng sau container,
+    # fallback sang table.table đầu tiên như bản BeautifulSoup
+    html = """
+    <html><body>
+    <table class="table prices">
+      <tr><td>1</td><td colspan="2">Xăng RON 95-III</td><td>20.570 đ</td><td>+160</td></tr>
+    </table>
+    <div class="box oilpricescontainer"><div class="note"><p>Đang cập nhật</p></div></div>
+    <div class="news">
+      <table class="list">
+        <tr><td>9</td><td colspan="2">Tin khác</td><td>1.000</td><td>+1</td></tr>
+      </table>
+    </div>
+    </body></html>
+    """
+    assert _slice_container_table(html) is None
+    assert parse_pvoil_price_table(html) == [
+        {"stt": 1, "name": "Xăng RON 95-III", "price": 20570, "delta": 160},
+    ]
@@ -0,0 +1,208 @@
+import json
+import sys
+from email.utils import formatdate
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import retry_policy  # noqa: E402
+from retry_policy import CircuitBreaker, CircuitBreakerRegistry, RetryPolicy  # noqa: E402
+
+NOW = 1_760_000_000.0
+
+
+class FakeClock:
+    def __init__(self, now: float = NOW) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(retry_policy, "time", fake)
+    return fake
+
+
+def make_response(status: int, headers=None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers.update(headers or {})
+    return resp
+
+
+def http_error(status: int, headers=None) -> requests.HTTPError:
+    return requests.HTTPError(f"{status}", response=make_response(status, headers))
+
+
+def test_backoff_full_jitter_bounds(monkeypatch):
+    policy = RetryPolicy(base_delay=0.5, max_delay=3.0, multiplier=2.0)
+    # uniform(0, cap) -> trả về cận trên để đọc được cap
+    monkeypatch.setattr(retry_policy, "random", SimpleNamespace(uniform=lambda low, high: high))
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+    monkeypatch.setattr(retry_policy, "random", SimpleNamespace(uniform=lambda low, high: low))
+    assert policy.backoff(4) == 0
+
+
+def test_backoff_stays_within_cap():
+    policy = RetryPolicy(base_delay=0.5, max_delay=8.0)
+    for attempt in range(1, 8):
+        cap = min(8.0, 0.5 * 2 ** (attempt - 1))
+        for _ in range(50):
+            assert 0 <= policy.backoff(attempt) <= cap
+
+
+@pytest.mark.parametrize(
+    "exc, expected",
+    [
+        (http_error(429), True),
+        (http_error(500), True),
+        (http_error(503), True),
+        (http_error(404), False),
+        (http_error(401), False),
+        (requests.HTTPError("no response"), False),
+        (requests.ConnectionError("reset"), True),
+        (requests.Timeout("slow"), True),
+        (requests.exceptions.ChunkedEncodingError("truncated"), True),
+        (json.JSONDecodeError("bad", "doc", 0), False),
+        (ValueError("bad"), False),
+        (RuntimeError("bug"), False),
+    ],
+)
+def test_is_retryable(exc, expected):
+    assert RetryPolicy().is_retryable(exc) is expected
+
+
+def test_parse_retry_after_seconds():
+    assert RetryPolicy.parse_retry_after(None) is None
+    assert RetryPolicy.parse_retry_after(make_response(429)) is None
+    assert RetryPolicy.parse_retry_after(make_response(429, {"Retry-After": "7"})) == 7.0
+    assert RetryPolicy.parse_retry_after(make_response(429, {"Retry-After": "1.5"})) == 1.5
+    assert RetryPolicy.parse_retry_after(make_response(429, {"Retry-After": "-3"})) == 0.0
+    assert RetryPolicy.parse_retry_after(make_response(429, {"Retry-After": "soon"})) is None
+
+
+def test_parse_retry_after_http_date(clock):
+    header = formatdate(NOW + 120, usegmt=True)
+    assert RetryPolicy.parse_retry_after(make_response(503, {"Retry-After": header})) == 120.0
+    past = formatdate(NOW - 60, usegmt=True)
+    assert RetryPolicy.parse_retry_after(make_response(503, {"Retry-After": past})) == 0.0
+
+
+def test_delay_for(monkeypatch):
+    monkeypatch.setattr(retry_policy, "random", SimpleNamespace(uniform=lambda low, high: high))
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_retry_after=30.0)
+
+    assert policy.delay_for(requests.ConnectionError(), 1) == 0.5
+    assert policy.delay_for(requests.ConnectionError(), 2) == 1.0
+    # Hết số lần thử / lỗi không retry được
+    assert policy.delay_for(requests.ConnectionError(), 3) is None
+    assert policy.delay_for(http_error(404), 1) is None
+    # Retry-After ưu tiên hơn backoff, quá max_retry_after -> bỏ
+    assert policy.delay_for(http_error(429, {"Retry-After": "12"}), 1) == 12.0
+    assert policy.delay_for(http_error(429, {"Retry-After": "31"}), 1) is None
+    assert policy.delay_for(http_error(503), 1) == 0.5
+
+
+def test_from_config():
+    policy = RetryPolicy.from_config(
+        {"max_attempts": 5, "base_delay_sec": 1, "max_delay_sec": 4, "max_retry_after_sec": 10}
+    )
+    assert (policy.max_attempts, policy.base_delay, policy.max_delay, policy.max_retry_after) == (5, 1.0, 4.0, 10.0)
+    assert RetryPolicy(max_attempts=0).max_attempts == 1
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened_at == NOW
+    assert not breaker.allow()
+
+    clock.now += 59
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.state == "half_open"
+
+    assert breaker.allow()
+    # Probe đang chạy -> request khác vẫn fail fast
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, cooldown=60)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 61
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened_at == NOW + 61
+    assert not breaker.allow()
+
+    clock.now += 60
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_registry_dump_and_load_state(clock):
+    registry = CircuitBreakerRegistry(failure_threshold=2, cooldown=60)
+    healthy = registry.for_url("https://api.example.com/v1/ok")
+    flaky = registry.for_url("https://Flaky.example.com/x")
+    healthy.record_success()
+    flaky.record_failure()
+    flaky.record_failure()
+    assert registry.for_url("https://flaky.example.com/other") is flaky
+
+    dumped = registry.dump_state()
+    # Chỉ lưu host đang lỗi
+    assert dumped == {"flaky.example.com": {"failures": 2, "opened_at": NOW}}
+
+    restored = CircuitBreakerRegistry(failure_threshold=2, cooldown=60)
+    restored.load_state(json.loads(json.dumps(dumped)))
+    breaker = restored.for_url("https://flaky.example.com/")
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 60
+    assert breaker.allow()
+
+
+def test_registry_ignores_bad_state():
+    registry = CircuitBreakerRegistry()
+    registry.load_state(None)
+    registry.load_state({"bad.example.com": {"failures": "many"}, "ok.example.com": {"failures": 1}})
+    assert registry.dump_state() == {"ok.example.com": {"failures": 1, "opened_at": None}}
@@ -0,0 +1,170 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from state_store import StateStore  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "state.db"
+
+
+def rows(db_path):
+    with sqlite3.connect(str(db_path)) as conn:
+        return {key: (value, seq) for key, value, seq in conn.execute("SELECT key, value, seq FROM kv")}
+
+
+def test_dict_interface_and_reopen(db_path):
+    state = StateStore(db_path)
+    state["gold_fx_last_sent"] = 1.5
+    state["news_seen"] = ["a", "b"]
+    assert state.get("missing") is None
+    assert "news_seen" in state and len(state) == 2
+    assert state.pop("gold_fx_last_sent") == 1.5
+    state.commit()
+    state.close()
+
+    reopened = StateStore(db_path)
+    assert dict(reopened) == {"news_seen": ["a", "b"]}
+    reopened.close()
+
+
+def test_commit_writes_only_dirty_keys(db_path):
+    state = StateStore(db_path)
+    state["a"] = {"v": 1}
+    state["b"] = [1, 2]
+    assert state.commit() == 2
+    assert state.commit() == 0
+    seq_b = rows(db_path)["b"][1]
+
+    # Gán lại cùng giá trị (khác thứ tự key) không làm key dirty
+    state["b"] = [1, 2]
+    state["a"] = {"v": 1}
+    assert state.dirty_keys() == {}
+
+    state["a"] = {"v": 2}
+    assert list(state.dirty_keys()) == ["a"]
+    assert state.commit() == 1
+    after = rows(db_path)
+    assert after["a"][0] == '{"v":2}'
+    assert after["b"][1] == seq_b
+    state.close()
+
+
+def test_two_instances_keep_each_others_keys(db_path):
+    daemon, oneshot = StateStore(db_path), StateStore(db_path)
+    daemon["weather_last_sent"] = 100
+    oneshot["news_last_sent"] = 200
+    daemon.commit()
+    oneshot.commit()
+    daemon.commit()
+
+    assert dict(daemon) == {"weather_last_sent": 100, "news_last_sent": 200}
+    assert dict(oneshot) == {"weather_last_sent": 100, "news_last_sent": 200}
+    assert set(rows(db_path)) == {"weather_last_sent", "news_last_sent"}
+    daemon.close()
+    oneshot.close()
+
+
+def test_refresh_keeps_local_dirty_key(db_path):
+    first, second = StateStore(db_path), StateStore(db_path)
+    first["news_seen"] = ["mine"]
+    second["news_seen"] = ["theirs"]
+    second["other"] = 1
+    second.commit()
+
+    assert first.refresh() == 1
+    assert first["news_seen"] == ["mine"]
+    assert first["other"] == 1
+
+    first.commit()
+    second.refresh()
+    assert second["news_seen"] == ["mine"]
+    first.close()
+    second.close()
+
+
+def test_delete_propagates_to_other_instance(db_path):
+    first, second = StateStore(db_path), StateStore(db_path)
+    first["news_last_published_at"] = "2025-11-13T08:00:00Z"
+    first["keep"] = True
+    first.commit()
+    second.refresh()
+    assert "news_last_published_at" in second
+
+    del first["news_last_published_at"]
+    assert first.dirty_keys() == {"news_last_published_at": None}
+    first.commit()
+    # Tombstone NULL để process khác cũng xoá key
+    assert rows(db_path)["news_last_published_at"][0] is None
+
+    assert second.refresh() == 1
+    assert "news_last_published_at" not in second
+    assert dict(second) == {"keep": True}
+
+    reopened = StateStore(db_path)
+    assert dict(reopened) == {"keep": True}
+    for store in (first, second, reopened):
+        store.close()
+
+
+def test_import_legacy_only_when_empty(db_path):
+    state = StateStore(db_path)
+    assert state.import_legacy({}) == 0
+    assert state.import_legacy({"a": 1, "b": {"c": [1]}}) == 2
+    assert dict(StateStore(db_path)) == {"a": 1, "b": {"c": [1]}}
+
+    # Đã có dữ liệu -> không nhập đè
+    assert state.import_legacy({"a": 99}) == 0
+    assert state["a"] == 1
+
+    other = StateStore(db_path)
+    assert other.import_legacy({"z": 1}) == 0
+    assert "z" not in other
+    state.close()
+    other.close()
+
+
+def test_nested_mutation_needs_reassignment(db_path):
+    # Hành vi có chủ đích: state[key] trả về bản copy, sửa dict lồng phải gán lại cả key
+    state = StateStore(db_path)
+    state["x"] = {"y": 0}
+    state["x"]["y"] = 1
+    assert state["x"] == {"y": 0}
+    assert state.dirty_keys() == {"x": '{"y":0}'}
+    state.commit()
+
+    value = state["x"]
+    value["y"] = 1
+    assert state.commit() == 0
+    assert dict(StateStore(db_path)) == {"x": {"y": 0}}
+
+    state["x"] = value
+    assert state.commit() == 1
+    assert dict(StateStore(db_path)) == {"x": {"y": 1}}
+    state.close()
+
+
+def test_value_snapshot_taken_on_assignment(db_path):
+    state = StateStore(db_path)
+    snapshot = {"SJC": [1, 2]}
+    state["snapshots"] = snapshot
+    snapshot["SJC"].append(3)
+    state.commit()
+    assert StateStore(db_path)["snapshots"] == {"SJC": [1, 2]}
+    state.close()
+
+
+def test_invalid_json_row_ignored(db_path):
+    StateStore(db_path).close()
+    with sqlite3.connect(str(db_path)) as conn:
+        conn.execute("INSERT INTO kv (key, value, seq) VALUES ('bad', '{oops', 1), ('good', '1', 1)")
+    state = StateStore(db_path)
+    assert dict(state) == {"good": 1}
+    state.close()
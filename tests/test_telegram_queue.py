@@ -0,0 +1,319 @@
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from telegram.error import BadRequest, ChatMigrated, NetworkError, RetryAfter, TimedOut, Unauthorized
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import telegram_queue  # noqa: E402
+from telegram_queue import (  # noqa: E402
+    SEND_BLOCKED,
+    SEND_DROPPED,
+    SEND_FAILED,
+    SEND_SENT,
+    Outbox,
+    TelegramSendQueue,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeSender:
+    """
+    send_func giả: errors[i] là exception của lần gửi thứ i (None = gửi được).
+    """
+
+    def __init__(self, *errors) -> None:
+        self.errors = list(errors)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, item) -> None:
+        with self.lock:
+            error = self.errors.pop(0) if self.errors else None
+            if error is not None:
+                raise error
+            self.sent.append((item["chat_id"], item["text"]))
+
+
+def dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def make_queue(send_func, outbox_path: Path, **kwargs) -> TelegramSendQueue:
+    options = dict(global_rate=1000, per_chat_rate=1000, per_chat_burst=1000, base_backoff=0)
+    options.update(kwargs)
+    return TelegramSendQueue(send_func, outbox_path=outbox_path, **options)
+
+
+def new_item(text: str, chat_id=1):
+    return TelegramSendQueue._new_item(chat_id, text, {})
+
+
+# ---------------------------
+# TokenBucket
+# ---------------------------
+def test_token_bucket_burst_then_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(telegram_queue, "time", clock)
+    bucket = TokenBucket(rate=2.0, capacity=3.0)
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Hết burst: token thứ 4, 5 phải chờ 0.5s, 1s
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_token_bucket_refill_capped(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(telegram_queue, "time", clock)
+    bucket = TokenBucket(rate=1.0, capacity=2.0)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    clock.now += 1
+    assert bucket.try_acquire()
+
+
+def test_token_bucket_acquire_sleeps(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(telegram_queue, "time", clock)
+    bucket = TokenBucket(rate=4.0, capacity=1.0)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.slept == [pytest.approx(0.25)]
+
+
+# ---------------------------
+# Outbox
+# ---------------------------
+def test_outbox_persists_and_removes(tmp_path):
+    path = tmp_path / "outbox.json"
+    outbox = Outbox(path)
+    first, second = new_item("a"), new_item("b")
+    second["created_at"] = first["created_at"] - 1
+    outbox.add(first)
+    outbox.add(second)
+    assert [item["text"] for item in Outbox(path).pending()] == ["b", "a"]
+
+    outbox.remove(second["id"])
+    assert [item["text"] for item in Outbox(path).pending()] == ["a"]
+
+
+def test_outbox_processes_do_not_overwrite_each_other(tmp_path):
+    path = tmp_path / "outbox.json"
+    daemon, oneshot = Outbox(path), Outbox(path)
+    daemon_item, oneshot_item = new_item("daemon"), new_item("oneshot")
+    daemon.add(daemon_item)
+    oneshot.add(oneshot_item)
+    daemon.remove(daemon_item["id"])
+
+    assert [item["text"] for item in oneshot.pending()] == ["oneshot"]
+    assert (tmp_path / "outbox.lock").exists()
+
+
+def test_outbox_claims_are_exclusive(tmp_path):
+    path = tmp_path / "outbox.json"
+    first, second = Outbox(path), Outbox(path)
+    first.add(new_item("claimed"))
+    first.add(new_item("free"), claim=False)
+
+    # Message "claimed" thuộc process còn sống -> process khác không gửi lại
+    assert [item["text"] for item in second.claim_pending()] == ["free"]
+    assert second.claim_pending() == []
+    assert first.claim_pending() == []
+
+    second.release()
+    assert [item["text"] for item in first.claim_pending()] == ["free"]
+
+
+def test_outbox_release_single_item(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.json")
+    kept, other = new_item("kept"), new_item("other")
+    outbox.add(kept)
+    outbox.add(other)
+    outbox.release(kept["id"])
+
+    other_process = Outbox(tmp_path / "outbox.json")
+    assert [item["id"] for item in other_process.claim_pending()] == [kept["id"]]
+
+
+def test_outbox_claim_of_dead_process_expires(tmp_path):
+    path = tmp_path / "outbox.json"
+    item = new_item("orphan")
+    item["claimed_by"] = f"{dead_pid()}:deadbeef"
+    path.write_text(json.dumps([item]), encoding="utf-8")
+
+    claimed = Outbox(path).claim_pending()
+    assert [i["text"] for i in claimed] == ["orphan"]
+
+
+def test_outbox_ignores_bad_file(tmp_path):
+    path = tmp_path / "outbox.json"
+    path.write_text("{not json", encoding="utf-8")
+    outbox = Outbox(path)
+    assert outbox.pending() == []
+    outbox.add(new_item("x"))
+    assert len(outbox.pending()) == 1
+
+
+# ---------------------------
+# TelegramSendQueue.deliver
+# ---------------------------
+def test_deliver_sent(tmp_path):
+    sender = FakeSender()
+    q = make_queue(sender, tmp_path / "outbox.json")
+    assert q.deliver(new_item("hi", chat_id=7)) == SEND_SENT
+    assert sender.sent == [(7, "hi")]
+
+
+def test_deliver_retry_after_does_not_count_as_attempt(tmp_path):
+    sender = FakeSender(RetryAfter(0), RetryAfter(0), NetworkError("reset"))
+    q = make_queue(sender, tmp_path / "outbox.json", max_attempts=2)
+    item = new_item("hi")
+    assert q.deliver(item) == SEND_SENT
+    assert item["attempts"] == 2
+    assert len(sender.sent) == 1
+
+
+def test_deliver_network_error_gives_up(tmp_path):
+    sender = FakeSender(*[TimedOut()] * 3)
+    q = make_queue(sender, tmp_path / "outbox.json", max_attempts=3)
+    item = new_item("hi")
+    assert q.deliver(item) == SEND_FAILED
+    assert item["attempts"] == 3
+    assert sender.sent == []
+
+
+def test_deliver_chat_migrated(tmp_path):
+    sender = FakeSender(ChatMigrated(-100123))
+    q = make_queue(sender, tmp_path / "outbox.json")
+    item = new_item("hi", chat_id=-5)
+    assert q.deliver(item) == SEND_SENT
+    assert sender.sent == [(-100123, "hi")]
+    assert item["migrated_from"] == -5
+
+
+@pytest.mark.parametrize(
+    "error, outcome",
+    [
+        (Unauthorized("Forbidden: bot was blocked by the user"), SEND_BLOCKED),
+        (BadRequest("Chat not found"), SEND_BLOCKED),
+        (BadRequest("Can't parse entities"), SEND_DROPPED),
+    ],
+)
+def test_deliver_permanent_errors(tmp_path, error, outcome):
+    sender = FakeSender(error)
+    q = make_queue(sender, tmp_path / "outbox.json")
+    assert q.deliver(new_item("hi")) == outcome
+    assert sender.sent == []
+
+
+def test_deliver_after_stop_fails(tmp_path):
+    q = make_queue(FakeSender(), tmp_path / "outbox.json")
+    q.close(1)
+    assert q.deliver(new_item("hi")) == SEND_FAILED
+
+
+# ---------------------------
+# Hàng đợi + outbox
+# ---------------------------
+def test_sent_messages_leave_outbox(tmp_path):
+    sender = FakeSender()
+    q = make_queue(sender, tmp_path / "outbox.json")
+    q.enqueue(1, "a")
+    q.enqueue(2, "b")
+    assert q.flush(5)
+    q.close(1)
+    assert sorted(sender.sent) == [(1, "a"), (2, "b")]
+    assert Outbox(tmp_path / "outbox.json").pending() == []
+
+
+def test_failed_message_retried_on_next_batch(tmp_path):
+    sender = FakeSender(NetworkError("down"), NetworkError("down"))
+    q = make_queue(sender, tmp_path / "outbox.json", max_attempts=2)
+    q.enqueue(1, "a")
+    assert q.flush(5)
+    assert sender.sent == []
+    assert len(q.outbox.pending()) == 1
+
+    # Lượt chạy service tiếp theo của daemon (không restart process)
+    assert q.retry_pending() == 1
+    assert q.flush(5)
+    q.close(1)
+    assert sender.sent == [(1, "a")]
+    assert q.outbox.pending() == []
+
+
+def test_kept_message_sent_by_next_batch(tmp_path):
+    sender = FakeSender()
+    q = make_queue(sender, tmp_path / "outbox.json")
+    q.keep_for_next_run(9, "broadcast part")
+    assert q.retry_pending() == 1
+    assert q.flush(5)
+    q.close(1)
+    assert sender.sent == [(9, "broadcast part")]
+
+
+def test_leftovers_resent_once_across_processes(tmp_path):
+    path = tmp_path / "outbox.json"
+    orphan = new_item("left over")
+    orphan["claimed_by"] = f"{dead_pid()}:deadbeef"
+    path.write_text(json.dumps([orphan]), encoding="utf-8")
+
+    first_sender, second_sender = FakeSender(), FakeSender()
+    first_sender_gate = threading.Event()
+
+    def slow_send(item):
+        first_sender_gate.wait(5)
+        first_sender(item)
+
+    # Process thứ nhất nhận message còn sót lúc khởi động, process thứ hai không gửi trùng
+    first = make_queue(slow_send, path)
+    second = make_queue(second_sender, path)
+    assert second.retry_pending() == 0
+    first_sender_gate.set()
+    assert first.flush(5)
+    first.close(1)
+    second.close(1)
+
+    assert first_sender.sent == [(1, "left over")]
+    assert second_sender.sent == []
+    assert Outbox(path).pending() == []
+
+
+def test_close_releases_unsent_messages(tmp_path):
+    path = tmp_path / "outbox.json"
+    sender = FakeSender(*[NetworkError("down")] * 10)
+    q = make_queue(sender, path, max_attempts=10, base_backoff=30, max_backoff=30)
+    q.enqueue(1, "stuck")
+    q.close(0.2)
+
+    other = Outbox(path)
+    assert [item["text"] for item in other.claim_pending()] == ["stuck"]
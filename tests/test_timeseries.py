@@ -0,0 +1,213 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from timeseries import (  # noqa: E402
+    Series,
+    TimeSeriesStore,
+    _decode_records,
+    _get_varint,
+    _put_varint,
+    _unzigzag,
+    _zigzag,
+    downsample,
+    instrument_slug,
+)
+
+T0 = 1_763_000_000
+
+
+def fill(series: Series, count: int, start: int = T0, step: int = 60):
+    points = [(start + i * step, 90_000_000 + (i % 7 - 3) * 150_000) for i in range(count)]
+    for ts, value in points:
+        assert series.append(ts, value)
+    return [(ts, float(value)) for ts, value in points]
+
+
+@pytest.mark.parametrize("n", [0, 1, -1, 63, -64, 64, 127, 128, -129, 2**31, -(2**31), 2**62, -(2**62)])
+def test_zigzag_varint_round_trip(n):
+    z = _zigzag(n)
+    assert z >= 0
+    assert _unzigzag(z) == n
+    out = bytearray()
+    _put_varint(out, z)
+    assert _get_varint(bytes(out) + b"\xff", 0) == (z, len(out))
+
+
+def test_zigzag_small_values_stay_small():
+    assert [_zigzag(n) for n in (0, -1, 1, -2, 2)] == [0, 1, 2, 3, 4]
+    out = bytearray()
+    _put_varint(out, 300)
+    assert bytes(out) == b"\xac\x02"
+
+
+def test_truncated_varint_raises():
+    with pytest.raises(IndexError):
+        _get_varint(b"\xac", 0)
+
+
+def test_decode_stops_at_torn_record():
+    out = bytearray()
+    for n in (0, T0, _zigzag(5), 60, _zigzag(-2)):
+        _put_varint(out, n)
+    records = list(_decode_records(bytes(out) + b"\x80"))
+    assert [(ts, value, keyframe) for ts, value, _, keyframe in records] == [
+        (T0, 5, True),
+        (T0 + 60, 3, False),
+    ]
+    assert records[-1][2] == len(out)
+
+
+def test_append_and_range(tmp_path):
+    series = Series(tmp_path / "sjc.ts", block_records=4)
+    points = fill(series, 10)
+    # ts không tăng -> bỏ qua
+    assert not series.append(T0 + 9 * 60, 1)
+    assert not series.append(T0, 1)
+
+    assert series.range() == points
+    assert series.range(T0 + 120, T0 + 300) == points[2:6]
+    assert series.range(T0 + 121) == points[3:]
+    assert series.range(end=T0 - 1) == []
+    assert series.last() == points[-1]
+    assert len(series._block_off) == 3
+
+    reopened = Series(tmp_path / "sjc.ts", block_records=4)
+    assert reopened.range() == points
+    assert reopened.last() == points[-1]
+
+
+def test_scale_keeps_decimals(tmp_path):
+    series = Series(tmp_path / "usd.ts", scale=100)
+    series.append(T0, 25_432.15)
+    series.append(T0 + 60, 25_430.5)
+    assert series.range() == [(T0, 25_432.15), (T0 + 60, 25_430.5)]
+
+
+def test_torn_tail_truncated_on_open(tmp_path):
+    path = tmp_path / "sjc.ts"
+    points = fill(Series(path, block_records=4), 6)
+    good_size = path.stat().st_size
+    # Crash giữa lúc ghi: nửa bản ghi cuối
+    with path.open("ab") as f:
+        f.write(b"\x3c\x80")
+
+    series = Series(path, block_records=4)
+    assert path.stat().st_size == good_size
+    assert series.range() == points
+    assert series.append(T0 + 3600, 1)
+    assert series.range()[-1] == (T0 + 3600, 1.0)
+
+
+def test_index_rebuilt_when_missing_or_short(tmp_path):
+    path = tmp_path / "sjc.ts"
+    series = Series(path, block_records=4)
+    points = fill(series, 13)
+    index = path.with_suffix(".idx").read_bytes()
+
+    path.with_suffix(".idx").unlink()
+    rebuilt = Series(path, block_records=4)
+    assert path.with_suffix(".idx").read_bytes() == index
+    assert rebuilt.range(T0 + 8 * 60) == points[8:]
+
+    # Crash sau khi ghi data, trước khi ghi entry index của block mới
+    path.with_suffix(".idx").write_bytes(index[: -16 - 5])
+    repaired = Series(path, block_records=4)
+    assert path.with_suffix(".idx").read_bytes() == index
+    assert repaired.range() == points
+
+
+def test_retention_drops_whole_old_blocks(tmp_path):
+    path = tmp_path / "sjc.ts"
+    series = Series(path, block_records=4)
+    points = fill(series, 10)
+
+    # Block 2 (điểm 4..7) bắt đầu <= cutoff -> chỉ bỏ được block 1
+    assert series.apply_retention(T0 + 5 * 60) == 1
+    assert series.range() == points[4:]
+    assert series.apply_retention(T0 + 5 * 60) == 0
+
+    assert series.apply_retention(T0 + 100 * 60) == 1
+    assert series.range() == points[8:]
+    assert not path.with_suffix(".ts.tmp").exists()
+    assert Series(path, block_records=4).range() == points[8:]
+    assert series.append(T0 + 3600, 1)
+
+
+def test_other_instance_sees_appends(tmp_path):
+    path = tmp_path / "sjc.ts"
+    daemon = Series(path, block_records=4)
+    oneshot = Series(path, block_records=4)
+    points = fill(oneshot, 6)
+
+    assert daemon.range() == points
+    assert daemon.last() == points[-1]
+    # Đang ở giữa block: process kia ghi tiếp nối vào block cuối của process này
+    more = fill(daemon, 3, start=T0 + 6 * 60)
+    assert oneshot.range(T0 + 5 * 60) == points[5:] + more
+    assert Series(path, block_records=4).range() == points + more
+
+
+def test_other_instance_sees_retention(tmp_path):
+    path = tmp_path / "sjc.ts"
+    writer = Series(path, block_records=4)
+    reader = Series(path, block_records=4)
+    points = fill(writer, 10)
+    assert reader.range() == points
+
+    writer.apply_retention(T0 + 5 * 60)
+    assert reader.range(T0 + 6 * 60) == points[6:]
+    assert reader.append(T0 + 3600, 2)
+    assert writer.range() == points[4:] + [(T0 + 3600, 2.0)]
+
+
+def test_store_query_sees_instrument_created_elsewhere(tmp_path):
+    reader = TimeSeriesStore(history_dir=tmp_path, block_records=4)
+    writer = TimeSeriesStore(history_dir=tmp_path, block_records=4)
+    assert reader.query("SJC buy") == []
+
+    writer.record(T0, {"SJC buy": 90_000_000, "USD/VND": 25_432.15}, scale=100)
+    writer.record(T0 + 3600, {"SJC buy": 90_500_000, "USD/VND": None}, scale=100)
+
+    assert reader.instruments() == ["SJC buy", "USD/VND"]
+    assert reader.query("SJC buy") == [(T0, 90_000_000.0), (T0 + 3600, 90_500_000.0)]
+    assert reader.query("USD/VND") == [(T0, 25_432.15)]
+    assert (tmp_path / "sjc_buy.ts").exists()
+
+
+def test_store_retention_and_downsample(tmp_path):
+    base = T0 - T0 % (4 * 3600)
+    store = TimeSeriesStore(history_dir=tmp_path, retention_days=1, block_records=4)
+    for i in range(12):
+        store.record(base + i * 3600, {"SJC buy": 100 + i})
+    assert store.query("SJC buy", step=4 * 3600, how="max") == [
+        (base, 103.0),
+        (base + 4 * 3600, 107.0),
+        (base + 8 * 3600, 111.0),
+    ]
+
+    # cutoff = base + 5h: chỉ block đầu (0h..3h) cũ hơn hẳn cutoff
+    assert store.apply_retention(now=base + 5 * 3600 + 86400) == 1
+    assert store.query("SJC buy")[0] == (base + 4 * 3600, 104.0)
+    assert TimeSeriesStore(enabled=False).query("SJC buy") == []
+
+
+def test_downsample_modes():
+    points = [(0, 1.0), (30, 3.0), (60, 2.0), (150, 5.0)]
+    assert downsample(points, 60, "last") == [(0, 3.0), (60, 2.0), (120, 5.0)]
+    assert downsample(points, 60, "first") == [(0, 1.0), (60, 2.0), (120, 5.0)]
+    assert downsample(points, 60, "mean") == [(0, 2.0), (60, 2.0), (120, 5.0)]
+    assert downsample(points, 120, "max") == [(0, 3.0), (120, 5.0)]
+    with pytest.raises(ValueError):
+        downsample(points, 60, "median")
+
+
+def test_instrument_slug():
+    assert instrument_slug("Xăng RON 95-III") == "xang_ron_95_iii"
+    assert instrument_slug("Dầu DO 0,05S-II") == "dau_do_0_05s_ii"
+    assert instrument_slug("Đồng / USD") == "dong_usd"
+    assert instrument_slug("***") == "unknown"
@@ -0,0 +1,221 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import ttl_cache  # noqa: E402
+from ttl_cache import CachedValue, TtlCache  # noqa: E402
+
+# 2025-11-13 08:00:00 UTC = 15:00 giờ Việt Nam
+NOW = 1_763_020_800.0
+SOURCE = "svc:endpoint"
+
+
+class FakeClock:
+    def __init__(self, now: float = NOW) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class Upstream:
+    """
+    fetch() giả: đếm số lần gọi, trả lần lượt "v1", "v2", ...; gate để giữ refresh nền lại.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.fail = False
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.gate.wait(5)
+        if self.fail:
+            return None
+        return f"v{self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ttl_cache, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    # ttl 1 phút, swr 1 phút, dùng bản cũ khi lỗi tối đa 10 phút
+    return TtlCache(
+        cache_dir=tmp_path,
+        sources={SOURCE: {"ttl_min": 1, "swr_min": 1}},
+        stale_if_error_min=10,
+    )
+
+
+def test_fresh_entry_served_from_cache(cache, clock):
+    upstream = Upstream()
+    assert cache.get(SOURCE, upstream).value == "v1"
+    clock.now += 59
+    cached = cache.get(SOURCE, upstream)
+    assert (cached.value, cached.fetched_at, cached.from_fallback) == ("v1", NOW, False)
+    assert upstream.calls == 1
+
+
+def test_stale_entry_served_while_revalidating(cache, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream)
+    clock.now += 90
+
+    cached = cache.get(SOURCE, upstream)
+    assert (cached.value, cached.from_fallback) == ("v1", False)
+    cache.wait_pending()
+    assert upstream.calls == 2
+
+    cached = cache.get(SOURCE, upstream)
+    assert (cached.value, cached.fetched_at) == ("v2", NOW + 90)
+
+
+def test_expired_entry_fetched_synchronously(cache, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream)
+    clock.now += 120
+    assert cache.get(SOURCE, upstream).value == "v2"
+    assert upstream.calls == 2
+    assert not cache._refreshing
+
+
+def test_background_refresh_deduplicated_per_key(cache, clock):
+    upstream = Upstream()
+    other = Upstream()
+    cache.get(SOURCE, upstream)
+    cache.get(SOURCE, other, "other")
+    clock.now += 90
+
+    upstream.gate.clear()
+    for _ in range(5):
+        assert cache.get(SOURCE, upstream).value == "v1"
+    assert upstream.started.wait(5)
+    # Key khác vẫn được refresh riêng
+    assert cache.get(SOURCE, other, "other").value == "v1"
+    upstream.gate.set()
+    cache.wait_pending()
+
+    assert upstream.calls == 2
+    assert other.calls == 2
+    assert not cache._refreshing
+
+
+def test_stale_fallback_with_as_of_note(cache, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream)
+    upstream.fail = True
+
+    clock.now += 5 * 60
+    cached = cache.get(SOURCE, upstream)
+    assert (cached.value, cached.fetched_at, cached.from_fallback) == ("v1", NOW, True)
+    assert cached.as_of_note() == " <i>(dữ liệu cũ lúc 15:00 13/11)</i>"
+
+    # Quá stale_if_error -> không dùng bản cũ nữa
+    clock.now = NOW + 10 * 60
+    assert cache.get(SOURCE, upstream) is None
+
+
+def test_fetch_exception_treated_as_failure(cache, clock):
+    cache.get(SOURCE, Upstream())
+    clock.now += 120
+
+    def broken():
+        raise RuntimeError("boom")
+
+    cached = cache.get(SOURCE, broken)
+    assert (cached.value, cached.from_fallback) == ("v1", True)
+
+
+def test_fresh_value_has_no_note():
+    assert CachedValue("x", NOW).as_of_note() == ""
+
+
+def test_entries_persist_on_disk(cache, tmp_path, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream, "hanoi")
+
+    reopened = TtlCache(cache_dir=tmp_path, sources=cache.sources)
+    cached = reopened.get(SOURCE, upstream, "hanoi")
+    assert (cached.value, cached.fetched_at) == ("v1", NOW)
+    assert upstream.calls == 1
+    # Variant khác là entry khác
+    assert reopened.get(SOURCE, upstream, "hcm").value == "v2"
+
+
+def test_put_overwrites_entry(cache, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream)
+    clock.now += 10
+    stored = cache.put(SOURCE, "manual")
+    assert (stored.value, stored.fetched_at) == ("manual", NOW + 10)
+    assert cache.get(SOURCE, upstream).value == "manual"
+    assert upstream.calls == 1
+
+
+def test_peek_missing_entry_schedules_single_refresh(cache, clock):
+    upstream = Upstream()
+    upstream.gate.clear()
+    for _ in range(5):
+        assert cache.peek(SOURCE, "", upstream) is None
+    assert upstream.started.wait(5)
+    upstream.gate.set()
+    cache.wait_pending()
+    assert upstream.calls == 1
+
+    cached = cache.peek(SOURCE, "", upstream)
+    assert (cached.value, cached.from_fallback) == ("v1", False)
+    assert upstream.calls == 1
+
+
+def test_peek_stale_entry_refreshes_once_in_background(cache, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream)
+    clock.now += 90
+
+    upstream.gate.clear()
+    for _ in range(5):
+        cached = cache.peek(SOURCE, "", upstream)
+        assert (cached.value, cached.from_fallback) == ("v1", False)
+    upstream.gate.set()
+    cache.wait_pending()
+    assert upstream.calls == 2
+    assert cache.peek(SOURCE).value == "v2"
+
+
+def test_peek_past_swr_marks_fallback(cache, clock):
+    upstream = Upstream()
+    cache.get(SOURCE, upstream)
+    upstream.fail = True
+    clock.now += 150
+
+    cached = cache.peek(SOURCE, "", upstream)
+    assert (cached.value, cached.from_fallback) == ("v1", True)
+    cache.wait_pending()
+    # Refresh lỗi không xoá bản cũ
+    assert cache.peek(SOURCE).value == "v1"
+
+
+def test_disabled_cache_always_fetches(tmp_path, clock):
+    cache = TtlCache(cache_dir=tmp_path, enabled=False)
+    upstream = Upstream()
+    assert cache.get(SOURCE, upstream).value == "v1"
+    assert cache.get(SOURCE, upstream).value == "v2"
+    assert cache.peek(SOURCE, "", upstream) is None
+    assert not list(tmp_path.iterdir())